@@ -15,6 +15,7 @@ from collections import defaultdict
 
 from auth import verify_token, check_permission, verify_admin, create_access_token, AGENT_KEYS, AdminLogin
 from llm_assistant import get_assistant, SmartTreeTask
+from feedback_index import get_feedback_index
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -681,41 +682,18 @@ async def get_feedback_items(
     limit: int = 20
 ):
     """Get recent feedback items"""
-    # Read from feedback directory
-    feedback_items = []
-    feedback_dir = Path("./feedback")
-    
-    if feedback_dir.exists():
-        for date_dir in sorted(feedback_dir.iterdir(), reverse=True):
-            if date_dir.is_dir():
-                for summary_file in date_dir.glob("*.summary.txt"):
-                    try:
-                        with open(summary_file, "r") as f:
-                            content = f.read()
-                            
-                            # Parse summary
-                            item = {"id": summary_file.stem.replace(".summary", "")}
-                            for line in content.split("\n"):
-                                if line.startswith("Category:"):
-                                    item["category"] = line.split(":", 1)[1].strip()
-                                elif line.startswith("Title:"):
-                                    item["title"] = line.split(":", 1)[1].strip()
-                                elif line.startswith("Model:"):
-                                    item["ai_model"] = line.split(":", 1)[1].strip()
-                                elif line.startswith("Impact:"):
-                                    try:
-                                        item["impact_score"] = int(line.split(":")[1].split("/")[0].strip())
-                                    except:
-                                        item["impact_score"] = 5
-                            
-                            feedback_items.append(item)
-                            
-                            if len(feedback_items) >= limit:
-                                return feedback_items
-                    except Exception as e:
-                        continue
-    
-    return feedback_items
+    # Newest rows straight from the metadata index
+    return [
+        {
+            "id": row["id"],
+            "category": row["category"],
+            "title": row["title"],
+            "ai_model": row["ai_model"],
+            "impact_score": row["impact_score"],
+            "processed": bool(row["processed"]),
+        }
+        for row in get_feedback_index().recent(limit)
+    ]
 
 
 @router.get("/api/agents")
@@ -808,9 +786,9 @@ async def delete_agent(
     if agent_id in AGENT_KEYS:
         del AGENT_KEYS[agent_id]
         return {"message": "Agent deleted"}
-    
+
     raise HTTPException(status_code=404, detail="Agent not found")
 
 
 # Export router for main app
-__all__ = ["router"]
\ No newline at end of file
+__all__ = ["router"]
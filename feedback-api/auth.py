@@ -5,12 +5,10 @@ Authentication and Rate Limiting for Feedback API
 
 import hashlib
 import hmac
-import time
 import secrets
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta, timezone
 from functools import wraps
-from collections import defaultdict
 import jwt
 from fastapi import HTTPException, Header, Request, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -19,14 +17,16 @@ import redis
 import json
 import os
 
+from shared_state import SharedMap, get_shared_state
+
 # Configuration
 JWT_SECRET = os.getenv("JWT_SECRET", secrets.token_urlsafe(32))
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 
-# Agent API keys (in production, store in database)
-AGENT_KEYS = {
+# Default agents (in production, store in database)
+DEFAULT_AGENTS = {
     "agent_claude_001": {
         "secret": os.getenv("AGENT_CLAUDE_KEY", "sk_claude_" + secrets.token_urlsafe(32)),
         "name": "Claude MCP Agent",
@@ -53,14 +53,32 @@ AGENT_KEYS = {
     },
 }
 
-# Redis client for rate limiting
+# Environment variable that pins each default agent's secret
+AGENT_KEY_ENV = {
+    "agent_claude_001": "AGENT_CLAUDE_KEY",
+    "agent_gpt_001": "AGENT_GPT_KEY",
+    "agent_openrouter_001": "AGENT_OPENROUTER_KEY",
+    "admin_001": "ADMIN_API_KEY",
+}
+
+# Redis client (readiness checks)
 try:
     redis_client = redis.from_url(REDIS_URL, decode_responses=True)
 except:
-    redis_client = None  # Fallback to in-memory if Redis not available
+    redis_client = None
+
+# Agents and rate limits are shared by every API instance
+shared_state = get_shared_state()
 
-# In-memory rate limiter fallback
-rate_limit_cache = defaultdict(lambda: {"count": 0, "reset_time": time.time() + 60})
+# Agent API keys, shared so agents created through the admin panel work on
+# every instance
+AGENT_KEYS = SharedMap(shared_state, "agents")
+for _agent_id, _agent in DEFAULT_AGENTS.items():
+    if AGENT_KEY_ENV[_agent_id] in os.environ:
+        AGENT_KEYS[_agent_id] = _agent
+    else:
+        # Generated secrets: the first worker to start decides for all
+        AGENT_KEYS.setdefault(_agent_id, _agent)
 
 
 class AgentAuth(BaseModel):
@@ -151,97 +169,25 @@ def check_permission(required_permission: str):
 
 
 class RateLimiter:
-    """Rate limiting implementation"""
+    """Rate limiting implementation (windows shared by every instance when the
+    state lives in Redis)"""
     
     @staticmethod
     def check_rate_limit(
-        identifier: str,
-        max_requests: int = 60,
-        window_seconds: int = 60
+        identifier: str, max_requests: int = 60, window_seconds: int = 60, cost: int = 1
     ) -> bool:
-        """Check if request is within rate limit"""
-        
-        if redis_client:
-            # Use Redis for distributed rate limiting
-            key = f"rate_limit:{identifier}"
-            current_time = time.time()
-            window_start = current_time - window_seconds
-            
-            # Remove old entries
-            redis_client.zremrangebyscore(key, 0, window_start)
-            
-            # Count requests in current window
-            request_count = redis_client.zcard(key)
-            
-            if request_count >= max_requests:
-                return False
-            
-            # Add current request
-            redis_client.zadd(key, {str(current_time): current_time})
-            redis_client.expire(key, window_seconds)
-            
-            return True
-        else:
-            # Fallback to in-memory rate limiting
-            current_time = time.time()
-            
-            if identifier not in rate_limit_cache:
-                rate_limit_cache[identifier] = {
-                    "count": 0,
-                    "reset_time": current_time + window_seconds
-                }
-            
-            limiter = rate_limit_cache[identifier]
-            
-            # Reset if window has passed
-            if current_time >= limiter["reset_time"]:
-                limiter["count"] = 0
-                limiter["reset_time"] = current_time + window_seconds
-            
-            if limiter["count"] >= max_requests:
-                return False
-            
-            limiter["count"] += 1
-            return True
+        """Check if request is within rate limit (``cost`` units, e.g. batch items)"""
+        return shared_state.rate_hit(identifier, max_requests, window_seconds, cost)
+
+    @staticmethod
+    def refund(identifier: str, cost: int):
+        """Give back units charged for requests that were never served"""
+        shared_state.rate_refund(identifier, cost)
     
     @staticmethod
     def get_remaining(identifier: str, max_requests: int = 60, window_seconds: int = 60) -> Dict[str, int]:
         """Get remaining requests and reset time"""
-        
-        if redis_client:
-            key = f"rate_limit:{identifier}"
-            current_time = time.time()
-            window_start = current_time - window_seconds
-            
-            # Remove old entries
-            redis_client.zremrangebyscore(key, 0, window_start)
-            
-            # Count requests in current window
-            request_count = redis_client.zcard(key)
-            
-            return {
-                "remaining": max(0, max_requests - request_count),
-                "reset_in": window_seconds,
-                "limit": max_requests
-            }
-        else:
-            current_time = time.time()
-            
-            if identifier not in rate_limit_cache:
-                return {
-                    "remaining": max_requests,
-                    "reset_in": window_seconds,
-                    "limit": max_requests
-                }
-            
-            limiter = rate_limit_cache[identifier]
-            reset_in = max(0, int(limiter["reset_time"] - current_time))
-            
-            return {
-                "remaining": max(0, max_requests - limiter["count"]),
-                "reset_in": reset_in,
-                "limit": max_requests
-            }
+        return shared_state.rate_remaining(identifier, max_requests, window_seconds)
 
 
 def rate_limit(max_requests: int = 60, window_seconds: int = 60):
@@ -308,6 +254,21 @@ def require_agent_auth(request: Request, x_api_key: Optional[str] = Header(None)
     return {"agent_id": agent_id, **agent}
 
 
+def charge_agent(agent: Dict[str, Any], units: int):
+    """Charge extra units against an authenticated agent's rate limit
+    (a batch of N items costs N requests on top of the one auth charged)"""
+    if units > 0 and not RateLimiter.check_rate_limit(
+        f"agent:{agent['agent_id']}", agent["rate_limit"], 60, cost=units
+    ):
+        raise HTTPException(status_code=429, detail="Agent rate limit exceeded")
+
+
+def refund_agent(agent: Dict[str, Any], units: int):
+    """Give back units `charge_agent` took for work that failed"""
+    if units > 0:
+        RateLimiter.refund(f"agent:{agent['agent_id']}", units)
+
+
 # Admin authentication (simple for now, use proper auth in production)
 ADMIN_USERS = {
     "admin": hashlib.sha256(os.getenv("ADMIN_PASSWORD", "change_me_please").encode()).hexdigest(),
@@ -336,6 +297,8 @@ __all__ = [
     "RateLimiter",
     "rate_limit",
     "require_agent_auth",
+    "charge_agent",
+    "refund_agent",
     "verify_admin",
     "AGENT_KEYS",
 ]
\ No newline at end of file
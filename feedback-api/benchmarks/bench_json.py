@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+JSON path benchmark ⚡
+Throughput of the two hot JSON paths, standard library vs the fast layer:
+  submit   - serialize a document, frame it as an STFB record, render the
+             response (json.dumps + JSONResponse vs fast_json + ORJSONResponse)
+  pending  - read a page of records from the log and render it
+             (decode + jsonable_encoder + JSONResponse vs splicing the stored
+             payloads into one array)
+
+Usage:
+    python benchmarks/bench_json.py [--documents 2000] [--page 100]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("FEEDBACK_DIR", tempfile.mkdtemp())
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+
+import fast_json  # noqa: E402
+from bench_stfb import synthetic_corpus  # noqa: E402
+from feedback_log import FeedbackLog  # noqa: E402
+from stfb import FEEDBACK_MAGIC, encode_record, feedback_metadata  # noqa: E402
+
+
+def submit_std(document: dict) -> bytes:
+    data = json.dumps(document, separators=(",", ":")).encode()
+    encode_record(FEEDBACK_MAGIC, data, feedback_metadata(document))
+    return JSONResponse(jsonable_encoder({"feedback_id": document["id"]})).body
+
+
+def submit_fast(document: dict) -> bytes:
+    data = fast_json.dumps(document)
+    encode_record(FEEDBACK_MAGIC, data, feedback_metadata(document))
+    return ORJSONResponse(jsonable_encoder({"feedback_id": document["id"]})).body
+
+
+def pending_std(log: FeedbackLog, locations: list) -> bytes:
+    documents = [json.loads(log.read(location).data()) for location in locations]
+    return JSONResponse(jsonable_encoder(documents)).body
+
+
+def pending_fast(log: FeedbackLog, locations: list) -> bytes:
+    return fast_json.json_array([log.read(location).data() for location in locations])
+
+
+def rate(fn, items, repeat: int = 3) -> float:
+    """Best-of-``repeat`` calls per second of fn over items"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for item in items:
+            fn(*item)
+        best = min(best, time.perf_counter() - started)
+    return len(items) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--page", type=int, default=100)
+    args = parser.parse_args()
+    if not fast_json.orjson:
+        sys.exit("orjson is not installed; nothing to compare")
+
+    corpus = synthetic_corpus(args.documents)
+    for document in corpus:
+        document.update(
+            impact_score=5,
+            frequency_score=5,
+            timestamp="2025-08-06T10:00:00+00:00",
+        )
+    log = FeedbackLog(Path(tempfile.mkdtemp()))
+    locations = log.append_many(
+        [encode_record(FEEDBACK_MAGIC, fast_json.dumps(d))[0] for d in corpus],
+        "2025-08-06",
+    )
+    pages = [
+        (log, locations[start : start + args.page])
+        for start in range(0, len(locations), args.page)
+    ]
+    submits = [(document,) for document in corpus]
+
+    print(f"{'path':<10} {'stdlib/s':>10} {'fast/s':>10} {'speedup':>8}")
+    for name, std, fast, items in (
+        ("submit", submit_std, submit_fast, submits),
+        (f"pending{args.page}", pending_std, pending_fast, pages),
+    ):
+        before, after = rate(std, items), rate(fast, items)
+        print(f"{name:<10} {before:>10.0f} {after:>10.0f} {after / before:>7.2f}x")
+    log.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Segments vs packs scan benchmark 📦
+Builds 90 days of feedback in a throwaway log, then times the same scans
+before and after compacting the closed days into pack files:
+  full scan    - decode every feedback document (index rebuild, export)
+  header scan  - headers only, payloads skipped (health counts)
+  by-id reads  - random single-record reads by location (pending, lookups)
+
+Usage:
+    python benchmarks/bench_pack_scan.py [--days 90] [--per-day 200]
+"""
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import stfb  # noqa: E402
+from feedback_log import FeedbackLog, RecordLocation  # noqa: E402
+from stfb import FEEDBACK_MAGIC, encode_record, feedback_metadata  # noqa: E402
+
+
+def build_log(root: Path, days: int, per_day: int, segment_bytes: int) -> list:
+    """Fill ``days`` days of log; returns every record location"""
+    log = FeedbackLog(root, max_segment_bytes=segment_bytes, fsync_batch=0)
+    locations = []
+    for day in range(days):
+        date = f"2025-{1 + day // 28:02d}-{1 + day % 28:02d}"
+        for i in range(per_day):
+            document = {
+                "id": f"{day:06x}{i:010x}",
+                "category": random.choice(["bug", "nice_to_have", "critical"]),
+                "title": f"Feedback {i} of {date}",
+                "description": "quantum scan of a large tree " * random.randint(2, 20),
+                "ai_model": random.choice(["claude-3-opus", "gpt-4"]),
+                "smart_tree_version": "3.3.5",
+                "timestamp": f"{date}T10:00:00+00:00",
+                "impact_score": random.randint(1, 10),
+                "frequency_score": random.randint(1, 10),
+                "tags": [],
+            }
+            frame, _ = encode_record(
+                FEEDBACK_MAGIC,
+                json.dumps(document, separators=(",", ":")).encode(),
+                feedback_metadata(document),
+            )
+            locations.append(log.append(frame, date))
+    log.close()
+    return locations
+
+
+def timed(scan) -> float:
+    started = time.perf_counter()
+    scan()
+    return (time.perf_counter() - started) * 1000
+
+
+def measure(log: FeedbackLog, locations: list) -> dict:
+    sample = random.sample(locations, min(2000, len(locations)))
+    return {
+        "full scan": timed(lambda: sum(1 for _ in log.iter_feedback())),
+        "header scan": timed(
+            lambda: sum(1 for _ in log.iter_records(with_payload=False))
+        ),
+        f"{len(sample)} by-id reads": timed(
+            lambda: [log.read(location).document() for location in sample]
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--per-day", type=int, default=200)
+    parser.add_argument("--segment-bytes", type=int, default=16 * 1024)
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp())
+    stfb._model_registry = stfb.ModelRegistry(root / "models.json")
+    stfb._dictionaries = stfb.DictionaryStore(root / "dictionaries")
+    locations = build_log(root, args.days, args.per_day, args.segment_bytes)
+
+    files = sum(1 for _ in root.glob("*/segment-*"))
+    print(f"📦 {len(locations)} records over {args.days} days in {files} segments\n")
+    before = measure(FeedbackLog(root), locations)
+
+    moves = {}
+    log = FeedbackLog(root)
+    log.compact_closed("9999-12-31", moves.update)
+    relocated = []
+    for location in locations:
+        segment, base = moves[location.segment]
+        relocated.append(RecordLocation(segment, base + location.offset))
+    after = measure(log, relocated)
+
+    print(f"{'scan':<18} {'segments ms':>12} {'packs ms':>10} {'speedup':>8}")
+    for name in before:
+        print(
+            f"{name:<18} {before[name]:>12.1f} {after[name]:>10.1f} "
+            f"{before[name] / after[name]:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Full-text search benchmark 🔎
+Fills a throwaway feedback index with synthetic documents, then times
+/feedback/search-style queries (BM25 ranking, snippets, first page and a
+cursor page) on one core.
+
+Usage:
+    python benchmarks/bench_search.py [--docs 1000000] [--runs 20]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from itertools import accumulate
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from feedback_index import FeedbackIndex, index_row, search_query  # noqa: E402
+from feedback_log import RecordLocation  # noqa: E402
+
+WORDS = (
+    "tree directory scan search files timeout symlink hidden quantum output "
+    "format json color emoji stream compress mcp tool semantic cache large repo "
+    "slow crash panic unicode path filter sort size depth git ignore"
+).split()
+# Filler vocabulary drawn with a Zipf-like skew, so that - as in real
+# feedback - a few words are everywhere and most are rare
+FILLER = [f"w{n}" for n in range(20_000)]
+FILLER_WEIGHTS = list(accumulate(1 / (n + 1) for n in range(len(FILLER))))
+TOOLS = ["search_in_files", "find_files", "quick_tree", "analyze_directory"]
+
+QUERIES = [
+    "search_in_files timeout",
+    "symlink crash",
+    "quantum",
+    "slow large repo",
+    "emoji output format",
+    "cach*",
+]
+
+
+def document(i: int) -> dict:
+    tool = random.choice(TOOLS)
+    words = random.choices(WORDS, k=6) + random.choices(
+        FILLER, cum_weights=FILLER_WEIGHTS, k=54
+    )
+    random.shuffle(words)
+    return {
+        "id": f"{i:016x}",
+        "category": random.choice(["bug", "nice_to_have", "critical"]),
+        "title": f"{tool} {' '.join(words[:5])}",
+        "description": " ".join(words),
+        "proposed_solution": " ".join(
+            random.choices(FILLER, cum_weights=FILLER_WEIGHTS, k=15)
+        ),
+        "affected_command": f"st --mode {random.choice(WORDS)}",
+        "ai_model": random.choice(["claude-3-opus", "gpt-4"]),
+        "smart_tree_version": "3.3.5",
+        "timestamp": "2025-08-06T10:00:00+00:00",
+        "impact_score": random.randint(1, 10),
+        "frequency_score": random.randint(1, 10),
+        "tags": random.choices(WORDS, k=3),
+    }
+
+
+def build(index: FeedbackIndex, docs: int):
+    location = RecordLocation("2025-08-06/segment-000001.log", 0)
+    batch = []
+    for i in range(docs):
+        batch.append(index_row(document(i), location))
+        if len(batch) == 10_000:
+            index.add_many(batch)
+            batch = []
+    index.add_many(batch)
+
+
+def timed_ms(fn) -> float:
+    started = time.perf_counter()
+    fn()
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(42)
+    index = FeedbackIndex(Path(tempfile.mkdtemp()) / "index.sqlite3")
+    started = time.perf_counter()
+    build(index, args.docs)
+    print(f"🔎 Indexed {args.docs} documents in {time.perf_counter() - started:.1f}s\n")
+
+    print(f"{'query':<26} {'hits/page':>9} {'p50 ms':>8} {'p99 ms':>8} {'next ms':>8}")
+    for text in QUERIES:
+        query = search_query(text)
+        runs = [timed_ms(lambda: index.search(query, 20)) for _ in range(args.runs)]
+        rows = index.search(query, 20)
+        after = (rows[-1]["score"], rows[-1]["search_rowid"]) if rows else None
+        next_page = timed_ms(lambda: index.search(query, 20, after))
+        p99 = statistics.quantiles(runs, n=100)[98] if len(runs) > 1 else runs[0]
+        print(
+            f"{text:<26} {len(rows):>9} {statistics.median(runs):>8.1f} "
+            f"{p99:>8.1f} {next_page:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Similarity index benchmark 🧬
+Fills a throwaway MinHash/LSH index with synthetic feedback, then reports
+ingest cost, lookup latency (which should stay flat as the corpus grows),
+the packed memory footprint and the snapshot size.
+
+Usage:
+    python benchmarks/bench_similar.py [--docs 50000] [--lookups 200]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from itertools import accumulate
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from feedback_similar import SimilarityIndex  # noqa: E402
+
+VOCABULARY = [f"w{n}" for n in range(20_000)]
+WEIGHTS = list(accumulate(1 / (n + 1) for n in range(len(VOCABULARY))))
+
+
+def document(i: int) -> dict:
+    words = random.choices(VOCABULARY, cum_weights=WEIGHTS, k=40)
+    return {
+        "id": f"{i:016x}",
+        "title": " ".join(words[:6]),
+        "description": " ".join(words[6:]),
+        "affected_command": "st --search",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=50_000)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(42)
+    similarity = SimilarityIndex(Path(tempfile.mkdtemp()) / "similar.snapshot")
+    print(f"{'docs':>9} {'add ms/doc':>11} {'lookup p50':>11} {'p99 ms':>8}")
+    added, step = 0, max(args.docs // 4, 1)
+    while added < args.docs:
+        batch = [document(i) for i in range(added, min(added + step, args.docs))]
+        started = time.perf_counter()
+        for start in range(0, len(batch), 100):
+            similarity.add_many(batch[start : start + 100])
+        per_doc = (time.perf_counter() - started) * 1000 / len(batch)
+        added += len(batch)
+
+        samples = [document(random.randrange(added)) for _ in range(args.lookups)]
+        runs = []
+        for sample in samples:
+            started = time.perf_counter()
+            similarity.similar(sample)
+            runs.append((time.perf_counter() - started) * 1000)
+        p99 = statistics.quantiles(runs, n=100)[98]
+        print(
+            f"{added:>9} {per_doc:>11.2f} {statistics.median(runs):>11.2f} {p99:>8.2f}"
+        )
+
+    started = time.perf_counter()
+    similarity.snapshot()
+    snapshot_seconds = time.perf_counter() - started
+    stats = similarity.stats()
+    print(
+        f"\n🧬 {stats['memory_bytes'] / added:.0f} packed bytes/doc, snapshot "
+        f"{similarity.path.stat().st_size / 2**20:.1f} MB in {snapshot_seconds:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
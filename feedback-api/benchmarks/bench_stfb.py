@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+STFB v1 vs v2 benchmark 📊
+Compares compression ratio and compress/decompress time of:
+  v1       - indent=2 JSON, zlib level 9 (the original format)
+  v2       - compact JSON, zstd, no dictionary
+  v2+dict  - compact JSON, zstd with a dictionary trained on the corpus
+
+Usage:
+    python benchmarks/bench_stfb.py [--documents 4000] [--from-log]
+
+--from-log benchmarks real feedback from $FEEDBACK_DIR instead of a
+synthetic corpus. Half of the corpus trains the dictionary, the other half
+is measured.
+"""
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+import zlib
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import zstandard  # noqa: E402
+
+from stfb import DictionaryStore, ZSTD_LEVEL  # noqa: E402
+
+CATEGORIES = ["bug", "nice_to_have", "critical", "tool_request"]
+MODELS = ["claude-3-opus", "claude-3-sonnet", "gpt-4", "gpt-4o", "gemini-pro"]
+WORDS = (
+    "smart tree scan quantum mode directory large repo slow output json "
+    "compression marker semantic search files ignore permissions symlink "
+    "memory crash panic timeout relations mcp server tool context git"
+).split()
+
+
+def synthetic_corpus(count: int, seed: int = 42) -> list:
+    """Feedback documents shaped like what AI assistants actually send"""
+    rng = random.Random(seed)
+
+    def sentence(n: int) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(n))
+
+    corpus = []
+    for _ in range(count):
+        corpus.append(
+            {
+                "id": f"{rng.getrandbits(128):032x}",
+                "category": rng.choice(CATEGORIES),
+                "title": sentence(6).capitalize(),
+                "description": ". ".join(
+                    sentence(12) for _ in range(rng.randint(1, 5))
+                ),
+                "affected_command": f"st --mode {rng.choice(WORDS)} .",
+                "mcp_tool": rng.choice([None, "find_files", "search_in_files"]),
+                "examples": [
+                    {
+                        "description": sentence(5),
+                        "code": f"st {rng.choice(WORDS)} --depth {rng.randint(1, 9)}",
+                        "expected_output": None,
+                    }
+                ],
+                "proposed_solution": sentence(15),
+                "ai_model": rng.choice(MODELS),
+                "smart_tree_version": f"3.{rng.randint(0, 4)}.{rng.randint(0, 9)}",
+                "timestamp": f"2025-08-{rng.randint(1, 28):02d}T"
+                f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00Z",
+                "tags": rng.sample(WORDS, 3),
+                "auto_fixable": rng.random() < 0.3,
+                "fix_complexity": rng.choice(["trivial", "simple", "moderate", None]),
+                "proposed_fix": None,
+                "impact_score": rng.randint(1, 10),
+                "frequency_score": rng.randint(1, 10),
+            }
+        )
+    return corpus
+
+
+def compact(document: dict) -> bytes:
+    return json.dumps(document, separators=(",", ":")).encode()
+
+
+def log_corpus() -> list:
+    from feedback_log import get_feedback_log
+
+    return [document for _, document in get_feedback_log().iter_feedback()]
+
+
+def measure(name, payloads, compress, decompress):
+    started = time.perf_counter()
+    compressed = [compress(p) for p in payloads]
+    compress_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for c in compressed:
+        decompress(c)
+    decompress_time = time.perf_counter() - started
+
+    original = sum(len(p) for p in payloads)
+    stored = sum(len(c) for c in compressed)
+    per_doc = 1e6 / len(payloads)
+    print(
+        f"{name:<9} {original / len(payloads):>9.0f} {stored / len(payloads):>9.0f} "
+        f"{original / stored:>7.2f} {compress_time * per_doc:>11.1f} "
+        f"{decompress_time * per_doc:>11.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=4000)
+    parser.add_argument("--from-log", action="store_true")
+    args = parser.parse_args()
+
+    corpus = log_corpus() if args.from_log else synthetic_corpus(args.documents)
+    train, test = corpus[: len(corpus) // 2], corpus[len(corpus) // 2 :]
+    print(f"📊 {len(train)} training / {len(test)} measured documents\n")
+
+    store = DictionaryStore(Path(tempfile.mkdtemp()))
+    dict_id = store.train([compact(d) for d in train])
+    store.activate(dict_id)
+
+    plain = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    unplain = zstandard.ZstdDecompressor()
+
+    print(
+        f"{'format':<9} {'avg in':>9} {'avg out':>9} {'ratio':>7} {'comp µs':>11} {'decomp µs':>11}"
+    )
+    measure(
+        "v1",
+        [json.dumps(d, indent=2).encode() for d in test],
+        lambda p: zlib.compress(p, level=9),
+        zlib.decompress,
+    )
+    measure("v2", [compact(d) for d in test], plain.compress, unplain.decompress)
+    measure(
+        "v2+dict",
+        [compact(d) for d in test],
+        lambda p: store.compress(p)[1],
+        lambda c: store.decompress(c, dict_id, 1 << 20),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Tool usage ingest benchmark 🔧
+Replays a stream of tool events (default 10k events per second for 10
+seconds, Zipf-distributed over tools and models) through the API in process:
+  per-event  - one POST /tools/usage per event (timed on a sample)
+  batched    - the client counts events per tool and model and sends one
+               POST /tools/usage/batch per window
+
+Usage:
+    python benchmarks/bench_tool_usage.py [--rate 10000] [--seconds 10] [--window 1]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from itertools import accumulate
+from pathlib import Path
+
+for name in ("FEEDBACK_DIR", "STATS_DIR", "CONSENT_DIR"):
+    os.environ.setdefault(name, tempfile.mkdtemp())
+os.environ.setdefault("FEEDBACK_STREAM_ENABLED", "false")
+os.environ.setdefault("SHARED_STATE_BACKEND", "local")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from main import app, tool_usage  # noqa: E402
+
+MODELS = ["claude-opus", "claude-sonnet", "gpt-4", "gemini", "llama"]
+
+
+def event_stream(count: int, tools: int, seed: int = 7) -> list:
+    """(tool, model) per event, a few tools taking most of the calls"""
+    rng = random.Random(seed)
+    names = [f"tool_{i:03d}" for i in range(tools)]
+    weights = list(accumulate(1 / (rank + 1) for rank in range(tools)))
+    return list(
+        zip(
+            rng.choices(names, cum_weights=weights, k=count),
+            rng.choices(MODELS, k=count),
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rate", type=int, default=10000, help="events per second")
+    parser.add_argument("--seconds", type=int, default=10)
+    parser.add_argument("--window", type=float, default=1.0, help="batch window (s)")
+    parser.add_argument("--tools", type=int, default=60)
+    parser.add_argument("--sample", type=int, default=2000)
+    args = parser.parse_args()
+
+    client = TestClient(app)
+    events = event_stream(args.rate * args.seconds, args.tools)
+
+    # One request per event
+    started = time.perf_counter()
+    for tool, model in events[: args.sample]:
+        client.post(
+            "/tools/usage",
+            json={"tool_name": tool, "model_type": model, "success_rate": 1.0},
+        )
+    per_event = args.sample / (time.perf_counter() - started)
+
+    # One request per window of client-side counts
+    per_window = int(args.rate * args.window)
+    requests = 0
+    started = time.perf_counter()
+    for start in range(0, len(events), per_window):
+        counts = Counter(events[start : start + per_window])
+        response = client.post(
+            "/tools/usage/batch",
+            json={
+                "stats": [
+                    {
+                        "tool_name": tool,
+                        "model_type": model,
+                        "usage_count": count,
+                        "success_rate": 1.0,
+                    }
+                    for (tool, model), count in counts.items()
+                ]
+            },
+        )
+        assert response.status_code == 200, response.text
+        requests += 1
+    elapsed = time.perf_counter() - started
+    tool_usage.sync_if_due()
+
+    total = sum(tool["count"] for tool in tool_usage.stats().values())
+    assert total == len(events) + args.sample
+    print(f"{len(events)} events over {args.seconds}s at {args.rate}/s")
+    print(f"per-event : {per_event:>10.0f} events/s  (1 request per event)")
+    print(
+        f"batched   : {len(events) / elapsed:>10.0f} events/s  "
+        f"({requests} requests, {elapsed / requests * 1000:.2f} ms each, "
+        f"{len(events) // requests} events per request)"
+    )
+    print(f"headroom  : {len(events) / elapsed / args.rate:.0f}x the offered rate")
+
+
+if __name__ == "__main__":
+    main()
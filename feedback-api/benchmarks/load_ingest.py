@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Ingest load test 🚦
+Measures GET latency (p50/p99) while idle and during a burst of feedback
+submissions, to show that submissions no longer stall the event loop.
+
+Usage:
+    python benchmarks/load_ingest.py                # local server, ingest pool
+    python benchmarks/load_ingest.py --inline       # same, old inline behaviour
+    python benchmarks/load_ingest.py --server-cpus 1-3 --client-cpus 0
+    python benchmarks/load_ingest.py --url http://localhost:8420 --api-key admin_001:sk_...
+
+Without --url the API is started in a child process with a throwaway
+FEEDBACK_DIR and the in-memory rate limiter. Submissions are spread over
+every agent key so the per-key rate limits don't cap the burst.
+
+Client and server compete for CPU unless they are pinned apart
+(--server-cpus / --client-cpus, Linux only). Without that, the burst numbers
+measure CPU contention rather than event loop stalls; the script says so
+when it runs on a single CPU.
+"""
+
+import argparse
+import asyncio
+import atexit
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+GET_PATHS = ["/", "/feedback/stats", "/credits/leaderboard"]
+
+
+def cpu_list(spec: str) -> set:
+    """CPUs from a list like 0,2-3"""
+    cpus = set()
+    for part in spec.split(","):
+        first, _, last = part.partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def serve(port: int, inline: bool, cpus: str = None):
+    """Run the API with a throwaway FEEDBACK_DIR and the in-memory rate limiter"""
+    if cpus:
+        os.sched_setaffinity(0, cpu_list(cpus))
+    for name in ("FEEDBACK_DIR", "STATS_DIR", "CONSENT_DIR"):
+        os.environ[name] = tempfile.mkdtemp()
+
+    import uvicorn
+
+    import auth
+    import main
+    from ingest import IngestPipeline
+
+    auth.redis_client = None
+    if inline:
+        main.ingest = IngestPipeline(workers=0)
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def start_server(port: int, inline: bool, cpus: str = None) -> list:
+    """Boot the API in a child process; returns X-API-Key values to submit with"""
+    secrets = {
+        "AGENT_CLAUDE_KEY": ("agent_claude_001", 95),
+        "AGENT_GPT_KEY": ("agent_gpt_001", 95),
+        "AGENT_OPENROUTER_KEY": ("agent_openrouter_001", 45),
+        "ADMIN_API_KEY": ("admin_001", 95),  # /feedback allows 100/min per key
+    }
+    env = dict(os.environ, **{name: f"load-test-{name}" for name in secrets})
+    command = [sys.executable, __file__, "--serve", "--port", str(port)]
+    command += ["--inline"] if inline else []
+    command += ["--server-cpus", cpus] if cpus else []
+    server = subprocess.Popen(command, env=env)
+    atexit.register(server.terminate)
+
+    while True:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/")
+            break
+        except httpx.TransportError:
+            time.sleep(0.1)
+
+    keys = []
+    for name, (agent_id, budget) in secrets.items():
+        keys += [f"{agent_id}:load-test-{name}"] * budget
+    return keys
+
+
+def make_feedback(i: int) -> dict:
+    words = "quantum scan tree directory slow output marker search compression".split()
+    return {
+        "category": random.choice(["bug", "nice_to_have", "critical"]),
+        "title": f"Load test feedback {i}",
+        "description": " ".join(random.choice(words) for _ in range(400)),
+        "ai_model": random.choice(["claude-3-opus", "gpt-4"]),
+        "smart_tree_version": "3.3.5",
+        "impact_score": random.randint(1, 10),
+        "frequency_score": random.randint(1, 10),
+        "tags": ["load-test"],
+    }
+
+
+async def poll(client: httpx.AsyncClient, stop: asyncio.Event, latencies: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get(random.choice(GET_PATHS))
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def submit_all(
+    client: httpx.AsyncClient, keys: list, concurrency: int
+) -> Counter:
+    statuses = Counter()
+    queue = list(enumerate(keys))
+
+    async def worker():
+        while queue:
+            i, key = queue.pop()
+            response = await client.post(
+                "/feedback", json=make_feedback(i), headers={"X-API-Key": key}
+            )
+            statuses[response.status_code] += 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return statuses
+
+
+async def phase(client, pollers: int, seconds: float, burst=None):
+    stop, latencies = asyncio.Event(), []
+    tasks = [asyncio.create_task(poll(client, stop, latencies)) for _ in range(pollers)]
+    started = time.perf_counter()
+    statuses = await burst if burst else await asyncio.sleep(seconds)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*tasks)
+    return latencies, statuses, elapsed
+
+
+def report(name: str, latencies: list):
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{name:<8} {len(latencies):>7} {statistics.median(latencies):>9.2f} "
+        f"{p99:>9.2f} {latencies[-1]:>9.2f}"
+    )
+
+
+async def run(args, keys: list):
+    limits = httpx.Limits(max_connections=args.pollers + args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=args.url, limits=limits, timeout=30
+    ) as client:
+        idle, _, _ = await phase(client, args.pollers, args.idle_seconds)
+        burst, statuses, elapsed = await phase(
+            client, args.pollers, 0, submit_all(client, keys, args.concurrency)
+        )
+
+    print(f"GET latency (ms), {args.pollers} concurrent pollers")
+    print(f"{'phase':<8} {'requests':>7} {'p50':>9} {'p99':>9} {'max':>9}")
+    report("idle", idle)
+    report("burst", burst)
+    print(
+        f"\n📮 {sum(statuses.values())} submissions in {elapsed:.2f}s "
+        f"({sum(statuses.values()) / elapsed:.0f}/s): {dict(statuses)}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="Target a running server instead")
+    parser.add_argument("--api-key", help="X-API-Key for --url")
+    parser.add_argument(
+        "--submissions", type=int, default=90, help="Burst size for --url"
+    )
+    parser.add_argument("--inline", action="store_true", help="Disable the ingest pool")
+    parser.add_argument("--pollers", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--idle-seconds", type=float, default=3.0)
+    parser.add_argument("--port", type=int, default=8421)
+    parser.add_argument("--server-cpus", help='pin the API to these CPUs, e.g. "1-3"')
+    parser.add_argument("--client-cpus", help='pin this client to these CPUs, e.g. "0"')
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.port, args.inline, args.server_cpus)
+
+    if args.client_cpus:
+        os.sched_setaffinity(0, cpu_list(args.client_cpus))
+    if args.url:
+        keys = [args.api_key] * args.submissions
+    else:
+        keys = start_server(args.port, args.inline, args.server_cpus)
+        args.url = f"http://127.0.0.1:{args.port}"
+        if os.cpu_count() == 1:
+            print(
+                "⚠️  Single CPU: client and server share it, so burst latency "
+                "reflects CPU contention, not event loop stalls"
+            )
+    asyncio.run(run(args, keys))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Conditional GET for the polled read endpoints
+Every cacheable resource has a generation counter that writers bump. A
+route's ETag is made from the counters it reads (plus a per-process boot
+token), so it is known before the handler runs: `If-None-Match` and
+`If-Modified-Since` are answered with an empty 304 without building, let
+alone hashing, the body. Responses also carry a per-route `Cache-Control`
+so the nginx/Caddy front ends can cache and revalidate them.
+
+With several API instances the counters live in the shared state
+(`Generations.share`), so a change made through one instance invalidates the
+tags every instance hands out.
+
+    @app.get("/feedback/stats", dependencies=[Depends(conditional("feedback"))])
+"""
+
+import hashlib
+import threading
+import time
+from collections import defaultdict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Dict, Iterable, Optional
+
+from fastapi import HTTPException, Request, Response
+
+from shared_state import SharedState
+
+
+class Generations:
+    """Named change counters with the time of their last change"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        # Counters restart with the process, so tags from before a restart
+        # must never match
+        self.boot = f"{time.time_ns():x}"
+        self._counters: Dict[str, int] = defaultdict(int)
+        self._changed: Dict[str, float] = {}
+        self.state: Optional[SharedState] = None
+
+    def share(self, state: SharedState):
+        """Keep the counters in ``state`` so every instance sees them"""
+        # One boot token for all instances; it changes if the state is lost
+        state.put_if_absent("generation_boot", "boot", self.boot)
+        self.boot = state.get_map("generation_boot")["boot"]
+        self.state = state
+
+    def bump(self, *names: str):
+        """Record that the data behind these resources changed"""
+        now = time.time()
+        if self.state:
+            self.state.incr("generations", {(name, "count"): 1 for name in names})
+            self.state.put_many("generation_changed", {name: now for name in names})
+            return
+        with self._lock:
+            for name in names:
+                self._counters[name] += 1
+                self._changed[name] = now
+
+    def etag(self, names: Iterable[str], extra: str = "") -> str:
+        """Strong ETag for a view over the named resources"""
+        if self.state:
+            shared = self.state.counters("generations")
+            counters = ".".join(
+                str(shared.get(name, {}).get("count", 0)) for name in names
+            )
+        else:
+            with self._lock:
+                counters = ".".join(str(self._counters[name]) for name in names)
+        tag = f"{self.boot}-{counters}"
+        if extra:
+            tag += "-" + hashlib.blake2b(extra.encode(), digest_size=6).hexdigest()
+        return f'"{tag}"'
+
+    def last_modified(self, names: Iterable[str]) -> float:
+        if self.state:
+            changed = self.state.get_map("generation_changed")
+        else:
+            changed = self._changed
+        with self._lock:
+            return max([self.started, *(changed.get(name, 0) for name in names)])
+
+
+generations = Generations()
+
+
+def not_modified(request: Request, etag: str, last_modified: float) -> bool:
+    """Whether the client's validators still match (If-None-Match wins over
+    If-Modified-Since, as RFC 9110 requires)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        # If-None-Match uses the weak comparison
+        return "*" in tags or etag in (tag.removeprefix("W/") for tag in tags)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
+def conditional(
+    *names: str,
+    cache_control: str = "no-cache",
+    extra: Optional[Callable[[], str]] = None,
+) -> Callable[[Request, Response], None]:
+    """Route dependency adding validators and Cache-Control, and answering
+    304 when the client's copy is current.
+
+    ``names`` are the generations the route's body depends on. ``extra``
+    covers anything else it depends on (the current day, a cache window);
+    it must be cheap, since it runs on every request.
+    """
+    state = {"extra": None, "changed": generations.started}
+
+    def dependency(request: Request, response: Response):
+        token = extra() if extra else ""
+        if token != state["extra"]:
+            state["extra"] = token
+            if extra:
+                state["changed"] = time.time()
+
+        etag = generations.etag(names, token)
+        modified = max(generations.last_modified(names), state["changed"])
+        headers = {
+            "ETag": etag,
+            "Last-Modified": formatdate(modified, usegmt=True),
+            "Cache-Control": cache_control,
+        }
+        if not_modified(request, etag, modified):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+    return dependency
+
+
+__all__ = ["Generations", "generations", "conditional"]
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Fast JSON for responses, STFB payloads and read paths
+orjson when it is installed (several times faster than the json module at
+both ends, and it emits UTF-8 bytes directly), the standard library
+otherwise. Output is always compact: no indentation, no spaces after
+separators, non-ASCII kept as UTF-8.
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - standard library json only
+    orjson = None
+
+if orjson:
+
+    def dumps(value: Any) -> bytes:
+        """Compact UTF-8 JSON bytes (anything unknown becomes its str())"""
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(data: Union[bytes, str]) -> Any:
+        """Parse JSON; raises ValueError on malformed input"""
+        return orjson.loads(data)
+
+else:  # pragma: no cover
+
+    def dumps(value: Any) -> bytes:
+        return json.dumps(
+            value, separators=(",", ":"), ensure_ascii=False, default=str
+        ).encode()
+
+    def loads(data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+
+def json_array(items: list) -> bytes:
+    """A JSON array spliced from already-encoded JSON values"""
+    return b"[" + b",".join(items) + b"]"
+
+
+__all__ = ["dumps", "loads", "json_array"]
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Incrementally maintained feedback aggregates
+Totals, per-day/category/model counts and impact sums are updated as part of
+every write and checkpointed to a small JSON file, so /feedback/stats and the
+leaderboard are O(number of models) reads.
+"""
+
+import json
+import os
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict
+
+from feedback_index import FeedbackIndex
+
+CHECKPOINT_EVERY = int(os.getenv("AGGREGATES_CHECKPOINT_EVERY", "100"))
+
+
+class FeedbackAggregates:
+    """Counters keyed by date, category and model, plus impact sums"""
+
+    def __init__(self, path: Path, checkpoint_every: int = CHECKPOINT_EVERY):
+        self.path = Path(path)
+        self.checkpoint_every = checkpoint_every
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self._reset()
+
+    def _reset(self):
+        self.total = 0
+        self.total_impact = 0
+        self.original_size = 0
+        self.compressed_size = 0
+        self.by_date: Dict[str, int] = defaultdict(int)
+        self.by_category: Dict[str, int] = defaultdict(int)
+        self.by_model: Dict[str, Dict[str, Any]] = defaultdict(
+            lambda: {"count": 0, "total_impact": 0, "categories": defaultdict(int)}
+        )
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+
+    def add(
+        self,
+        day: str,
+        category: str,
+        model: str,
+        impact: int,
+        original_size: int = 0,
+        compressed_size: int = 0,
+    ):
+        """Count one new feedback item"""
+        with self._lock:
+            self.total += 1
+            self.total_impact += impact
+            self.original_size += original_size
+            self.compressed_size += compressed_size
+            self.by_date[day] += 1
+            self.by_category[category] += 1
+            stats = self.by_model[model]
+            stats["count"] += 1
+            stats["total_impact"] += impact
+            stats["categories"][category] += 1
+
+            self._dirty += 1
+            if self.checkpoint_every and self._dirty >= self.checkpoint_every:
+                self._checkpoint_locked()
+
+    def rebuild(self, index: FeedbackIndex):
+        """Recompute every counter from the metadata index"""
+        with self._lock:
+            self._reset()
+            for row in index.model_category_counts():
+                stats = self.by_model[row["ai_model"]]
+                stats["count"] += row["count"]
+                stats["total_impact"] += row["impact"]
+                stats["categories"][row["category"]] += row["count"]
+                self.by_category[row["category"]] += row["count"]
+                self.total += row["count"]
+                self.total_impact += row["impact"]
+            self.by_date.update(index.count_by("day"))
+            self.original_size, self.compressed_size = index.compression_totals()
+            self._checkpoint_locked()
+
+    # ------------------------------------------------------------------
+    # Checkpointing
+    # ------------------------------------------------------------------
+
+    def checkpoint(self):
+        """Durably write the counters if anything changed"""
+        with self._lock:
+            if self._dirty:
+                self._checkpoint_locked()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Consistent copy of every counter"""
+        with self._lock:
+            return self._snapshot_locked()
+
+    def _snapshot_locked(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "total_impact": self.total_impact,
+            "original_size": self.original_size,
+            "compressed_size": self.compressed_size,
+            "by_date": dict(self.by_date),
+            "by_category": dict(self.by_category),
+            "by_model": {
+                model: {**stats, "categories": dict(stats["categories"])}
+                for model, stats in self.by_model.items()
+            },
+        }
+
+    def _checkpoint_locked(self):
+        data = self._snapshot_locked()
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._dirty = 0
+
+    def load(self) -> bool:
+        """Load the last checkpoint; False if there is none or it is unreadable"""
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        with self._lock:
+            self._reset()
+            self.total = data["total"]
+            self.total_impact = data["total_impact"]
+            self.original_size = data["original_size"]
+            self.compressed_size = data["compressed_size"]
+            self.by_date.update(data["by_date"])
+            self.by_category.update(data["by_category"])
+            for model, stats in data["by_model"].items():
+                self.by_model[model]["count"] = stats["count"]
+                self.by_model[model]["total_impact"] = stats["total_impact"]
+                self.by_model[model]["categories"].update(stats["categories"])
+        return True
+
+    def ensure_consistent(self, index: FeedbackIndex) -> bool:
+        """Startup check: rebuild from the index if the checkpoint is stale.
+
+        Returns True if a rebuild was needed.
+        """
+        if self.load() and self.total == index.count():
+            return False
+        self.rebuild(index)
+        return True
+
+
+__all__ = ["FeedbackAggregates"]
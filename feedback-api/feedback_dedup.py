@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Ingest-time duplicate suppression for feedback
+Agents retry. A retried report carries a new timestamp, hence a new feedback
+id, so without this every retry would be stored, compressed and later turned
+into GitHub work of its own. Each submission gets a content fingerprint
+(category, title, description, command and tool, with case and whitespace
+normalized) and a repeat inside the window answers with the id stored first.
+
+Fingerprints of the last FEEDBACK_DEDUP_WINDOW_DAYS days sit in one Bloom
+filter per day: a miss there means "new" without touching the disk, a
+possible hit is confirmed against an exact SQLite table that maps the
+fingerprint to its feedback id. Days age out of the window whole.
+
+A claim is recorded before its feedback is written. Until `confirm()` the
+claim is in flight and repeats are answered with its id; after a crash in
+between, the owner it names was never stored, so a caller-supplied check
+lets the next repeat take the fingerprint over instead.
+"""
+
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional
+
+FINGERPRINT_FIELDS = (
+    "category",
+    "title",
+    "description",
+    "affected_command",
+    "mcp_tool",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    fingerprint TEXT PRIMARY KEY,
+    feedback_id TEXT NOT NULL,
+    day TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fingerprints_day ON fingerprints (day);
+"""
+
+
+def fingerprint(document: Dict[str, Any]) -> str:
+    """Normalized content fingerprint of a feedback document (128-bit hex)"""
+    parts = (
+        " ".join(str(document.get(field) or "").lower().split())
+        for field in FINGERPRINT_FIELDS
+    )
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()[:32]
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over fingerprints (which are already hashes)"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, fingerprint: str) -> Iterable[int]:
+        # Double hashing: two 64-bit halves of the fingerprint give k probes
+        h1 = int(fingerprint[:16], 16)
+        h2 = int(fingerprint[16:32], 16) | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, fingerprint: str):
+        for position in self._positions(fingerprint):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, fingerprint: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(fingerprint)
+        )
+
+
+class FeedbackDedup:
+    """Rolling, day-partitioned Bloom filters backed by an exact SQLite store"""
+
+    def __init__(
+        self,
+        path: Path,
+        window_days: int = 7,
+        capacity_per_day: int = 100_000,
+        error_rate: float = 0.01,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.window_days = window_days
+        self.capacity_per_day = capacity_per_day
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+        self._filters: Dict[str, BloomFilter] = {}
+        self._pending: Dict[str, str] = {}  # fingerprint -> owner not yet stored
+        for value, day in self._conn.execute(
+            "SELECT fingerprint, day FROM fingerprints"
+        ):
+            self._filter(day).add(value)
+
+        self.hits = 0  # repeats answered with the existing id
+        self.misses = 0  # new content, stored
+        self.false_positives = 0  # Bloom said maybe, the exact store said no
+        self.duplicate_bytes = 0  # JSON bytes of the repeats that were not stored
+        self.dangling = 0  # owners that were never stored, taken over
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _filter(self, day: str) -> BloomFilter:
+        if day not in self._filters:
+            self._filters[day] = BloomFilter(self.capacity_per_day, self.error_rate)
+        return self._filters[day]
+
+    def _cutoff(self, day: str) -> str:
+        """Oldest day still inside the window ending at ``day``"""
+        return f"{date.fromisoformat(day) - timedelta(days=self.window_days - 1)}"
+
+    def _expire_locked(self, cutoff: str):
+        expired = [day for day in self._filters if day < cutoff]
+        if not expired:
+            return
+        for day in expired:
+            del self._filters[day]
+        self._conn.execute("DELETE FROM fingerprints WHERE day < ?", (cutoff,))
+
+    def claim(
+        self,
+        value: str,
+        feedback_id: str,
+        day: str,
+        size: int = 0,
+        stored: Optional[Callable[[str], Any]] = None,
+    ) -> Optional[str]:
+        """Id of the feedback already stored with this fingerprint, or None
+        after recording ``feedback_id`` as its owner.
+
+        ``stored(owner)`` is asked about owners claimed by an earlier process;
+        a falsy answer means that process died before writing the feedback,
+        and ``feedback_id`` takes the fingerprint over."""
+        if self.window_days <= 0:
+            return None
+
+        with self._lock:
+            cutoff = self._cutoff(day)
+            self._expire_locked(cutoff)
+
+            if any(value in bloom for bloom in self._filters.values()):
+                row = self._conn.execute(
+                    "SELECT feedback_id FROM fingerprints WHERE fingerprint = ? AND day >= ?",
+                    (value, cutoff),
+                ).fetchone()
+                if not row:
+                    self.false_positives += 1
+                elif (
+                    stored is None
+                    or self._pending.get(value) == row[0]
+                    or stored(row[0])
+                ):
+                    self.hits += 1
+                    self.duplicate_bytes += size
+                    return row[0]
+                else:
+                    self.dangling += 1
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?)",
+                (value, feedback_id, day),
+            )
+            self._filter(day).add(value)
+            self._pending[value] = feedback_id
+            self.misses += 1
+            return None
+
+    def confirm(self, values: Iterable[str]):
+        """Mark claims whose feedback has been stored"""
+        with self._lock:
+            for value in values:
+                self._pending.pop(value, None)
+
+    def release(self, values: Iterable[str]):
+        """Forget claims whose feedback could not be stored after all"""
+        values = list(values)
+        with self._lock:
+            for value in values:
+                self._pending.pop(value, None)
+            self._conn.executemany(
+                "DELETE FROM fingerprints WHERE fingerprint = ?",
+                [(value,) for value in values],
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters (since process start) for health and stats"""
+        checked = self.hits + self.misses
+        return {
+            "window_days": self.window_days,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / checked, 4) if checked else 0.0,
+            "false_positives": self.false_positives,
+            "duplicate_bytes": self.duplicate_bytes,
+            "dangling": self.dangling,
+        }
+
+
+# Singleton instance
+_feedback_dedup: Optional[FeedbackDedup] = None
+
+
+def get_feedback_dedup() -> FeedbackDedup:
+    """Get or create the feedback dedup filter"""
+    global _feedback_dedup
+    if _feedback_dedup is None:
+        feedback_dir = Path(os.getenv("FEEDBACK_DIR", "./feedback"))
+        _feedback_dedup = FeedbackDedup(
+            Path(os.getenv("FEEDBACK_DEDUP_PATH", feedback_dir / "dedup.sqlite3")),
+            window_days=int(os.getenv("FEEDBACK_DEDUP_WINDOW_DAYS", "7")),
+            capacity_per_day=int(os.getenv("FEEDBACK_DEDUP_DAILY_CAPACITY", "100000")),
+        )
+    return _feedback_dedup
+
+
+__all__ = [
+    "FeedbackDedup",
+    "fingerprint",
+    "get_feedback_dedup",
+]
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Streaming export of the feedback corpus
+Decoded feedback documents are streamed as NDJSON (optionally gzipped on the
+fly) straight from the log, one bounded batch at a time, so memory stays
+flat no matter how large the corpus is.
+
+Every line carries a `_cursor`. Passing the cursor of the last line received
+resumes an interrupted export right after it. Cursors are (day, position in
+day, record location): the export seeks straight to the location, and only
+if compaction has removed its segment since does it count its way to the
+position instead (packing keeps each day's records in order).
+"""
+
+import base64
+import zlib
+from datetime import datetime
+from itertools import islice
+from typing import AsyncIterator, Awaitable, Callable, Iterator, List, Optional, Tuple
+
+import fast_json
+from feedback_log import FeedbackLog, RecordLocation
+from stfb import FEEDBACK_MAGIC
+
+EXPORT_BATCH_BYTES = 64 * 1024  # NDJSON bytes produced per worker round trip
+
+
+def encode_cursor(day: str, position: int, location: RecordLocation) -> str:
+    """Opaque cursor for 'resume after record <position> of <day>, stored at
+    <location>'"""
+    raw = f"{day}:{position}:{location.segment}:{location.offset}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int, Optional[RecordLocation]]:
+    """Inverse of encode_cursor; raises ValueError on anything else. Cursors
+    from before locations were added decode with location None."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        day, position, *location = raw.split(":")
+        datetime.strptime(day, "%Y-%m-%d")
+        if location:
+            segment, offset = location
+            return day, int(position), RecordLocation(segment, int(offset))
+        return day, int(position), None
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid export cursor: {cursor}") from e
+
+
+def iter_export(
+    feedback_log: FeedbackLog,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    category: Optional[str] = None,
+    ai_model: Optional[str] = None,
+    cursor: Optional[str] = None,
+) -> Iterator[bytes]:
+    """NDJSON lines for every matching feedback document, oldest first.
+
+    ``since``/``until`` are inclusive YYYY-MM-DD days the feedback was
+    received on. Blocking; run it off the event loop.
+    """
+    resume_day, resume_position, resume_at = (
+        decode_cursor(cursor) if cursor else (None, 0, None)
+    )
+
+    for day in feedback_log.days():
+        if (since and day < since) or (until and day > until):
+            continue
+        if resume_day and day < resume_day:
+            continue
+        skip = resume_position if day == resume_day else 0
+
+        if skip and resume_at and resume_at.segment in feedback_log.sources(day):
+            # Seek to the last record sent and step over it
+            records = islice(feedback_log.iter_records([day], start=resume_at), 1, None)
+        else:
+            # Compacted since (or an old cursor): count to the position
+            records = islice(feedback_log.iter_records([day]), skip, None)
+        for position, (location, record) in enumerate(records, start=skip + 1):
+            if record.magic != FEEDBACK_MAGIC:
+                continue
+            metadata = record.metadata
+            # v3 headers let non-matching records be skipped undecoded
+            if metadata and (
+                (category and metadata.category != category)
+                or (ai_model and metadata.ai_model != ai_model)
+            ):
+                continue
+
+            document = record.document()
+            if (category and document.get("category") != category) or (
+                ai_model and document.get("ai_model") != ai_model
+            ):
+                continue
+            document["_cursor"] = encode_cursor(day, position, location)
+            yield fast_json.dumps(document) + b"\n"
+
+
+def next_batch(lines: Iterator[bytes], max_bytes: int = EXPORT_BATCH_BYTES) -> bytes:
+    """Up to ~max_bytes of NDJSON from ``lines`` (empty once exhausted)"""
+    batch: List[bytes] = []
+    size = 0
+    for line in lines:
+        batch.append(line)
+        size += len(line)
+        if size >= max_bytes:
+            break
+    return b"".join(batch)
+
+
+async def stream_export(
+    lines: Iterator[bytes],
+    offload: Callable[..., Awaitable[bytes]],
+    gzip: bool = False,
+) -> AsyncIterator[bytes]:
+    """Drive ``lines`` batch by batch on a worker (via ``offload``) and yield
+    the bytes, gzip-compressed on the fly if asked"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+    while True:
+        chunk = await offload(next_batch, lines)
+        if not chunk:
+            break
+        if compressor:
+            chunk = compressor.compress(chunk)
+        if chunk:
+            yield chunk
+    if compressor:
+        yield compressor.flush()
+
+
+__all__ = [
+    "encode_cursor",
+    "decode_cursor",
+    "iter_export",
+    "stream_export",
+]
@@ -0,0 +1,725 @@
+#!/usr/bin/env python3
+"""
+Embedded SQLite metadata index for feedback
+One row per feedback id, written alongside every log append, so stats and
+listings are indexed queries instead of rescans of the whole history.
+
+The id -> log location map is also held in memory (loaded at startup), so
+by-id operations never touch the disk to find a record. If the process dies
+between a log append and its index write, the index catches up from the log
+on the next start; `python feedback_index.py rebuild` re-creates it from
+scratch.
+"""
+
+import base64
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from feedback_log import FeedbackLog, RecordLocation
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS feedback (
+    id TEXT PRIMARY KEY,
+    category TEXT NOT NULL,
+    ai_model TEXT NOT NULL,
+    impact_score INTEGER NOT NULL,
+    frequency_score INTEGER NOT NULL,
+    smart_tree_version TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    day TEXT NOT NULL,
+    title TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    processed INTEGER NOT NULL DEFAULT 0,
+    segment TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    original_size INTEGER NOT NULL DEFAULT 0,
+    compressed_size INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_feedback_day ON feedback (day);
+CREATE INDEX IF NOT EXISTS idx_feedback_category ON feedback (category, timestamp);
+CREATE INDEX IF NOT EXISTS idx_feedback_model ON feedback (ai_model, category);
+CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback (timestamp);
+CREATE INDEX IF NOT EXISTS idx_feedback_pending ON feedback (processed, day, id);
+CREATE INDEX IF NOT EXISTS idx_feedback_location ON feedback (segment, offset);
+
+-- Full-text search; rowid = feedback.rowid (kept stable by upserts)
+CREATE VIRTUAL TABLE IF NOT EXISTS feedback_fts USING fts5 (
+    title,
+    description,
+    proposed_solution,
+    affected_command,
+    tags,
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+
+CREATE TABLE IF NOT EXISTS leases (
+    feedback_id TEXT PRIMARY KEY,
+    token TEXT NOT NULL,
+    worker TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    deliveries INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS dispatches (
+    feedback_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    document TEXT NOT NULL
+);
+"""
+
+COLUMNS = (
+    "id",
+    "category",
+    "ai_model",
+    "impact_score",
+    "frequency_score",
+    "smart_tree_version",
+    "timestamp",
+    "day",
+    "title",
+    "summary",
+    "tags",
+    "processed",
+    "segment",
+    "offset",
+    "original_size",
+    "compressed_size",
+)
+
+
+SEARCH_COLUMNS = (
+    "title",
+    "description",
+    "proposed_solution",
+    "affected_command",
+    "tags",
+)
+
+# BM25 weights per SEARCH_COLUMNS entry: a hit in the title counts most
+SEARCH_WEIGHTS = (10.0, 1.0, 2.0, 4.0, 3.0)
+
+
+def search_fields(document: Dict[str, Any]) -> Tuple:
+    """Full-text fields of a feedback document, in SEARCH_COLUMNS order"""
+    return (
+        document.get("title") or "",
+        document.get("description") or "",
+        document.get("proposed_solution") or "",
+        document.get("affected_command") or "",
+        " ".join(document.get("tags") or []),
+    )
+
+
+def index_row(
+    document: Dict[str, Any],
+    location: RecordLocation,
+    original_size: int = 0,
+    compressed_size: int = 0,
+    processed: bool = False,
+) -> Tuple:
+    """Build an index row from a decoded feedback document (the COLUMNS
+    values followed by the SEARCH_COLUMNS text)"""
+    return (
+        document["id"],
+        document["category"],
+        document["ai_model"],
+        document["impact_score"],
+        document["frequency_score"],
+        document["smart_tree_version"],
+        document["timestamp"],
+        location.segment.split("/", 1)[0],
+        document["title"],
+        document["description"][:500],
+        json.dumps(document.get("tags", [])),
+        int(processed),
+        location.segment,
+        location.offset,
+        original_size,
+        compressed_size,
+    ) + search_fields(document)
+
+
+def encode_pending_cursor(day: str, feedback_id: str) -> str:
+    """Opaque cursor for 'pending items after (day, id)'"""
+    raw = f"{day}:{feedback_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_pending_cursor(cursor: str) -> Tuple[str, str]:
+    """Inverse of encode_pending_cursor; raises ValueError on anything else"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        day, feedback_id = raw.split(":", 1)
+        datetime.strptime(day, "%Y-%m-%d")
+        return day, feedback_id
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid pending cursor: {cursor}") from e
+
+
+def search_query(text: str) -> str:
+    """FTS5 query matching every word of free-form ``text`` (a trailing * on
+    a word makes it a prefix match); raises ValueError if nothing's left"""
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', "")
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    if not terms:
+        raise ValueError("Empty search query")
+    return " AND ".join(terms)
+
+
+def encode_search_cursor(score: float, rowid: int, snapshot: int) -> str:
+    """Opaque cursor for 'search results after (score, rowid), among rows up
+    to rowid `snapshot`'"""
+    raw = f"{score!r}:{rowid}:{snapshot}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_search_cursor(cursor: str) -> Tuple[float, int, int]:
+    """Inverse of encode_search_cursor; raises ValueError on anything else"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        score, rowid, snapshot = raw.split(":")
+        return float(score), int(rowid), int(snapshot)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid search cursor: {cursor}") from e
+
+
+class FeedbackIndex:
+    """SQLite (WAL mode) index over the feedback log"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.execute(
+            "INSERT INTO feedback_fts (feedback_fts, rank) VALUES ('rank', ?)",
+            (f"bm25({', '.join(str(weight) for weight in SEARCH_WEIGHTS)})",),
+        )
+
+        # id -> location map for constant-time by-id lookups
+        self._locations: Dict[str, RecordLocation] = {
+            row[0]: RecordLocation(row[1], row[2])
+            for row in self._conn.execute("SELECT id, segment, offset FROM feedback")
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def add(self, row: Tuple):
+        """Insert (or replace) a single feedback row"""
+        self.add_many([row])
+
+    def add_many(self, rows: Iterable[Tuple]):
+        """Insert rows in one transaction"""
+        rows = list(rows)
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._insert_locked(rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._remember_locked(rows)
+
+    def _insert_locked(self, rows: List[Tuple]):
+        width = len(COLUMNS)
+        # Upsert rather than REPLACE so a row keeps its rowid (the FTS key)
+        self._conn.executemany(
+            f"INSERT INTO feedback ({', '.join(COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in COLUMNS)}) "
+            f"ON CONFLICT (id) DO UPDATE SET "
+            f"{', '.join(f'{column} = excluded.{column}' for column in COLUMNS[1:])}",
+            [row[:width] for row in rows],
+        )
+        self._insert_search_locked(
+            [(row[0], *row[width:]) for row in rows if len(row) > width]
+        )
+
+    def _insert_search_locked(self, entries: List[Tuple]):
+        """(id, *search fields) -> FTS rows keyed by the feedback rowid"""
+        self._conn.executemany(
+            f"INSERT OR REPLACE INTO feedback_fts (rowid, {', '.join(SEARCH_COLUMNS)}) "
+            f"SELECT rowid, {', '.join('?' for _ in SEARCH_COLUMNS)} "
+            f"FROM feedback WHERE id = ?",
+            [(*entry[1:], entry[0]) for entry in entries],
+        )
+
+    def _remember_locked(self, rows: List[Tuple]):
+        segment, offset = COLUMNS.index("segment"), COLUMNS.index("offset")
+        for row in rows:
+            self._locations[row[0]] = RecordLocation(row[segment], row[offset])
+
+    def mark_processed(self, feedback_id: str) -> bool:
+        """Flag a feedback item as processed; False if the id is unknown"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE feedback SET processed = 1 WHERE id = ?", (feedback_id,)
+            )
+        return cursor.rowcount > 0
+
+    # ------------------------------------------------------------------
+    # Leases (claim / ack / nack by worker replicas)
+    # ------------------------------------------------------------------
+
+    def claim(
+        self,
+        worker: str,
+        limit: int,
+        lease_seconds: float,
+        now: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Lease up to ``limit`` unprocessed items nobody holds a live lease
+        on, oldest (day, id) first. Expired leases are simply claimable
+        again, which is how crashed workers' items get re-delivered."""
+        now = time.time() if now is None else now
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so concurrent claims
+            # (other API processes included) never hand out the same row
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT f.id, f.segment, f.offset FROM feedback f "
+                    "LEFT JOIN leases l ON l.feedback_id = f.id "
+                    "WHERE f.processed = 0 "
+                    "AND (l.feedback_id IS NULL OR l.expires_at <= ?) "
+                    "ORDER BY f.day, f.id LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                claimed = []
+                for row in rows:
+                    token = secrets.token_urlsafe(16)
+                    deliveries = self._conn.execute(
+                        "INSERT INTO leases VALUES (?, ?, ?, ?, 1) "
+                        "ON CONFLICT (feedback_id) DO UPDATE SET "
+                        "token = excluded.token, worker = excluded.worker, "
+                        "expires_at = excluded.expires_at, "
+                        "deliveries = deliveries + 1 RETURNING deliveries",
+                        (row["id"], token, worker, now + lease_seconds),
+                    ).fetchone()[0]
+                    claimed.append(
+                        {
+                            "id": row["id"],
+                            "location": RecordLocation(row["segment"], row["offset"]),
+                            "lease_token": token,
+                            "lease_expires_at": now + lease_seconds,
+                            "deliveries": deliveries,
+                        }
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return claimed
+
+    def ack(self, feedback_id: str, token: str) -> bool:
+        """Finish a leased item: flag it processed and drop the lease, in one
+        transaction. False if ``token`` no longer holds the lease (it expired
+        and another worker claimed the item)."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.execute(
+                    "DELETE FROM leases WHERE feedback_id = ? AND token = ?",
+                    (feedback_id, token),
+                )
+                if cursor.rowcount:
+                    self._conn.execute(
+                        "UPDATE feedback SET processed = 1 WHERE id = ?", (feedback_id,)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return cursor.rowcount > 0
+
+    def release(
+        self,
+        feedback_id: str,
+        token: str,
+        retry_after: float = 0,
+        now: Optional[float] = None,
+    ) -> bool:
+        """Give a lease back without finishing the item (nack): the token is
+        void and the item becomes claimable again after ``retry_after``
+        seconds. False if the lease is no longer ``token``'s."""
+        now = time.time() if now is None else now
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE leases SET expires_at = ?, token = '' "
+                "WHERE feedback_id = ? AND token = ?",
+                (now + retry_after, feedback_id, token),
+            )
+        return cursor.rowcount > 0
+
+    def lease_stats(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Live and expired lease counts on items still pending"""
+        now = time.time() if now is None else now
+        row = self._query(
+            "SELECT COALESCE(SUM(l.expires_at > ?), 0) AS active, "
+            "COALESCE(SUM(l.expires_at <= ?), 0) AS expired FROM leases l "
+            "JOIN feedback f ON f.id = l.feedback_id WHERE f.processed = 0",
+            (now, now),
+        )[0]
+        return {"active": row["active"], "expired": row["expired"]}
+
+    def set_dispatch(self, dispatch: Dict[str, Any]):
+        """Store the latest state of a fix dispatch"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO dispatches (feedback_id, status, document) "
+                "VALUES (?, ?, ?)",
+                (dispatch["feedback_id"], dispatch["status"], json.dumps(dispatch)),
+            )
+
+    def relocate(self, moves: Dict[str, Tuple[str, int]]):
+        """Repoint rows after log compaction: {old file: (new file, base)}"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for old, (new, base) in moves.items():
+                    self._conn.execute(
+                        "UPDATE feedback SET segment = ?, offset = offset + ? "
+                        "WHERE segment = ?",
+                        (new, base, old),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            for feedback_id, location in self._locations.items():
+                if location.segment in moves:
+                    new, base = moves[location.segment]
+                    self._locations[feedback_id] = RecordLocation(
+                        new, base + location.offset
+                    )
+
+    def apply_event(self, event: Dict[str, Any]):
+        """Apply a logged state event to the index"""
+        if event.get("event") == "processed":
+            self.mark_processed(event["id"])
+        elif event.get("event") == "dispatch":
+            self.set_dispatch({k: v for k, v in event.items() if k != "event"})
+
+    def rebuild(self, feedback_log: FeedbackLog) -> int:
+        """Drop everything and re-index from the log. Returns rows indexed."""
+        with self._lock:
+            self._conn.execute("DELETE FROM feedback")
+            self._conn.execute("DELETE FROM dispatches")
+            self._conn.execute("DELETE FROM leases")
+            self._conn.execute("DELETE FROM feedback_fts")
+            self._locations.clear()
+        return self._replay(feedback_log)
+
+    def catch_up(self, feedback_log: FeedbackLog) -> int:
+        """Index records appended after the newest indexed one (crash recovery)"""
+        rows = self._query(
+            "SELECT segment, offset FROM feedback ORDER BY segment DESC, offset DESC "
+            "LIMIT 1"
+        )
+        if not rows:
+            return self._replay(feedback_log)
+        return self._replay(feedback_log, RecordLocation(rows[0][0], rows[0][1]))
+
+    def catch_up_search(self, feedback_log: FeedbackLog) -> int:
+        """Fill the full-text index from the log if it is empty while the
+        index isn't (first start after upgrading to search)"""
+        has_rows = self._query("SELECT 1 FROM feedback LIMIT 1")
+        has_text = self._query("SELECT 1 FROM feedback_fts LIMIT 1")
+        if not has_rows or has_text:
+            return 0
+
+        entries, indexed = [], 0
+        for _, document in feedback_log.iter_feedback():
+            entries.append((document["id"], *search_fields(document)))
+            if len(entries) >= 1000:
+                indexed += self._add_search(entries)
+                entries = []
+        return indexed + self._add_search(entries)
+
+    def _add_search(self, entries: List[Tuple]) -> int:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._insert_search_locked(entries)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(entries)
+
+    def _replay(
+        self, feedback_log: FeedbackLog, start: Optional[RecordLocation] = None
+    ) -> int:
+        """Index feedback records and apply events from the log, in order"""
+        rows, indexed = [], 0
+        for location, record in feedback_log.iter_records(start=start):
+            document = record.document()
+            if record.is_event:
+                # Flush first so events always see the rows they refer to
+                self.add_many(rows)
+                indexed += len(rows)
+                rows = []
+                self.apply_event(document)
+            elif location != start:
+                rows.append(
+                    index_row(
+                        document,
+                        location,
+                        record.original_size,
+                        record.compressed_size,
+                        # v3 headers carry the flag; older records use events
+                        bool(record.metadata and record.metadata.processed),
+                    )
+                )
+        self.add_many(rows)
+        return indexed + len(rows)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _query(self, sql: str, params: Tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def locate(self, feedback_id: str) -> Optional[RecordLocation]:
+        """Log location of a feedback id, O(1) from memory"""
+        return self._locations.get(feedback_id)
+
+    def ids(self) -> List[str]:
+        """Every indexed feedback id, from memory"""
+        with self._lock:
+            return list(self._locations)
+
+    def get(self, feedback_id: str) -> Optional[sqlite3.Row]:
+        """Index row for a feedback id"""
+        if feedback_id not in self._locations:
+            return None
+        rows = self._query("SELECT * FROM feedback WHERE id = ?", (feedback_id,))
+        return rows[0] if rows else None
+
+    def resolve_prefix(self, prefix: str) -> Optional[str]:
+        """Full feedback id for a unique id prefix (fix branches carry 8 chars)"""
+        rows = self._query(
+            "SELECT id FROM feedback WHERE id >= ? AND id < ? LIMIT 2",
+            (prefix, prefix + "\uffff"),
+        )
+        return rows[0][0] if len(rows) == 1 else None
+
+    def get_dispatch(self, feedback_id: str) -> Optional[Dict[str, Any]]:
+        """Latest dispatch state for a feedback id"""
+        rows = self._query(
+            "SELECT document FROM dispatches WHERE feedback_id = ?", (feedback_id,)
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    def count(self, category: Optional[str] = None, day: Optional[str] = None) -> int:
+        """Number of indexed feedback items, optionally filtered"""
+        clauses, params = [], []
+        if category:
+            clauses.append("category = ?")
+            params.append(category)
+        if day:
+            clauses.append("day = ?")
+            params.append(day)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._query(f"SELECT COUNT(*) FROM feedback {where}", tuple(params))[0][
+            0
+        ]
+
+    def count_by(self, column: str) -> Dict[str, int]:
+        """Row counts grouped by an indexed column"""
+        if column not in ("category", "ai_model", "day"):
+            raise ValueError(f"Cannot group by {column}")
+        rows = self._query(f"SELECT {column}, COUNT(*) FROM feedback GROUP BY {column}")
+        return {row[0]: row[1] for row in rows}
+
+    def compression_totals(self) -> Tuple[int, int]:
+        row = self._query(
+            "SELECT COALESCE(SUM(original_size), 0), COALESCE(SUM(compressed_size), 0) "
+            "FROM feedback"
+        )[0]
+        return row[0], row[1]
+
+    def model_category_counts(self) -> List[sqlite3.Row]:
+        """(ai_model, category, count, impact_sum) for every pair"""
+        return self._query(
+            "SELECT ai_model, category, COUNT(*) AS count, "
+            "SUM(impact_score) AS impact FROM feedback GROUP BY ai_model, category"
+        )
+
+    def recent(self, limit: int, category: Optional[str] = None) -> List[sqlite3.Row]:
+        """Newest feedback rows, optionally for one category"""
+        if category:
+            return self._query(
+                "SELECT * FROM feedback WHERE category = ? "
+                "ORDER BY timestamp DESC LIMIT ?",
+                (category, limit),
+            )
+        return self._query(
+            "SELECT * FROM feedback ORDER BY timestamp DESC LIMIT ?", (limit,)
+        )
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        after: Optional[Tuple[float, int]] = None,
+        category: Optional[str] = None,
+        ai_model: Optional[str] = None,
+        processed: Optional[bool] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        snapshot: Optional[int] = None,
+    ) -> List[sqlite3.Row]:
+        """Full-text matches ranked by BM25 (best first) with a snippet.
+
+        ``query`` is an FTS5 query; see ``search_query`` for turning user
+        input into one. Pages continue after the (score, rowid) key of the
+        previous page's last row, among the rows up to its ``snapshot``
+        (every row carries it; the first page takes the current max rowid).
+        """
+        clauses, params = ["feedback_fts MATCH ?"], [query]
+        for clause, value in (
+            ("f.category = ?", category),
+            ("f.ai_model = ?", ai_model),
+            ("f.day >= ?", since),
+            ("f.day <= ?", until),
+        ):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        if processed is not None:
+            clauses.append("f.processed = ?")
+            params.append(int(processed))
+        if after:
+            clauses.append("(feedback_fts.rank, f.rowid) > (?, ?)")
+            params.extend(after)
+
+        # Feedback added after the first page never shows up on later ones
+        clauses.append("f.rowid <= (SELECT max_rowid FROM snapshot)")
+
+        # Rank and page on (rank, rowid) alone first; snippets and full rows
+        # are only built for the page that is returned
+        return self._query(
+            "WITH snapshot AS (SELECT coalesce(?, max(rowid)) AS max_rowid "
+            "FROM feedback), page AS ("
+            "SELECT feedback_fts.rowid AS search_rowid, feedback_fts.rank AS score "
+            "FROM feedback_fts JOIN feedback f ON f.rowid = feedback_fts.rowid "
+            f"WHERE {' AND '.join(clauses)} "
+            "ORDER BY feedback_fts.rank, feedback_fts.rowid LIMIT ?) "
+            "SELECT f.*, page.search_rowid, page.score, "
+            "(SELECT max_rowid FROM snapshot) AS snapshot, "
+            "snippet(feedback_fts, -1, '**', '**', '…', 16) AS snippet "
+            "FROM page JOIN feedback f ON f.rowid = page.search_rowid "
+            "JOIN feedback_fts ON feedback_fts.rowid = page.search_rowid "
+            "WHERE feedback_fts MATCH ? ORDER BY page.score, page.search_rowid",
+            (snapshot, *params, limit, query),
+        )
+
+    def timeline(self, since: str) -> List[sqlite3.Row]:
+        """Submission timestamp, category, model and tags of feedback sent
+        at or after ``since`` (ISO 8601), oldest first"""
+        return self._query(
+            "SELECT timestamp, category, ai_model, tags FROM feedback "
+            "WHERE timestamp >= ? ORDER BY timestamp",
+            (since,),
+        )
+
+    def pending(
+        self, limit: int, offset: int = 0, after: Optional[Tuple[str, str]] = None
+    ) -> List[sqlite3.Row]:
+        """Unprocessed rows ordered by (day, id), optionally starting right
+        after the (day, id) key of a previous page (a keyset seek on
+        idx_feedback_pending, so every page costs the same)"""
+        if after:
+            return self._query(
+                "SELECT * FROM feedback WHERE processed = 0 AND (day, id) > (?, ?) "
+                "ORDER BY day, id LIMIT ?",
+                (*after, limit),
+            )
+        return self._query(
+            "SELECT * FROM feedback WHERE processed = 0 "
+            "ORDER BY day, id LIMIT ? OFFSET ?",
+            (limit, offset),
+        )
+
+
+# Singleton instance
+_feedback_index: Optional[FeedbackIndex] = None
+
+
+def get_feedback_index() -> FeedbackIndex:
+    """Get or create the feedback index"""
+    global _feedback_index
+    if _feedback_index is None:
+        feedback_dir = Path(os.getenv("FEEDBACK_DIR", "./feedback"))
+        _feedback_index = FeedbackIndex(
+            Path(os.getenv("FEEDBACK_INDEX_PATH", feedback_dir / "index.sqlite3"))
+        )
+    return _feedback_index
+
+
+__all__ = [
+    "FeedbackIndex",
+    "index_row",
+    "encode_pending_cursor",
+    "decode_pending_cursor",
+    "search_query",
+    "encode_search_cursor",
+    "decode_search_cursor",
+    "get_feedback_index",
+]
+
+
+if __name__ == "__main__":
+    import sys
+
+    from datetime import timezone
+
+    from feedback_log import WriterLockError, acquire_writer_lock, get_feedback_log
+
+    if sys.argv[1:] in (["rebuild"], ["compact"]):
+        # Both rewrite what a running API holds in memory: only run them when
+        # no API writes this FEEDBACK_DIR
+        try:
+            acquire_writer_lock(Path(os.getenv("FEEDBACK_DIR", "./feedback")))
+        except WriterLockError as e:
+            sys.exit(f"🔒 {e}; stop the API first")
+
+    if sys.argv[1:] == ["rebuild"]:
+        count = get_feedback_index().rebuild(get_feedback_log())
+        print(f"🔎 Rebuilt feedback index: {count} records")
+    elif sys.argv[1:] == ["compact"]:
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        days = get_feedback_log().compact_closed(today, get_feedback_index().relocate)
+        print(f"📦 Packed {days} closed days")
+    else:
+        print("Usage: python feedback_index.py rebuild | compact")
+        sys.exit(1)
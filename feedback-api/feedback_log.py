@@ -0,0 +1,597 @@
+#!/usr/bin/env python3
+"""
+Segmented append-only feedback log
+Every feedback record and state event is appended as an STFB frame to the
+current day's segment instead of getting its own little file.
+
+Layout:
+    feedback/
+    ├── 2025-08-06/
+    │   ├── segment-000001.log   # STFB frames, appended in order
+    │   ├── segment-000002.log   # rotated once the previous one hit the size cap
+    │   └── summaries.txt        # human-readable summaries, one entry per feedback
+    └── 2025-08-07/
+        └── segment-000001.log
+
+Closed days are compacted into a single memory-mapped pack file
+(pack-NNNNNN.stpk, holding segments 1..NNNNNN; see feedback_pack.py).
+Readers handle packs and loose segments side by side.
+"""
+
+import fcntl
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from feedback_pack import PACK_PREFIX, PACK_SUFFIX, PackFile, write_pack
+from stfb import (
+    FEEDBACK_MAGIC,
+    FLAG_PROCESSED,
+    FLAGS_OFFSET,
+    Record,
+    compress,
+    encode_event,
+    pack_record,
+    read_record,
+)
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+SUMMARY_LOG_NAME = "summaries.txt"
+SUMMARY_SEPARATOR = "\f\n"  # form feed between summary entries
+WRITER_LOCK_NAME = "writer.lock"
+
+# Rotation and group commit tuning
+MAX_SEGMENT_BYTES = int(os.getenv("FEEDBACK_SEGMENT_MAX_BYTES", str(64 * 1024 * 1024)))
+FSYNC_BATCH = int(
+    os.getenv("FEEDBACK_FSYNC_BATCH", "32")
+)  # records per fsync (0 = never)
+FSYNC_INTERVAL = float(os.getenv("FEEDBACK_FSYNC_INTERVAL_MS", "50")) / 1000
+
+
+def _is_day(name: str) -> bool:
+    """Day directories are named YYYY-MM-DD (skips e.g. dictionaries/)"""
+    try:
+        datetime.strptime(name, "%Y-%m-%d")
+    except ValueError:
+        return False
+    return True
+
+
+class RecordLocation(NamedTuple):
+    """Where a record lives: segment path relative to the log root + byte offset"""
+
+    segment: str
+    offset: int
+
+
+class FeedbackLog:
+    """Append-only, day/size-rotated log of STFB frames with group commit"""
+
+    def __init__(
+        self,
+        root: Path,
+        max_segment_bytes: int = MAX_SEGMENT_BYTES,
+        fsync_batch: int = FSYNC_BATCH,
+        fsync_interval: float = FSYNC_INTERVAL,
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_segment_bytes = max_segment_bytes
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._day: Optional[str] = None
+        self._segment: Optional[str] = None
+        self._size = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._packs: Dict[str, PackFile] = {}  # open mmaps by "day/pack-..."
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def append(self, frame: bytes, day: str) -> RecordLocation:
+        """Append one framed record to the given day's log"""
+        return self.append_many([frame], day)[0]
+
+    def append_many(self, frames: List[bytes], day: str) -> List[RecordLocation]:
+        """Append several frames with a single write and (at most) one fsync"""
+        if not frames:
+            return []
+
+        with self._lock:
+            self._ensure_segment(day, sum(len(frame) for frame in frames))
+
+            locations = []
+            offset = self._size
+            for frame in frames:
+                locations.append(RecordLocation(self._segment, offset))
+                offset += len(frame)
+
+            self._file.write(b"".join(frames))
+            self._file.flush()
+            self._size = offset
+            self._unsynced += len(frames)
+
+            if self.fsync_batch and (
+                self._unsynced >= self.fsync_batch
+                or time.monotonic() - self._last_sync >= self.fsync_interval
+            ):
+                self._sync_locked()
+
+        return locations
+
+    def append_event(self, event: Dict, day: str) -> RecordLocation:
+        """Append a state event (processed marker, dispatch record, ...)"""
+        return self.append(encode_event(event), day)
+
+    def mark_processed(self, location: RecordLocation) -> bool:
+        """Set the processed flag in a record's metadata header, in place.
+
+        Returns False for records without a metadata header (STFB v1/v2);
+        those get a processed event instead.
+        """
+        with self._lock:
+            with open(self.root / location.segment, "r+b") as f:
+                f.seek(location.offset)
+                record = read_record(f, with_payload=False)
+                if record is None or record.metadata is None:
+                    return False
+                f.seek(location.offset + FLAGS_OFFSET)
+                f.write(bytes([record.metadata.flags | FLAG_PROCESSED]))
+                f.flush()
+                os.fsync(f.fileno())
+        return True
+
+    def sync(self):
+        """Flush and fsync everything written so far"""
+        with self._lock:
+            self._sync_locked()
+
+    def sync_if_due(self):
+        """Fsync pending writes once the group commit interval has elapsed"""
+        with self._lock:
+            if (
+                self._unsynced
+                and time.monotonic() - self._last_sync >= self.fsync_interval
+            ):
+                self._sync_locked()
+
+    def close(self):
+        """Sync and close the active segment and any mapped packs"""
+        with self._lock:
+            self._close_locked()
+            for pack in self._packs.values():
+                pack.close()
+            self._packs.clear()
+
+    def _sync_locked(self):
+        if self._file and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _close_locked(self):
+        if self._file:
+            self._sync_locked()
+            self._file.close()
+        self._file = None
+        self._day = None
+        self._segment = None
+        self._size = 0
+
+    def _ensure_segment(self, day: str, incoming: int):
+        """Open (or rotate to) the segment the next write should go to"""
+        if (
+            self._file is not None
+            and self._day == day
+            and (self._size == 0 or self._size + incoming <= self.max_segment_bytes)
+        ):
+            return
+
+        rotate = self._file is not None and self._day == day
+        self._close_locked()
+
+        day_dir = self.root / day
+        day_dir.mkdir(exist_ok=True)
+        segments = self._segment_paths(day_dir)
+
+        if segments and not rotate:
+            # Resume the newest segment, dropping any torn tail from a crash
+            path = segments[-1]
+            size = self._valid_length(path)
+            if size and size + incoming > self.max_segment_bytes:
+                path = self._segment_path(day_dir, self._file_number(path) + 1)
+                size = 0
+        else:
+            # Numbering continues after whatever a pack already holds
+            files = segments or self._pack_paths(day_dir)
+            number = self._file_number(files[-1]) + 1 if files else 1
+            path = self._segment_path(day_dir, number)
+            size = 0
+
+        self._file = open(path, "ab")
+        self._file.truncate(size)
+        self._day = day
+        self._segment = f"{day}/{path.name}"
+        self._size = size
+
+    @staticmethod
+    def _segment_path(day_dir: Path, number: int) -> Path:
+        return day_dir / f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}"
+
+    @staticmethod
+    def _file_number(path: Path) -> int:
+        """Sequence number of a segment or pack file"""
+        return int(path.stem.rsplit("-", 1)[1])
+
+    @staticmethod
+    def _segment_paths(day_dir: Path) -> List[Path]:
+        return sorted(day_dir.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"))
+
+    @staticmethod
+    def _pack_paths(day_dir: Path) -> List[Path]:
+        return sorted(day_dir.glob(f"{PACK_PREFIX}*{PACK_SUFFIX}"))
+
+    def sources(self, day: str) -> List[str]:
+        """A day's files in record order, as the "day/name" segments of
+        record locations"""
+        return [f"{day}/{path.name}" for path in self._sources(day)]
+
+    def _sources(self, day: str) -> List[Path]:
+        """A day's files in record order: its pack (if any), then any
+        segments written after it"""
+        day_dir = self.root / day
+        packs = self._pack_paths(day_dir)
+        if not packs:
+            return self._segment_paths(day_dir)
+        # A crash mid-compaction can leave the packed segments behind
+        packed = self._file_number(packs[-1])
+        return packs[-1:] + [
+            path
+            for path in self._segment_paths(day_dir)
+            if self._file_number(path) > packed
+        ]
+
+    @staticmethod
+    def _valid_length(path: Path) -> int:
+        """Length of the segment up to the last complete frame"""
+        valid = 0
+        with open(path, "rb") as f:
+            try:
+                while read_record(f, with_payload=False):
+                    valid = f.tell()
+            except ValueError:
+                pass
+        return valid
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def days(self) -> List[str]:
+        """All days that have a log directory, oldest first"""
+        return sorted(
+            p.name for p in self.root.iterdir() if p.is_dir() and _is_day(p.name)
+        )
+
+    def _pack(self, name: str) -> PackFile:
+        """Mapped pack by "day/pack-..." name, opened on first use"""
+        pack = self._packs.get(name)
+        if pack is None:
+            with self._lock:
+                pack = self._packs.get(name)
+                if pack is None:
+                    pack = self._packs[name] = PackFile(self.root / name)
+        return pack
+
+    def read(self, location: RecordLocation) -> Record:
+        """Read a single record by location"""
+        if location.segment.endswith(PACK_SUFFIX):
+            return self._pack(location.segment).read(location.offset)
+        with open(self.root / location.segment, "rb") as f:
+            f.seek(location.offset)
+            record = read_record(f)
+        if record is None:
+            raise ValueError(f"Truncated record at {location}")
+        return record
+
+    def iter_records(
+        self,
+        days: Optional[Iterable[str]] = None,
+        with_payload: bool = True,
+        start: Optional[RecordLocation] = None,
+    ) -> Iterator[Tuple[RecordLocation, Record]]:
+        """Iterate records sequentially, oldest segment first.
+
+        With ``start``, iteration resumes at that record (inclusive).
+        """
+        start_day = start.segment.split("/", 1)[0] if start else None
+        for day in days if days is not None else self.days():
+            if start and day < start_day:
+                continue
+            sources = self.sources(day)
+            offset = 0
+            if day == start_day and start.segment in sources:
+                sources = sources[sources.index(start.segment) :]
+                offset = start.offset
+            for segment in sources:
+                if segment.endswith(PACK_SUFFIX):
+                    records = self._pack(segment).iter_records(offset, with_payload)
+                else:
+                    records = self._iter_segment(segment, offset, with_payload)
+                for record_offset, record in records:
+                    yield RecordLocation(segment, record_offset), record
+                offset = 0
+
+    def _iter_segment(
+        self, segment: str, start: int, with_payload: bool
+    ) -> Iterator[Tuple[int, Record]]:
+        with open(self.root / segment, "rb") as f:
+            f.seek(start)
+            while True:
+                offset = f.tell()
+                try:
+                    record = read_record(f, with_payload=with_payload)
+                except ValueError:
+                    break
+                if record is None:
+                    break
+                yield offset, record
+
+    def iter_feedback(
+        self, days: Optional[Iterable[str]] = None
+    ) -> Iterator[Tuple[RecordLocation, Dict]]:
+        """Iterate decoded feedback documents, skipping state events"""
+        for location, record in self.iter_records(days):
+            if record.magic == FEEDBACK_MAGIC:
+                yield location, record.document()
+
+    def iter_events(self, days: Optional[Iterable[str]] = None) -> Iterator[Dict]:
+        """Iterate decoded state events in append order"""
+        for _, record in self.iter_records(days):
+            if record.is_event:
+                yield record.document()
+
+    # ------------------------------------------------------------------
+    # Human-readable summaries (one append-only text file per day)
+    # ------------------------------------------------------------------
+
+    def append_summary(self, day: str, summary: str):
+        """Append a summary entry to the day's summary log"""
+        self.append_summaries(day, [summary])
+
+    def append_summaries(self, day: str, summaries: List[str]):
+        """Append several summary entries with a single write"""
+        day_dir = self.root / day
+        day_dir.mkdir(exist_ok=True)
+        with open(day_dir / SUMMARY_LOG_NAME, "a") as f:
+            f.write(
+                "".join(
+                    summary.replace("\f", "") + SUMMARY_SEPARATOR
+                    for summary in summaries
+                )
+            )
+
+    def iter_summaries(self, newest_first: bool = False) -> Iterator[Tuple[str, str]]:
+        """Yield (day, summary text) for every stored summary"""
+        days = self.days()
+        for day in reversed(days) if newest_first else days:
+            summary_log = self.root / day / SUMMARY_LOG_NAME
+            if not summary_log.exists():
+                continue
+            entries = summary_log.read_text().split(SUMMARY_SEPARATOR)
+            for entry in reversed(entries) if newest_first else entries:
+                if entry.strip():
+                    yield day, entry
+
+    # ------------------------------------------------------------------
+    # Compaction of closed days into pack files
+    # ------------------------------------------------------------------
+
+    def compact(
+        self,
+        day: str,
+        relocate: Optional[Callable[[Dict[str, Tuple[str, int]]], None]] = None,
+    ) -> bool:
+        """Fold a closed day's segments (and any earlier pack) into one pack.
+
+        ``relocate`` receives {old file: (pack, base offset)} once the pack
+        is durable and before the old files are removed, so an index can
+        move its locations (new offset = base + old offset). Returns False
+        if there was nothing to compact.
+
+        The log lock is held throughout: a late append to the day or a
+        mark_processed landing between packing and unlinking would otherwise
+        be lost with the segment it went to.
+        """
+        with self._lock:
+            if self._day == day:
+                self._close_locked()
+
+            day_dir = self.root / day
+            sources = self._sources(day)
+            segments = [path for path in sources if path.suffix == SEGMENT_SUFFIX]
+            if not segments:
+                return False
+
+            number = self._file_number(segments[-1])
+            pack_path = day_dir / f"{PACK_PREFIX}{number:06d}{PACK_SUFFIX}"
+            bases = write_pack(pack_path, sources)
+            if relocate:
+                relocate(
+                    {
+                        f"{day}/{path.name}": (f"{day}/{pack_path.name}", base)
+                        for path, base in zip(sources, bases)
+                    }
+                )
+
+            for path in sources:
+                pack = self._packs.pop(f"{day}/{path.name}", None)
+                if pack:
+                    pack.close()
+                path.unlink()
+        return True
+
+    def compact_closed(
+        self,
+        before_day: str,
+        relocate: Optional[Callable[[Dict[str, Tuple[str, int]]], None]] = None,
+    ) -> int:
+        """Compact every day before ``before_day`` (usually today). Returns
+        the number of days packed."""
+        return sum(
+            self.compact(day, relocate) for day in self.days() if day < before_day
+        )
+
+    # ------------------------------------------------------------------
+    # Migration from one-file-per-feedback storage
+    # ------------------------------------------------------------------
+
+    def migrate_legacy(self) -> int:
+        """Import loose <id>.stfb files (plus their sidecars) into the log.
+
+        The loose files are removed only after the imported frames are synced.
+        Returns the number of feedback records imported.
+        """
+        imported = 0
+        for day in self.days():
+            day_dir = self.root / day
+            loose_files = sorted(day_dir.glob("*.stfb"))
+            if not loose_files:
+                continue
+
+            frames, summaries, sidecars = [], [], []
+            for feedback_file in loose_files:
+                feedback_id = feedback_file.stem
+                with open(feedback_file, "rb") as f:
+                    record = read_record(f)
+                if record is None:
+                    continue
+
+                # Old files don't carry their id inside the payload
+                document = record.document()
+                document.setdefault("id", feedback_id)
+                data = json.dumps(document, default=str).encode()
+                frames.append(pack_record(FEEDBACK_MAGIC, len(data), compress(data)))
+
+                processed_marker = feedback_file.with_suffix(".processed")
+                if processed_marker.exists():
+                    frames.append(
+                        encode_event({"event": "processed", "id": feedback_id})
+                    )
+                    sidecars.append(processed_marker)
+
+                dispatch_file = day_dir / f"{feedback_id}.dispatch.json"
+                if dispatch_file.exists():
+                    with open(dispatch_file, "r") as f:
+                        frames.append(
+                            encode_event({"event": "dispatch", **json.load(f)})
+                        )
+                    sidecars.append(dispatch_file)
+
+                summary_file = feedback_file.with_suffix(".summary.txt")
+                if summary_file.exists():
+                    summaries.append(summary_file.read_text())
+                    sidecars.append(summary_file)
+
+                sidecars.append(feedback_file)
+                imported += 1
+
+            self.append_many(frames, day)
+            self.sync()
+            for summary in summaries:
+                self.append_summary(day, summary)
+            for path in sidecars:
+                path.unlink()
+
+        self.close()
+        return imported
+
+
+class WriterLockError(RuntimeError):
+    """Another process already writes to this FEEDBACK_DIR"""
+
+
+# Descriptors holding writer locks, by directory, for the life of the process
+_writer_locks: Dict[Path, int] = {}
+
+
+def acquire_writer_lock(directory: Path) -> Path:
+    """Take the exclusive writer lock on ``directory`` or fail fast
+
+    The log, index, aggregates, dedup and similarity state all live in
+    FEEDBACK_DIR and assume one writing process. The lock is released when
+    the process exits, however it exits.
+    """
+    directory = Path(directory).resolve()
+    path = directory / WRITER_LOCK_NAME
+    if directory in _writer_locks:
+        return path
+    directory.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        with open(path, "r") as f:
+            holder = f.read().strip() or "another process"
+        os.close(fd)
+        raise WriterLockError(
+            f"{directory} is already written by pid {holder}; run one API "
+            "process (a single uvicorn worker) per FEEDBACK_DIR"
+        ) from None
+    os.ftruncate(fd, 0)
+    os.write(fd, str(os.getpid()).encode())
+    _writer_locks[directory] = fd
+    return path
+
+
+# Singleton instance
+_feedback_log: Optional[FeedbackLog] = None
+
+
+def get_feedback_log() -> FeedbackLog:
+    """Get or create the feedback log for FEEDBACK_DIR"""
+    global _feedback_log
+    if _feedback_log is None:
+        _feedback_log = FeedbackLog(Path(os.getenv("FEEDBACK_DIR", "./feedback")))
+    return _feedback_log
+
+
+__all__ = [
+    "RecordLocation",
+    "FeedbackLog",
+    "WriterLockError",
+    "acquire_writer_lock",
+    "get_feedback_log",
+]
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] == ["migrate"]:
+        acquire_writer_lock(Path(os.getenv("FEEDBACK_DIR", "./feedback")))
+        count = get_feedback_log().migrate_legacy()
+        print(f"📦 Migrated {count} loose feedback files into the segmented log")
+    else:
+        print("Usage: python feedback_log.py migrate")
+        sys.exit(1)
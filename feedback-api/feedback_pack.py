@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Pack files for closed days of the feedback log
+Once a day is over its segments are never appended to again, so they are
+compacted into a single pack file: the same STFB frames back to back,
+followed by an offset index and a fixed footer. Packs are read through a
+read-only mmap; records handed out are zero-copy views into it.
+
+Layout:
+    [frame][frame]...[frame][uint64 offset] * count[footer]
+    footer = magic "STPK", version, record count, offset of the index
+"""
+
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from pathlib import Path
+from typing import Iterable, Iterator, List, Tuple
+
+from stfb import Record, unpack_record
+
+PACK_MAGIC = b"STPK"  # Smart Tree PacK
+PACK_VERSION = b"\x01\x00"
+PACK_FOOTER = struct.Struct("<4s2sIQ")
+PACK_PREFIX = "pack-"
+PACK_SUFFIX = ".stpk"
+
+
+class PackFile:
+    """Memory-mapped, read-only view of a pack"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count, index_offset = PACK_FOOTER.unpack_from(
+            self._mmap, len(self._mmap) - PACK_FOOTER.size
+        )
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            raise ValueError(f"Not a feedback pack: {self.path}")
+        self.index_offset = index_offset
+        self.offsets: Tuple[int, ...] = struct.unpack_from(
+            f"<{count}Q", self._mmap, index_offset
+        )
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def read(self, offset: int, with_payload: bool = True) -> Record:
+        """The record starting at ``offset``"""
+        record = unpack_record(self._mmap, offset, with_payload)
+        if record is None:
+            raise ValueError(f"Truncated record at {self.path}:{offset}")
+        return record
+
+    def iter_records(
+        self, start: int = 0, with_payload: bool = True
+    ) -> Iterator[Tuple[int, Record]]:
+        """(offset, record) for every record at or after ``start``"""
+        for offset in self.offsets[bisect_left(self.offsets, start) :]:
+            yield offset, self.read(offset, with_payload)
+
+    def close(self):
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # records still reference it; freed with the last of them
+
+
+def write_pack(path: Path, sources: Iterable[Path]) -> List[int]:
+    """Concatenate the complete frames of ``sources`` into a new pack.
+
+    Sources are segments or an older pack of the same day. Returns the byte
+    offset each source starts at inside the pack: a record at offset o of
+    source i lands at bases[i] + o. The pack is fsynced and renamed into
+    place atomically.
+    """
+    tmp_path = path.with_suffix(".tmp")
+    bases, offsets, position = [], [], 0
+    with open(tmp_path, "wb") as out:
+        for source in sources:
+            data, frame_offsets = _read_frames(source)
+            bases.append(position)
+            offsets.extend(position + offset for offset in frame_offsets)
+            out.write(data)
+            position += len(data)
+
+        out.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        out.write(PACK_FOOTER.pack(PACK_MAGIC, PACK_VERSION, len(offsets), position))
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp_path, path)
+    return bases
+
+
+def _read_frames(source: Path) -> Tuple[bytes, List[int]]:
+    """Bytes of a segment or pack up to its last complete frame, plus the
+    offset of every frame"""
+    if source.suffix == PACK_SUFFIX:
+        pack = PackFile(source)
+        try:
+            return pack._mmap[: pack.index_offset], list(pack.offsets)
+        finally:
+            pack.close()
+
+    data = source.read_bytes()
+    offsets, offset = [], 0
+    while True:
+        try:
+            record = unpack_record(data, offset, with_payload=False)
+        except ValueError:
+            break
+        if record is None:
+            break
+        offsets.append(offset)
+        offset += record.frame_size
+    return data[:offset], offsets
+
+
+__all__ = [
+    "PackFile",
+    "PACK_PREFIX",
+    "PACK_SUFFIX",
+    "write_pack",
+]
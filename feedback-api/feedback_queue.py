@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Redis Streams hand-off between the API and the feedback workers
+Every stored submission is also XADDed to a stream, and the workers read it
+through a consumer group (XREADGROUP / XACK / XAUTOCLAIM), so new feedback
+reaches them in milliseconds instead of on the next 30 second poll, and
+worker replicas share the load without processing anything twice.
+
+The log stays the source of truth: publishing is best effort and never fails
+a submission. While Redis is unreachable publishing pauses for a cooldown,
+and `python feedback_queue.py backfill` re-enqueues every unprocessed
+feedback item that is not already waiting in the stream.
+"""
+
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import redis
+
+import fast_json
+from feedback_index import FeedbackIndex
+from feedback_log import FeedbackLog, RecordLocation
+
+FEEDBACK_STREAM = os.getenv("FEEDBACK_STREAM", "feedback:stream")
+FEEDBACK_STREAM_GROUP = os.getenv("FEEDBACK_STREAM_GROUP", "feedback-workers")
+FEEDBACK_STREAM_MAXLEN = int(os.getenv("FEEDBACK_STREAM_MAXLEN", "100000"))
+FEEDBACK_STREAM_ENABLED = (
+    os.getenv("FEEDBACK_STREAM_ENABLED", "true").lower() != "false"
+)
+
+logger = logging.getLogger(__name__)
+
+
+def stream_entry(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Stream fields for a feedback document: routing fields up front, the
+    document itself as compact JSON"""
+    return {
+        "id": document["id"],
+        "category": document["category"],
+        "impact_score": document["impact_score"],
+        "frequency_score": document["frequency_score"],
+        "document": fast_json.dumps(document).decode(),
+    }
+
+
+def entry_key(entry_id: str) -> Tuple[int, int]:
+    """Sortable form of a stream entry id ("<ms>-<seq>")"""
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class FeedbackQueue:
+    """Best-effort publisher of stored feedback to a Redis Stream"""
+
+    def __init__(
+        self,
+        client: Optional["redis.Redis"],
+        stream: str = FEEDBACK_STREAM,
+        group: str = FEEDBACK_STREAM_GROUP,
+        maxlen: int = FEEDBACK_STREAM_MAXLEN,
+        cooldown_seconds: float = 30,
+    ):
+        self.client = client
+        self.stream = stream
+        self.group = group
+        self.maxlen = maxlen
+        self.cooldown_seconds = cooldown_seconds
+        self._paused_until = 0.0
+        self.published = 0
+        self.skipped = 0  # not published (Redis down); left to backfill
+
+    @property
+    def enabled(self) -> bool:
+        return self.client is not None
+
+    def publish(self, documents: Iterable[Dict[str, Any]]) -> int:
+        """XADD every document (one round trip); returns how many went out"""
+        documents = list(documents)
+        if not self.enabled or not documents:
+            return 0
+        if time.monotonic() < self._paused_until:
+            self.skipped += len(documents)
+            return 0
+
+        try:
+            self._xadd(documents)
+        except redis.RedisError as e:
+            logger.warning(f"Feedback stream unavailable, pausing publishes: {e}")
+            self._paused_until = time.monotonic() + self.cooldown_seconds
+            self.skipped += len(documents)
+            return 0
+
+        self.published += len(documents)
+        return len(documents)
+
+    def _xadd(self, documents: List[Dict[str, Any]]):
+        pipe = self.client.pipeline(transaction=False)
+        for document in documents:
+            pipe.xadd(
+                self.stream,
+                stream_entry(document),
+                maxlen=self.maxlen,
+                approximate=True,
+            )
+        pipe.execute()
+
+    def in_flight(self) -> Set[str]:
+        """Feedback ids still owed to the workers: entries not yet delivered to
+        the group, or delivered but not acknowledged"""
+        entries = self.client.xrange(self.stream)
+        groups = [
+            group
+            for group in self.client.xinfo_groups(self.stream)
+            if group["name"] == self.group
+        ]
+        if not groups:
+            # No worker has joined yet; it will read the stream from the start
+            return {fields["id"] for _, fields in entries}
+
+        last_delivered = entry_key(groups[0]["last-delivered-id"])
+        pending = {
+            item["message_id"]
+            for item in self.client.xpending_range(
+                self.stream, self.group, "-", "+", max(len(entries), 1)
+            )
+        }
+        return {
+            fields["id"]
+            for entry_id, fields in entries
+            if entry_id in pending or entry_key(entry_id) > last_delivered
+        }
+
+    def backfill(
+        self,
+        feedback_index: FeedbackIndex,
+        feedback_log: FeedbackLog,
+        page_size: int = 500,
+    ) -> int:
+        """Re-enqueue unprocessed feedback that isn't waiting in the stream.
+        Unlike publish, Redis errors are raised to the caller."""
+        try:
+            waiting = self.in_flight()
+        except redis.ResponseError:
+            waiting = set()  # the stream doesn't exist yet
+
+        enqueued, offset = 0, 0
+        while True:
+            rows = feedback_index.pending(page_size, offset)
+            if not rows:
+                return enqueued
+            offset += len(rows)
+            documents = [
+                feedback_log.read(
+                    RecordLocation(row["segment"], row["offset"])
+                ).document()
+                for row in rows
+                if row["id"] not in waiting
+            ]
+            if documents:
+                self._xadd(documents)
+                enqueued += len(documents)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "stream": self.stream,
+            "published": self.published,
+            "skipped": self.skipped,
+            "paused": time.monotonic() < self._paused_until,
+        }
+
+
+# Singleton instance
+_feedback_queue: Optional[FeedbackQueue] = None
+
+
+def get_feedback_queue() -> FeedbackQueue:
+    """Get or create the feedback stream publisher"""
+    global _feedback_queue
+    if _feedback_queue is None:
+        client = None
+        if FEEDBACK_STREAM_ENABLED:
+            client = redis.from_url(
+                os.getenv("REDIS_URL", "redis://localhost:6379"),
+                decode_responses=True,
+                socket_connect_timeout=0.5,
+                socket_timeout=2,
+            )
+        _feedback_queue = FeedbackQueue(client)
+    return _feedback_queue
+
+
+__all__ = [
+    "FeedbackQueue",
+    "stream_entry",
+    "get_feedback_queue",
+]
+
+
+if __name__ == "__main__":
+    import sys
+
+    from feedback_index import get_feedback_index
+    from feedback_log import get_feedback_log
+
+    if sys.argv[1:] == ["backfill"]:
+        count = get_feedback_queue().backfill(get_feedback_index(), get_feedback_log())
+        print(f"📬 Re-enqueued {count} unprocessed feedback items")
+    else:
+        print("Usage: python feedback_queue.py backfill")
+        sys.exit(1)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Time-bucketed submission rollups
+Per-minute, per-hour and per-day submission counts, each broken down by
+category, model and agent, kept in fixed-size ring buffers that are updated
+at ingest. /stats/timeseries reads a window straight out of memory, so a
+dashboard polling every few seconds costs a few dict copies, never a scan.
+
+The rings are checkpointed to a small JSON file alongside the aggregates and
+reloaded on start. The first start after an upgrade seeds them from the
+index (by submission timestamp).
+"""
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from feedback_index import FeedbackIndex
+
+# resolution -> (bucket width in seconds, buckets kept)
+RESOLUTIONS = {
+    "minute": (60, 24 * 60),  # one day
+    "hour": (3600, 30 * 24),  # thirty days
+    "day": (86400, 400),  # a bit over a year
+}
+
+
+def agent_of(tags: List[str]) -> str:
+    """The agent a submission was tagged with at ingest"""
+    for tag in tags:
+        if tag.startswith("agent:"):
+            return tag[len("agent:") :]
+    return "anonymous"
+
+
+class RollupRing:
+    """Fixed number of equally wide time buckets, reused round-robin"""
+
+    def __init__(self, width: int, size: int):
+        self.width = width
+        self.size = size
+        self._buckets: List[Optional[Dict[str, Any]]] = [None] * size
+
+    def add(self, timestamp: float, category: str, model: str, agent: str):
+        start = int(timestamp // self.width) * self.width
+        slot = (start // self.width) % self.size
+        bucket = self._buckets[slot]
+        if bucket is None or bucket["start"] < start:
+            bucket = self._buckets[slot] = {
+                "start": start,
+                "total": 0,
+                "by_category": defaultdict(int),
+                "by_model": defaultdict(int),
+                "by_agent": defaultdict(int),
+            }
+        elif bucket["start"] > start:
+            return  # older than the ring reaches back
+        bucket["total"] += 1
+        bucket["by_category"][category] += 1
+        bucket["by_model"][model] += 1
+        bucket["by_agent"][agent] += 1
+
+    def window(self, start: float, end: float) -> List[Dict[str, Any]]:
+        """Non-empty buckets starting within [start, end], oldest first"""
+        first = max(int(start // self.width), int(end // self.width) - self.size + 1)
+        points = []
+        for position in range(first, int(end // self.width) + 1):
+            bucket = self._buckets[position % self.size]
+            if bucket and bucket["start"] == position * self.width:
+                points.append(
+                    {
+                        "start": bucket["start"],
+                        "total": bucket["total"],
+                        "by_category": dict(bucket["by_category"]),
+                        "by_model": dict(bucket["by_model"]),
+                        "by_agent": dict(bucket["by_agent"]),
+                    }
+                )
+        return points
+
+    def buckets(self) -> List[Dict[str, Any]]:
+        """Every live bucket, for checkpoints"""
+        return [bucket for bucket in self._buckets if bucket]
+
+    def restore(self, bucket: Dict[str, Any]):
+        slot = (bucket["start"] // self.width) % self.size
+        current = self._buckets[slot]
+        if current is None or current["start"] < bucket["start"]:
+            self._buckets[slot] = {
+                "start": bucket["start"],
+                "total": bucket["total"],
+                **{
+                    key: defaultdict(int, bucket[key])
+                    for key in ("by_category", "by_model", "by_agent")
+                },
+            }
+
+
+class FeedbackRollups:
+    """Minute/hour/day rings of submission counts, checkpointed to JSON"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.rings = {
+            resolution: RollupRing(width, size)
+            for resolution, (width, size) in RESOLUTIONS.items()
+        }
+
+    def add(
+        self,
+        category: str,
+        model: str,
+        agent: str = "anonymous",
+        timestamp: Optional[float] = None,
+    ):
+        """Count one submission (now, unless a timestamp is given)"""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            for ring in self.rings.values():
+                ring.add(timestamp, category, model, agent)
+            self._dirty = True
+
+    def series(self, resolution: str, start: float, end: float) -> List[Dict[str, Any]]:
+        """Non-empty buckets of ``resolution`` between two epoch times"""
+        ring = self.rings[resolution]
+        with self._lock:
+            return ring.window(start, end)
+
+    # ------------------------------------------------------------------
+    # Checkpointing
+    # ------------------------------------------------------------------
+
+    def checkpoint(self):
+        """Durably write the rings if anything changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(
+                {resolution: ring.buckets() for resolution, ring in self.rings.items()}
+            )
+            self._dirty = False
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> bool:
+        """Load the last checkpoint; False if there is none or it is unreadable"""
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        with self._lock:
+            for resolution, buckets in data.items():
+                if resolution in self.rings:
+                    for bucket in buckets:
+                        self.rings[resolution].restore(bucket)
+        return True
+
+    def seed(self, index: FeedbackIndex) -> int:
+        """Fill the rings from the index's submission timestamps"""
+        width, size = RESOLUTIONS["day"]
+        since = datetime.fromtimestamp(time.time() - width * size, timezone.utc)
+        seeded = 0
+        for row in index.timeline(since.isoformat()):
+            try:
+                timestamp = datetime.fromisoformat(
+                    row["timestamp"].replace("Z", "+00:00")
+                )
+            except ValueError:
+                continue
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=timezone.utc)
+            self.add(
+                row["category"],
+                row["ai_model"],
+                agent_of(json.loads(row["tags"])),
+                timestamp.timestamp(),
+            )
+            seeded += 1
+        self.checkpoint()
+        return seeded
+
+
+__all__ = ["FeedbackRollups", "RESOLUTIONS", "agent_of"]
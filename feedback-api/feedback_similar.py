@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+"Related feedback" lookups with MinHash and LSH banding
+Every stored submission gets a MinHash signature of its text (title,
+description, affected command and tool, as word 2-shingles). Signatures are
+cut into bands; two reports that agree on every row of any band land in the
+same bucket, so a lookup only scores the handful of reports sharing a bucket
+instead of the whole corpus.
+
+Memory is kept flat-packed rather than in dicts of Python objects:
+
+- each band is one sorted ``array('Q')`` of ``bucket key << 32 | ordinal``,
+  searched with bisect (new entries wait in a small dict until the next merge,
+  which builds the new tables outside the lock and swaps them in)
+- per document only the low 8 bits of each MinHash value are kept, enough to
+  estimate similarity (b-bit MinHash)
+
+At the defaults (64 hashes in 16 bands of 4) that is 128 bytes of bands, 64
+bytes of sketch and the id per document: roughly 250 MB at 1M documents.
+The structure is snapshotted to disk periodically and on shutdown; on start
+it is loaded and caught up with whatever the index has that it doesn't.
+"""
+
+import hashlib
+import os
+import re
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from feedback_index import FeedbackIndex
+from feedback_log import FeedbackLog
+
+SIMILAR_FIELDS = ("title", "description", "affected_command", "mcp_tool")
+
+SNAPSHOT_MAGIC = b"STMH"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<4sHHHQ")  # magic, version, hashes, bands, count
+
+MERSENNE_PRIME = (1 << 61) - 1
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+
+def digest_int(data: bytes, size: int = 8) -> int:
+    """Unsigned int from a short BLAKE2b digest (stable across processes)"""
+    return int.from_bytes(hashlib.blake2b(data, digest_size=size).digest(), "little")
+
+
+def shingles(document: Dict[str, Any]) -> List[int]:
+    """64-bit hashes of the word 2-shingles of a document's text"""
+    words = TOKEN_PATTERN.findall(
+        " ".join(str(document.get(field) or "") for field in SIMILAR_FIELDS).lower()
+    )
+    grams = {" ".join(words[i : i + 2]) for i in range(max(len(words) - 1, 1))}
+    return [digest_int(gram.encode()) for gram in grams if gram]
+
+
+def estimate(a: bytes, b: bytes) -> float:
+    """Jaccard similarity from two 8-bit sketches (unrelated documents agree
+    on 1/256 of the rows by chance, which is corrected for)"""
+    matches = sum(x == y for x, y in zip(a, b)) / len(a)
+    return max(0.0, (matches - 1 / 256) / (1 - 1 / 256))
+
+
+class SimilarityIndex:
+    """MinHash signatures in an LSH banding index, with a disk snapshot"""
+
+    def __init__(
+        self,
+        path: Path,
+        hashes: int = 64,
+        bands: int = 16,
+        bucket_limit: int = 200,
+        merge_threshold: int = 65_536,
+    ):
+        if hashes % bands:
+            raise ValueError("hashes must be a multiple of bands")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.hashes = hashes
+        self.bands = bands
+        self.rows = hashes // bands
+        self.bucket_limit = bucket_limit  # candidates read per bucket, newest first
+        self.merge_threshold = merge_threshold
+        self._lock = threading.Lock()
+        self._merge_lock = threading.Lock()  # one merge at a time
+
+        # Fixed permutations (a*x + b mod p), the same in every process
+        self._permutations = [
+            (
+                digest_int(b"minhash-a-%d" % i) % (MERSENNE_PRIME - 1) + 1,
+                digest_int(b"minhash-b-%d" % i) % MERSENNE_PRIME,
+            )
+            for i in range(hashes)
+        ]
+
+        self._ids: List[str] = []
+        self._sketches = bytearray()
+        self._tables: List[array] = [array("Q") for _ in range(bands)]
+        self._pending: List[Dict[int, List[int]]] = [
+            defaultdict(list) for _ in range(bands)
+        ]
+        self._pending_count = 0
+        # Buckets being merged: still searched until the new tables are in
+        self._merging: List[Dict[int, List[int]]] = [{} for _ in range(bands)]
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    # ------------------------------------------------------------------
+    # Signatures
+    # ------------------------------------------------------------------
+
+    def signature(self, document: Dict[str, Any]) -> List[int]:
+        """MinHash signature (32-bit values) of a document"""
+        values = shingles(document) or [0]
+        return [
+            min((a * value + b) % MERSENNE_PRIME for value in values) & 0xFFFFFFFF
+            for a, b in self._permutations
+        ]
+
+    def _band_keys(self, signature: List[int]) -> List[int]:
+        row = struct.Struct(f"<{self.rows}I")
+        return [
+            digest_int(row.pack(*signature[start : start + self.rows]), 4)
+            for start in range(0, self.hashes, self.rows)
+        ]
+
+    @staticmethod
+    def _sketch(signature: List[int]) -> bytes:
+        return bytes(value & 0xFF for value in signature)
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def add(
+        self, document: Dict[str, Any], limit: int = 3, threshold: float = 0.5
+    ) -> List[Tuple[str, float]]:
+        """Index a new document; returns what it looked similar to beforehand"""
+        return self.add_many([document], limit, threshold)[0]
+
+    def add_many(
+        self,
+        documents: Iterable[Dict[str, Any]],
+        limit: int = 3,
+        threshold: float = 0.5,
+    ) -> List[List[Tuple[str, float]]]:
+        """Index documents in order, each one matched against everything
+        indexed before it (including earlier ones of the same call)"""
+        prepared = []
+        for document in documents:
+            signature = self.signature(document)
+            prepared.append(
+                (document["id"], self._band_keys(signature), self._sketch(signature))
+            )
+
+        matches = []
+        with self._lock:
+            for feedback_id, keys, sketch in prepared:
+                matches.append(
+                    self._match_locked(keys, sketch, feedback_id, limit, threshold)
+                )
+                ordinal = len(self._ids)
+                self._ids.append(feedback_id)
+                self._sketches += sketch
+                for band, key in enumerate(keys):
+                    self._pending[band][key].append(ordinal)
+                self._pending_count += 1
+            due = self._pending_count >= self.merge_threshold
+        if due:
+            self.merge(wait=False)
+        return matches
+
+    def merge(self, wait: bool = True) -> Optional[int]:
+        """Fold the pending buckets into the sorted band tables; returns the
+        documents the tables now cover (None if another merge is running and
+        ``wait`` is False)"""
+        if not self._merge_lock.acquire(blocking=wait):
+            return None
+        try:
+            return self._merge_tables()
+        finally:
+            self._merge_lock.release()
+
+    def _merge_tables(self) -> int:
+        """Merge with ``_merge_lock`` held. The lock is only taken to detach
+        the pending buckets and to swap the new tables in; the sorting in
+        between runs while lookups and adds carry on."""
+        with self._lock:
+            merging, tables = self._pending, self._tables
+            covered = len(self._ids)
+            if not self._pending_count:
+                return covered
+            self._merging = merging
+            self._pending = [defaultdict(list) for _ in range(self.bands)]
+            self._pending_count = 0
+
+        merged = []
+        for table, pending in zip(tables, merging):
+            packed = [
+                key << 32 | ordinal
+                for key, ordinals in pending.items()
+                for ordinal in ordinals
+            ]
+            # Two sorted runs: Timsort merges them in about linear time
+            merged.append(array("Q", sorted([*table, *sorted(packed)])))
+
+        with self._lock:
+            self._tables = merged
+            self._merging = [{} for _ in range(self.bands)]
+        return covered
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def similar(
+        self,
+        document: Dict[str, Any],
+        limit: int = 10,
+        threshold: float = 0.3,
+    ) -> List[Tuple[str, float]]:
+        """(id, estimated similarity) of the documents most like ``document``,
+        best first, leaving out ``document`` itself"""
+        signature = self.signature(document)
+        keys, sketch = self._band_keys(signature), self._sketch(signature)
+        with self._lock:
+            return self._match_locked(
+                keys, sketch, document.get("id"), limit, threshold
+            )
+
+    def _match_locked(
+        self,
+        keys: List[int],
+        sketch: bytes,
+        exclude: Optional[str],
+        limit: int,
+        threshold: float,
+    ) -> List[Tuple[str, float]]:
+        candidates = set()
+        for band, key in enumerate(keys):
+            table = self._tables[band]
+            start = bisect_left(table, key << 32)
+            end = bisect_left(table, (key + 1) << 32, start)
+            candidates.update(
+                value & 0xFFFFFFFF
+                for value in table[max(start, end - self.bucket_limit) : end]
+            )
+            for pending in (self._pending[band], self._merging[band]):
+                candidates.update(pending.get(key, ())[-self.bucket_limit :])
+
+        scored = []
+        for ordinal in candidates:
+            if self._ids[ordinal] == exclude:
+                continue
+            offset = ordinal * self.hashes
+            similarity = estimate(sketch, self._sketches[offset : offset + self.hashes])
+            if similarity >= threshold:
+                scored.append((self._ids[ordinal], round(similarity, 3)))
+        scored.sort(key=lambda match: -match[1])
+        return scored[:limit]
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def snapshot(self) -> int:
+        """Write the index to disk atomically; returns documents written"""
+        with self._merge_lock:
+            covered = self._merge_tables()
+            # Documents added since are left to catch_up after a restart
+            with self._lock:
+                ids = self._ids[:covered]
+                sketches = bytes(self._sketches[: covered * self.hashes])
+                tables = list(self._tables)  # replaced on merge, never mutated
+
+        temporary = self.path.with_suffix(".tmp")
+        with open(temporary, "wb") as f:
+            f.write(
+                SNAPSHOT_HEADER.pack(
+                    SNAPSHOT_MAGIC, SNAPSHOT_VERSION, self.hashes, self.bands, len(ids)
+                )
+            )
+            encoded = "\n".join(ids).encode()
+            f.write(struct.pack("<Q", len(encoded)))
+            f.write(encoded)
+            f.write(sketches)
+            for table in tables:
+                f.write(struct.pack("<Q", len(table)))
+                table.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+        return len(ids)
+
+    def _load(self):
+        """Load the snapshot, if there is one built with the same parameters"""
+        if not self.path.exists():
+            return
+        with open(self.path, "rb") as f:
+            header = f.read(SNAPSHOT_HEADER.size)
+            if len(header) < SNAPSHOT_HEADER.size:
+                return
+            magic, version, hashes, bands, count = SNAPSHOT_HEADER.unpack(header)
+            if (magic, version, hashes, bands) != (
+                SNAPSHOT_MAGIC,
+                SNAPSHOT_VERSION,
+                self.hashes,
+                self.bands,
+            ):
+                return  # different layout; rebuilt by catch_up
+            (size,) = struct.unpack("<Q", f.read(8))
+            ids = f.read(size).decode().split("\n") if count else []
+            sketches = bytearray(f.read(count * hashes))
+            tables = []
+            for _ in range(bands):
+                (length,) = struct.unpack("<Q", f.read(8))
+                table = array("Q")
+                table.fromfile(f, length)
+                tables.append(table)
+        self._ids, self._sketches, self._tables = ids, sketches, tables
+
+    def catch_up(self, feedback_index: FeedbackIndex, feedback_log: FeedbackLog) -> int:
+        """Index the feedback the snapshot doesn't have yet"""
+        with self._lock:
+            known = set(self._ids)
+        missing = [
+            feedback_id
+            for feedback_id in feedback_index.ids()
+            if feedback_id not in known
+        ]
+        documents = []
+        for feedback_id in missing:
+            location = feedback_index.locate(feedback_id)
+            if location:
+                documents.append(feedback_log.read(location).document())
+            if len(documents) >= 1000:
+                self.add_many(documents)
+                documents = []
+        self.add_many(documents)
+        return len(missing)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self._ids),
+            "pending": self._pending_count,
+            "hashes": self.hashes,
+            "bands": self.bands,
+            "memory_bytes": len(self._sketches)
+            + sum(table.itemsize * len(table) for table in self._tables),
+        }
+
+
+# Singleton instance
+_similarity_index: Optional[SimilarityIndex] = None
+
+
+def get_similarity_index() -> SimilarityIndex:
+    """Get or create the feedback similarity index"""
+    global _similarity_index
+    if _similarity_index is None:
+        feedback_dir = Path(os.getenv("FEEDBACK_DIR", "./feedback"))
+        _similarity_index = SimilarityIndex(
+            Path(os.getenv("FEEDBACK_SIMILAR_PATH", feedback_dir / "similar.snapshot"))
+        )
+    return _similarity_index
+
+
+__all__ = [
+    "SimilarityIndex",
+    "shingles",
+    "get_similarity_index",
+]
+
+
+if __name__ == "__main__":
+    import sys
+
+    from feedback_index import get_feedback_index
+    from feedback_log import WriterLockError, acquire_writer_lock, get_feedback_log
+
+    if sys.argv[1:] == ["rebuild"]:
+        # A running API would overwrite the new snapshot with its own
+        try:
+            acquire_writer_lock(Path(os.getenv("FEEDBACK_DIR", "./feedback")))
+        except WriterLockError as e:
+            sys.exit(f"🔒 {e}; stop the API first")
+        similarity = get_similarity_index()
+        similarity.path.unlink(missing_ok=True)
+        similarity = SimilarityIndex(similarity.path)
+        count = similarity.catch_up(get_feedback_index(), get_feedback_log())
+        similarity.snapshot()
+        print(f"🧬 Rebuilt similarity index: {count} records")
+    else:
+        print("Usage: python feedback_similar.py rebuild")
+        sys.exit(1)
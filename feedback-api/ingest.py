@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Non-blocking ingest pipeline
+Compression and blocking disk writes (log append, index insert, summaries,
+fsyncs) run on a bounded thread pool instead of the event loop, so a burst
+of submissions never stalls concurrent reads or health checks.
+
+Admission control: once INGEST_MAX_PENDING submissions are queued or running,
+new ones are rejected straight away with IngestOverloaded (503 + Retry-After)
+rather than piling up behind the pool.
+
+Reads (search, export, similar, queue leases) and housekeeping (checkpoints,
+compaction, snapshots, health probes) get a pool of their own, so they never
+wait behind a burst of writes and a slow export never holds up ingest.
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))  # 0 = run inline (no pool)
+BACKGROUND_WORKERS = int(os.getenv("INGEST_BACKGROUND_WORKERS", "4"))  # 0 = inline
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "256"))
+INGEST_RETRY_AFTER = int(os.getenv("INGEST_RETRY_AFTER_SECONDS", "1"))
+
+
+class IngestOverloaded(Exception):
+    """Raised when the ingest queue is full"""
+
+    def __init__(self, retry_after: int = INGEST_RETRY_AFTER):
+        super().__init__("Ingest queue is full, retry later")
+        self.retry_after = retry_after
+
+
+class IngestPipeline:
+    """Bounded executor for blocking ingest work, with queue-depth admission,
+    plus a separate executor for reads and housekeeping"""
+
+    def __init__(
+        self,
+        workers: int = INGEST_WORKERS,
+        max_pending: int = INGEST_MAX_PENDING,
+        retry_after: int = INGEST_RETRY_AFTER,
+        background_workers: int = BACKGROUND_WORKERS,
+    ):
+        self.workers = workers
+        self.background_workers = background_workers
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self._executor = (
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+            if workers > 0
+            else None
+        )
+        self._background = (
+            ThreadPoolExecutor(
+                max_workers=background_workers, thread_name_prefix="background"
+            )
+            if background_workers > 0
+            else None
+        )
+        # Only touched from the event loop thread, so no lock needed
+        self.pending = 0
+        self.accepted = 0
+        self.rejected = 0
+
+    async def submit(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run one ingest job on the pool, or reject it if the queue is full"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise IngestOverloaded(self.retry_after)
+
+        self.pending += 1
+        self.accepted += 1
+        try:
+            return await self.offload(fn, *args, **kwargs)
+        finally:
+            self.pending -= 1
+
+    async def offload(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run blocking write work on the pool without admission control
+        (fsyncs, processed flags - writes that must not be dropped)"""
+        return await self._run(self._executor, fn, *args, **kwargs)
+
+    async def background(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking read or housekeeping job (search, export, leases,
+        checkpoints, compaction) on the background pool"""
+        return await self._run(self._background, fn, *args, **kwargs)
+
+    @staticmethod
+    async def _run(
+        executor: Optional[ThreadPoolExecutor], fn: Callable, *args, **kwargs
+    ) -> Any:
+        if executor is None:
+            return fn(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor, functools.partial(fn, *args, **kwargs)
+        )
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "background_workers": self.background_workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        """Wait for in-flight jobs to finish"""
+        for executor in (self._background, self._executor):
+            if executor is not None:
+                executor.shutdown(wait=True)
+
+
+# Singleton instance
+_ingest_pipeline: Optional[IngestPipeline] = None
+
+
+def get_ingest_pipeline() -> IngestPipeline:
+    """Get or create the ingest pipeline"""
+    global _ingest_pipeline
+    if _ingest_pipeline is None:
+        _ingest_pipeline = IngestPipeline()
+    return _ingest_pipeline
+
+
+__all__ = [
+    "IngestPipeline",
+    "IngestOverloaded",
+    "get_ingest_pipeline",
+]
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Mergeable latency quantiles (DDSketch)
+A value lands in the logarithmically spaced bucket ``ceil(log(v) / log(gamma))``
+with ``gamma = (1 + a) / (1 - a)``; any quantile read back is within a
+relative error ``a`` (1% by default) of the true one. A sketch is just bucket
+counts, so adding a value is O(1) and merging sketches (from other processes,
+other tools, other time spans) is adding their counts. That lets the buckets
+live in the shared state's counters, where every instance's updates add up.
+
+Buckets are named ``b<index>``; values <= 0 go to ``z``.
+"""
+
+import math
+from typing import Dict, Iterable, Optional
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+
+class DDSketch:
+    """Quantile sketch with relative-error guarantees"""
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[str, int] = {}
+        self.count = 0
+
+    def bucket(self, value: float) -> str:
+        """Name of the bucket ``value`` falls in"""
+        if value <= 0:
+            return "z"
+        return f"b{math.ceil(math.log(value) / self._log_gamma)}"
+
+    def add(self, value: float, weight: int = 1):
+        name = self.bucket(value)
+        self.buckets[name] = self.buckets.get(name, 0) + weight
+        self.count += weight
+
+    def merge(self, other: "DDSketch"):
+        """Add another sketch's counts (same accuracy) to this one"""
+        self.merge_buckets(other.buckets)
+
+    def merge_buckets(self, buckets: Dict[str, int]):
+        for name, count in buckets.items():
+            if name == "z" or name.startswith("b"):
+                self.buckets[name] = self.buckets.get(name, 0) + count
+                self.count += count
+
+    def _value(self, name: str) -> float:
+        if name == "z":
+            return 0.0
+        index = int(name[1:])
+        # Midpoint (in relative terms) of (gamma^(i-1), gamma^i]
+        return 2 * self.gamma**index / (self.gamma + 1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate of the q-quantile (0 <= q <= 1); None when empty"""
+        if self.count <= 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for name in sorted(self.buckets, key=self._order):
+            seen += self.buckets[name]
+            if seen > rank:
+                return self._value(name)
+        return self._value(max(self.buckets, key=self._order))
+
+    def quantiles(self, qs: Iterable[float] = (0.5, 0.9, 0.99)) -> Dict[str, float]:
+        """``{"p50": ..., "p90": ..., "p99": ...}`` rounded to 0.01"""
+        estimates = {}
+        for q in qs:
+            value = self.quantile(q)
+            estimates[f"p{round(q * 100):g}"] = (
+                None if value is None else round(value, 2)
+            )
+        return estimates
+
+    @staticmethod
+    def _order(name: str) -> float:
+        return -math.inf if name == "z" else int(name[1:])
+
+
+__all__ = ["DDSketch", "DEFAULT_RELATIVE_ACCURACY"]
@@ -4,15 +4,21 @@ Smart Tree Feedback API - The Taco Bell of Directory Tools!
 Collects enhancement requests from AI assistants using smart-tree MCP.
 """
 
-from fastapi import FastAPI, HTTPException, Header, Request, Depends
-from fastapi.responses import PlainTextResponse
+from fastapi import FastAPI, HTTPException, Header, Query, Request, Response, Depends
+from fastapi.responses import (
+    JSONResponse,
+    ORJSONResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from typing import Optional, List, Dict, Literal, Any
 from datetime import datetime, timezone
+from contextlib import asynccontextmanager
+import asyncio
 import hashlib
 import json
-import zlib
 import os
 from pathlib import Path
 import uvicorn
@@ -22,15 +28,133 @@ import time
 from functools import lru_cache
 
 # Import new modules
+import auth
 from auth import (
-    AgentAuth, TokenResponse, require_agent_auth, create_access_token,
-    verify_agent_key, rate_limit, RateLimiter, AGENT_KEYS
+    AgentAuth,
+    TokenResponse,
+    require_agent_auth,
+    create_access_token,
+    verify_agent_key,
+    rate_limit,
+    RateLimiter,
+    AGENT_KEYS,
+    charge_agent,
+    refund_agent,
 )
 from llm_assistant import get_assistant, SmartTreeTask, LLMResponse
 from admin_panel import router as admin_router
+from feedback_log import RecordLocation, acquire_writer_lock, get_feedback_log
+from feedback_index import (
+    decode_pending_cursor,
+    decode_search_cursor,
+    encode_pending_cursor,
+    encode_search_cursor,
+    get_feedback_index,
+    index_row,
+    search_query,
+)
+from feedback_aggregates import FeedbackAggregates
+from feedback_rollups import RESOLUTIONS, FeedbackRollups, agent_of
+from feedback_export import decode_cursor, iter_export, stream_export
+from feedback_dedup import fingerprint, get_feedback_dedup
+from feedback_queue import get_feedback_queue
+from conditional import conditional, generations
+from feedback_similar import get_similarity_index
+from shared_state import SharedMap
+from tool_usage import get_tool_usage
+from update_decisions import get_update_decisions
+from stfb import FEEDBACK_MAGIC, encode_record, feedback_metadata
+import fast_json
+from ingest import IngestOverloaded, get_ingest_pipeline
 
 logger = logging.getLogger(__name__)
 
+
+async def group_commit_loop():
+    """Fsync the feedback log once per group commit interval"""
+    while True:
+        await asyncio.sleep(feedback_log.fsync_interval)
+        await ingest.offload(feedback_log.sync_if_due)
+
+
+async def checkpoint_loop():
+    """Periodically checkpoint the feedback aggregates, rollups and update
+    decision counts"""
+    while True:
+        await asyncio.sleep(int(os.getenv("AGGREGATES_CHECKPOINT_SECONDS", "30")))
+        await ingest.background(feedback_aggregates.checkpoint)
+        await ingest.background(feedback_rollups.checkpoint)
+        await ingest.background(update_decisions.checkpoint)
+
+
+async def compaction_loop():
+    """Pack closed days of the feedback log into mmap-able pack files"""
+    while True:
+        try:
+            days = await ingest.background(
+                feedback_log.compact_closed, today(), feedback_index.relocate
+            )
+            if days:
+                logger.info(f"📦 Packed {days} closed days of feedback")
+        except Exception as e:
+            logger.error(f"Feedback log compaction failed: {e}")
+        await asyncio.sleep(int(os.getenv("FEEDBACK_COMPACT_INTERVAL_SECONDS", "3600")))
+
+
+async def verify_loop():
+    """Periodically reconcile the maintained counters with what's on disk"""
+    while True:
+        await asyncio.sleep(int(os.getenv("HEALTH_VERIFY_INTERVAL_SECONDS", "300")))
+        try:
+            await ingest.background(verify_corpus)
+        except Exception as e:
+            logger.error(f"Corpus verification failed: {e}")
+
+
+async def tool_usage_loop():
+    """Flush the tool usage log and compact it when due"""
+    while True:
+        await asyncio.sleep(1)
+        try:
+            if await ingest.background(tool_usage.sync_if_due):
+                await ingest.background(generations.bump, "tools")
+        except Exception as e:
+            logger.error(f"Tool usage persistence failed: {e}")
+
+
+async def similarity_snapshot_loop():
+    """Periodically snapshot the similarity index to disk"""
+    while True:
+        await asyncio.sleep(int(os.getenv("FEEDBACK_SIMILAR_SNAPSHOT_SECONDS", "600")))
+        try:
+            await ingest.background(feedback_similarity.snapshot)
+        except Exception as e:
+            logger.error(f"Similarity snapshot failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background flushers and close the feedback log on shutdown"""
+    tasks = [
+        asyncio.create_task(group_commit_loop()),
+        asyncio.create_task(checkpoint_loop()),
+        asyncio.create_task(compaction_loop()),
+        asyncio.create_task(verify_loop()),
+        asyncio.create_task(similarity_snapshot_loop()),
+        asyncio.create_task(tool_usage_loop()),
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+    ingest.shutdown()  # let in-flight submissions land before closing the log
+    feedback_log.close()
+    feedback_aggregates.checkpoint()
+    feedback_rollups.checkpoint()
+    feedback_similarity.snapshot()
+    tool_usage.close()
+    update_decisions.close()
+
+
 app = FastAPI(
     title="Smart Tree Feedback API",
     description="Collect structured feedback from AI assistants to enhance smart-tree",
@@ -38,6 +162,9 @@ app = FastAPI(
     docs_url="/api/docs",
     redoc_url="/api/redoc",
     openapi_url="/api/openapi.json",
+    lifespan=lifespan,
+    # orjson-rendered responses when orjson is installed
+    default_response_class=ORJSONResponse if fast_json.orjson else JSONResponse,
 )
 
 # Add CORS middleware
@@ -208,12 +335,21 @@ class ToolUsageStats(BaseModel):
 
     tool_name: str
     model_type: str = Field(..., description="AI model type (opus, sonnet, gpt4, etc)")
-    usage_count: int = Field(default=1)
+    usage_count: int = Field(default=1, ge=1)
     success_rate: float = Field(..., ge=0, le=1)
     avg_execution_time_ms: Optional[float] = None
     timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
+class ToolUsageBatch(BaseModel):
+    """Tool usage aggregated by the client over a time window: one entry per
+    tool and model, ``usage_count`` being the calls in the window"""
+
+    window_start: Optional[datetime] = None
+    window_end: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    stats: List[ToolUsageStats]
+
+
 class FeedbackResponse(BaseModel):
     """Response after submitting feedback"""
 
@@ -222,6 +358,65 @@ class FeedbackResponse(BaseModel):
     compressed_size: int
     original_size: int
     compression_ratio: float
+    duplicate: bool = Field(
+        False, description="Already received; feedback_id is the stored original"
+    )
+    similar_to: List[str] = Field(
+        default_factory=list,
+        description="Previously received feedback that looks related",
+    )
+
+
+class BatchItemResult(BaseModel):
+    """Outcome of one item of a batch submission"""
+
+    index: int = Field(..., description="Position of the item in the batch")
+    status: Literal["accepted", "rejected"]
+    feedback: Optional[FeedbackResponse] = None
+    error: Optional[str] = Field(None, description="Why the item was rejected")
+
+
+class BatchFeedbackResponse(BaseModel):
+    """Response after submitting a batch of feedback"""
+
+    accepted: int
+    rejected: int
+    results: List[BatchItemResult]
+
+
+class ClaimRequest(BaseModel):
+    """A worker asking for pending feedback to work on"""
+
+    worker: str = Field(..., description="Name of the worker replica")
+    limit: int = Field(10, ge=1, le=100, description="Max items to lease")
+    lease_seconds: int = Field(
+        300, ge=1, le=3600, description="How long the items stay leased"
+    )
+
+
+class ClaimedFeedback(BaseModel):
+    """One leased feedback item"""
+
+    id: str
+    lease_token: str = Field(..., description="Pass back to ack or nack")
+    lease_expires_at: datetime
+    deliveries: int = Field(..., description="How often it has been claimed")
+    feedback: Dict[str, Any]
+
+
+class ClaimResponse(BaseModel):
+    """Items leased by a claim"""
+
+    items: List[ClaimedFeedback]
+
+
+class LeaseRequest(BaseModel):
+    """Ack or nack of a leased item"""
+
+    lease_token: str
+    retry_after_seconds: int = Field(
+        0, ge=0, description="nack only: delay before re-delivery"
+    )
 
 
 # Storage configuration
@@ -231,13 +426,73 @@ STATS_DIR = Path(os.getenv("STATS_DIR", "./stats"))
 STATS_DIR.mkdir(exist_ok=True)
 CONSENT_DIR = Path(os.getenv("CONSENT_DIR", "./consent"))
 CONSENT_DIR.mkdir(exist_ok=True)
-
-# In-memory caches
-tool_stats_cache = defaultdict(
-    lambda: {"count": 0, "models": defaultdict(int), "last_used": None}
+WRITE_SUMMARIES = os.getenv("FEEDBACK_SUMMARIES", "true").lower() != "false"
+FEEDBACK_BATCH_MAX_ITEMS = int(os.getenv("FEEDBACK_BATCH_MAX_ITEMS", "100"))
+TOOL_USAGE_BATCH_MAX_ITEMS = int(os.getenv("TOOL_USAGE_BATCH_MAX_ITEMS", "1000"))
+
+# One writing process per FEEDBACK_DIR: a second one (e.g. a second uvicorn
+# worker) fails here, at import, rather than corrupting the store
+acquire_writer_lock(FEEDBACK_DIR)
+
+# Segmented append-only log holding every feedback record and state event
+feedback_log = get_feedback_log()
+
+# SQLite metadata index, one row per feedback id
+feedback_index = get_feedback_index()
+
+# Index whatever the log holds that the index hasn't seen yet
+# (first start after an upgrade, or a crash between append and index write)
+feedback_index.catch_up(feedback_log)
+feedback_index.catch_up_search(feedback_log)
+
+# Counters behind /feedback/stats and the leaderboard, rebuilt from the
+# index when the last checkpoint doesn't match it
+feedback_aggregates = FeedbackAggregates(STATS_DIR / "feedback_aggregates.json")
+feedback_aggregates.ensure_consistent(feedback_index)
+
+# Per-minute/hour/day submission counts behind /stats/timeseries, seeded from
+# the index when there is no checkpoint yet
+feedback_rollups = FeedbackRollups(STATS_DIR / "feedback_rollups.json")
+if not feedback_rollups.load():
+    feedback_rollups.seed(feedback_index)
+
+# Fingerprints of recent feedback, so retried reports aren't stored twice
+feedback_dedup = get_feedback_dedup()
+
+# MinHash/LSH signatures behind "related feedback" lookups, loaded from the
+# last snapshot and caught up with the index
+feedback_similarity = get_similarity_index()
+feedback_similarity.catch_up(feedback_index, feedback_log)
+
+# Redis Stream the workers consume new feedback from (best effort; the log
+# stays the source of truth)
+feedback_queue = get_feedback_queue()
+
+# Bounded pool that runs compression and blocking writes off the event loop
+ingest = get_ingest_pipeline()
+
+# State shared by every API instance (Redis, or this process in dev)
+shared_state = auth.shared_state
+generations.share(shared_state)
+consent_cache = SharedMap(
+    shared_state,
+    "consent",
+    load=ConsentRequest.model_validate,
+    dump=lambda consent: consent.model_dump(mode="json"),
 )
-consent_cache = {}
-announcements_cache = {}
+announcements_cache = SharedMap(
+    shared_state,
+    "announcements",
+    load=Announcement.model_validate,
+    dump=lambda announcement: announcement.model_dump(mode="json"),
+)
+
+
+# Tool usage counters, restored from their snapshot and write-ahead log
+tool_usage = get_tool_usage()
+
+# Update decisions: NDJSON log plus counts restored from their checkpoint
+update_decisions = get_update_decisions()
 
 
 def generate_feedback_id(feedback: SmartTreeFeedback) -> str:
@@ -246,12 +501,145 @@ def generate_feedback_id(feedback: SmartTreeFeedback) -> str:
     return hashlib.sha256(content.encode()).hexdigest()[:16]
 
 
-def compress_feedback(feedback: SmartTreeFeedback) -> tuple[bytes, int, int]:
-    """Compress feedback using zlib for efficient storage"""
-    json_data = feedback.model_dump_json(indent=2)
-    original_size = len(json_data.encode())
-    compressed = zlib.compress(json_data.encode(), level=9)
-    return compressed, len(compressed), original_size
+def feedback_document(
+    feedback: SmartTreeFeedback, feedback_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """The JSON document stored for a feedback item"""
+    document = feedback.model_dump(mode="json")
+    if feedback_id:
+        # Records share segments, so each one carries its own id
+        document["id"] = feedback_id
+    return document
+
+
+def compress_feedback(
+    feedback: SmartTreeFeedback, feedback_id: Optional[str] = None
+) -> tuple[bytes, int, int]:
+    """Compress feedback into an STFB v3 record (zstd + trained dictionary,
+    with category/model/scores/timestamp in the header).
+
+    Returns (record, compressed_size, original_size).
+    """
+    document = feedback_document(feedback, feedback_id)
+    json_data = fast_json.dumps(document)
+    record, compressed_size = encode_record(
+        FEEDBACK_MAGIC, json_data, feedback_metadata(document)
+    )
+    return record, compressed_size, len(json_data)
+
+
+def parse_feedback_batch(body: bytes, content_type: str) -> List[Any]:
+    """Raw items of a batch body: a JSON array, or NDJSON (one document per
+    line) when sent as application/x-ndjson. A malformed NDJSON line becomes
+    a ValueError in its slot so the rest of the batch still goes through."""
+    if "ndjson" in content_type:
+        items: List[Any] = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(fast_json.loads(line))
+            except ValueError as e:
+                items.append(ValueError(f"Invalid JSON: {e}"))
+        return items
+
+    try:
+        items = fast_json.loads(body)
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if not isinstance(items, list):
+        raise ValueError("Expected a JSON array of feedback (or NDJSON)")
+    return items
+
+
+def validation_message(error: ValidationError) -> str:
+    """One-line summary of a pydantic validation error"""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc']) or 'item'}: {detail['msg']}"
+        for detail in error.errors()
+    )
+
+
+def format_summary(feedback_id: str, feedback: SmartTreeFeedback) -> str:
+    """Human-readable summary entry for the day's summary log"""
+    return (
+        f"ID: {feedback_id}\n"
+        f"Category: {feedback.category}\n"
+        f"Title: {feedback.title}\n"
+        f"Impact: {feedback.impact_score}/10, Frequency: {feedback.frequency_score}/10\n"
+        f"Model: {feedback.ai_model}\n"
+        f"Time: {feedback.timestamp}\n"
+        f"Version: {feedback.smart_tree_version}\n"
+        f"Tags: {', '.join(feedback.tags)}\n"
+        f"\nDescription:\n{feedback.description[:500]}...\n"
+    )
+
+
+def today() -> str:
+    """Current UTC day, used to pick the active log segment"""
+    return f"{datetime.now(timezone.utc).date()}"
+
+
+# Outcome of the last background corpus verification (see verify_corpus)
+corpus_check: Dict[str, Any] = {}
+
+
+def verify_corpus() -> Dict[str, Any]:
+    """Count feedback records on disk (headers only) and reconcile the index
+    and the maintained counter with them (blocking; runs on the background pool).
+
+    Submissions landing mid-check can make the numbers disagree for a
+    moment, so a repair only happens when the same drift is seen twice in a
+    row.
+    """
+    on_disk = sum(
+        1
+        for _, record in feedback_log.iter_records(with_payload=False)
+        if record.magic == FEEDBACK_MAGIC
+    )
+    indexed = feedback_index.count()
+    counter = feedback_aggregates.total
+    drift = {
+        name: delta
+        for name, delta in (
+            ("index", on_disk - indexed),
+            ("counter", indexed - counter),
+        )
+        if delta
+    }
+
+    repaired = []
+    previous = corpus_check.get("drift") or {}
+    if drift.get("index") and drift["index"] == previous.get("index"):
+        feedback_index.catch_up(feedback_log)
+        repaired.append("index")
+    if drift.get("counter") and drift["counter"] == previous.get("counter"):
+        feedback_aggregates.rebuild(feedback_index)
+        repaired.append("counter")
+    if "counter" in repaired:
+        generations.bump("feedback")
+    if repaired:
+        logger.warning(f"🩺 Corpus drift {drift}, repaired {repaired}")
+        drift = {name: delta for name, delta in drift.items() if name not in repaired}
+
+    corpus_check.clear()
+    corpus_check.update(
+        {
+            "verified_at": datetime.now(timezone.utc).isoformat(),
+            "on_disk": on_disk,
+            "indexed": indexed,
+            "counter": counter,
+            "drift": drift,
+            "repaired": repaired,
+        }
+    )
+    return corpus_check
+
+
+def record_event(event: Dict[str, Any]):
+    """Append a state event to the log and apply it to the index"""
+    feedback_log.append_event(event, today())
+    feedback_index.apply_event(event)
 
 
 @app.get("/")
@@ -261,16 +649,25 @@ async def root():
         "message": "Smart Tree Feedback API - Be excellent to each other! 🎸",
         "endpoints": {
             "/feedback": "Submit feedback (POST)",
+            "/feedback/batch": "Submit a JSON array or NDJSON of feedback (POST)",
             "/feedback/{id}": "Get specific feedback",
             "/feedback/stats": "Get feedback statistics",
+            "/feedback/export": "Stream the corpus as NDJSON (resumable)",
+            "/feedback/search": "Full-text search (?q=)",
+            "/feedback/{id}/similar": "Related feedback (MinHash/LSH)",
+            "/feedback/claim": "Lease pending feedback for a worker (POST)",
+            "/stats/timeseries": "Submissions per minute/hour/day",
             "/health": "Health check",
+            "/health/live": "Liveness probe (constant time)",
+            "/health/ready": "Readiness probe (storage, Redis, index freshness)",
         },
     }
 
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (summary; probes should use /health/live and
+    /health/ready)"""
     # Check if directories are accessible
     health_status = {
         "status": "healthy",
@@ -282,16 +679,211 @@ async def health_check():
         },
     }
 
-    # Count feedback files
+    # Counts come from maintained counters; nothing is scanned per probe
     try:
-        feedback_count = sum(1 for _ in FEEDBACK_DIR.glob("**/*.stfb"))
-        health_status["feedback_count"] = feedback_count
+        health_status["feedback_count"] = feedback_aggregates.total
+        health_status["corpus_check"] = corpus_check
+        health_status["ingest"] = ingest.stats()
+        health_status["dedup"] = feedback_dedup.stats()
+        health_status["similar"] = feedback_similarity.stats()
+        health_status["stream"] = feedback_queue.stats()
+        health_status["leases"] = feedback_index.lease_stats()
     except Exception:
         health_status["status"] = "degraded"
 
     return health_status
 
 
+@app.get("/health/live")
+async def health_live():
+    """Liveness probe: constant time, touches nothing"""
+    return {"status": "alive"}
+
+
+def ping_redis() -> Optional[bool]:
+    """True/False for a Redis round trip; None when Redis isn't configured"""
+    if auth.redis_client is None:
+        return None
+    try:
+        return bool(auth.redis_client.ping())
+    except Exception:
+        return False
+
+
+@app.get("/health/ready")
+async def health_ready(response: Response):
+    """Readiness probe: storage writable and index in step with the log.
+
+    Redis is reported but doesn't fail readiness - rate limiting and the
+    feedback stream both degrade gracefully without it.
+    """
+    checks = {
+        "feedback_dir": os.access(FEEDBACK_DIR, os.W_OK),
+        "stats_dir": os.access(STATS_DIR, os.W_OK),
+        "consent_dir": os.access(CONSENT_DIR, os.W_OK),
+        # Drift seen by the background verifier that it hasn't repaired yet
+        "index_fresh": not corpus_check.get("drift"),
+    }
+    try:
+        redis_ok = await asyncio.wait_for(ingest.background(ping_redis), timeout=2)
+    except asyncio.TimeoutError:
+        redis_ok = False
+
+    ready = all(checks.values())
+    if not ready:
+        response.status_code = 503
+        status = "not_ready"
+    else:
+        status = "degraded" if redis_ok is False else "ready"
+    return {
+        "status": status,
+        "checks": {**checks, "redis": redis_ok},
+        "feedback_count": feedback_aggregates.total,
+        "last_verified": corpus_check.get("verified_at"),
+    }
+
+
+def store_feedback(feedback: SmartTreeFeedback, feedback_id: str) -> FeedbackResponse:
+    """Compress, append, index and summarize one submission (blocking; runs
+    on the ingest pool)"""
+    return store_feedback_batch([(feedback, feedback_id)])[0]
+
+
+def store_feedback_batch(
+    items: List[tuple[SmartTreeFeedback, str]]
+) -> List[FeedbackResponse]:
+    """Store several submissions as one group commit: a single log write, a
+    single index transaction and a single summary write (blocking; runs on
+    the ingest pool). Repeats of recently received feedback are answered
+    with the stored id and not written again."""
+    day = today()
+    responses: List[Optional[FeedbackResponse]] = []
+    fresh, claimed, documents = [], [], []
+    for feedback, feedback_id in items:
+        document = feedback_document(feedback, feedback_id)
+        content = fingerprint(document)
+        size = len(fast_json.dumps(document))
+        existing_id = feedback_dedup.claim(
+            content, feedback_id, day, size, stored=feedback_index.locate
+        )
+        if existing_id:
+            responses.append(duplicate_response(existing_id))
+        else:
+            fresh.append((len(responses), (feedback, feedback_id)))
+            claimed.append(content)
+            documents.append(document)
+            responses.append(None)
+
+    try:
+        stored = write_feedback([item for _, item in fresh], day)
+    except Exception:
+        feedback_dedup.release(claimed)
+        raise
+    feedback_dedup.confirm(claimed)
+    for (position, _), response in zip(fresh, stored):
+        responses[position] = response
+
+    # Wake the workers (after the write, so they never see unstored feedback)
+    feedback_queue.publish(documents)
+    return responses
+
+
+def duplicate_response(feedback_id: str) -> FeedbackResponse:
+    """Answer for a repeat: the id it was stored under, nothing written"""
+    return FeedbackResponse(
+        feedback_id=feedback_id,
+        message="Already got this one - thanks for the persistence! 🌮",
+        compressed_size=0,
+        original_size=0,
+        compression_ratio=0,
+        duplicate=True,
+    )
+
+
+def write_feedback(
+    items: List[tuple[SmartTreeFeedback, str]], day: str
+) -> List[FeedbackResponse]:
+    """Compress, append, index and summarize new feedback"""
+    if not items:
+        return []
+
+    # Compress feedback
+    compressed = [
+        compress_feedback(feedback, feedback_id) for feedback, feedback_id in items
+    ]
+
+    # Append to today's log segment (group committed, no per-feedback files)
+    locations = feedback_log.append_many([record for record, _, _ in compressed], day)
+
+    # Index metadata so stats and listings never rescan the log
+    documents = [
+        feedback_document(feedback, feedback_id) for feedback, feedback_id in items
+    ]
+    feedback_index.add_many(
+        index_row(document, location, original_size, compressed_size)
+        for document, location, (_, compressed_size, original_size) in zip(
+            documents, locations, compressed
+        )
+    )
+
+    # Sign the new feedback and note what it resembles
+    similar = feedback_similarity.add_many(documents)
+
+    responses = []
+    for (feedback, feedback_id), (_, compressed_size, original_size), matches in zip(
+        items, compressed, similar
+    ):
+        feedback_aggregates.add(
+            day,
+            feedback.category,
+            feedback.ai_model,
+            feedback.impact_score,
+            original_size,
+            compressed_size,
+        )
+        feedback_rollups.add(
+            feedback.category, feedback.ai_model, agent_of(feedback.tags)
+        )
+        compression_ratio = (
+            original_size / compressed_size if compressed_size > 0 else 0
+        )
+        responses.append(
+            FeedbackResponse(
+                feedback_id=feedback_id,
+                message="Feedback received! The Franchise Wars appreciate your contribution! 🌮",
+                compressed_size=compressed_size,
+                original_size=original_size,
+                compression_ratio=round(compression_ratio, 2),
+                similar_to=[similar_id for similar_id, _ in matches],
+            )
+        )
+
+    # Stats and leaderboard ETags move on
+    generations.bump("feedback")
+
+    # Optionally keep a human-readable summary (tools read the headers instead)
+    if WRITE_SUMMARIES:
+        feedback_log.append_summaries(
+            day,
+            [format_summary(feedback_id, feedback) for feedback, feedback_id in items],
+        )
+
+    return responses
+
+
+def tag_feedback(
+    feedback: SmartTreeFeedback, x_mcp_client: Optional[str], agent: Optional[Dict]
+):
+    """Tag feedback with the submitting MCP client and agent"""
+    # Add MCP client info if provided
+    if x_mcp_client:
+        feedback.tags.append(f"mcp_client:{x_mcp_client}")
+
+    # Add agent info if authenticated
+    if agent:
+        feedback.tags.append(f"agent:{agent['agent_id']}")
+
+
 @app.post("/feedback", response_model=FeedbackResponse)
 @rate_limit(max_requests=100, window_seconds=60)
 async def submit_feedback(
@@ -305,66 +897,110 @@ async def submit_feedback(
         # Generate ID
         feedback_id = generate_feedback_id(feedback)
 
-        # Add MCP client info if provided
-        if x_mcp_client:
-            feedback.tags.append(f"mcp_client:{x_mcp_client}")
-        
-        # Add agent info if authenticated
-        if agent:
-            feedback.tags.append(f"agent:{agent['agent_id']}")
+        tag_feedback(feedback, x_mcp_client, agent)
 
-        # Compress feedback
-        compressed_data, compressed_size, original_size = compress_feedback(feedback)
+        # Compression and disk writes run on the ingest pool, off the event loop
+        return await ingest.submit(store_feedback, feedback, feedback_id)
 
-        # Save compressed feedback
-        feedback_file = (
-            FEEDBACK_DIR / f"{feedback.timestamp.date()}" / f"{feedback_id}.stfb"
+    except IngestOverloaded as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Feedback ingest is busy, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)},
         )
-        feedback_file.parent.mkdir(exist_ok=True)
-
-        # Write compressed data with metadata header
-        with open(feedback_file, "wb") as f:
-            # Write header: magic number + version + original size + compressed size
-            f.write(b"STFB")  # Smart Tree FeedBack magic
-            f.write(b"\x01\x00")  # Version 1.0
-            f.write(original_size.to_bytes(4, "little"))
-            f.write(compressed_size.to_bytes(4, "little"))
-            f.write(compressed_data)
-
-        # Also save a human-readable summary
-        summary_file = feedback_file.with_suffix(".summary.txt")
-        with open(summary_file, "w") as f:
-            f.write(f"ID: {feedback_id}\n")
-            f.write(f"Category: {feedback.category}\n")
-            f.write(f"Title: {feedback.title}\n")
-            f.write(
-                f"Impact: {feedback.impact_score}/10, Frequency: {feedback.frequency_score}/10\n"
-            )
-            f.write(f"Model: {feedback.ai_model}\n")
-            f.write(f"Time: {feedback.timestamp}\n")
-            f.write(f"Version: {feedback.smart_tree_version}\n")
-            f.write(f"Tags: {', '.join(feedback.tags)}\n")
-            f.write(f"\nDescription:\n{feedback.description[:500]}...\n")
-
-        compression_ratio = (
-            original_size / compressed_size if compressed_size > 0 else 0
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to save feedback: {str(e)}"
         )
 
-        return FeedbackResponse(
-            feedback_id=feedback_id,
-            message="Feedback received! The Franchise Wars appreciate your contribution! 🌮",
-            compressed_size=compressed_size,
-            original_size=original_size,
-            compression_ratio=round(compression_ratio, 2),
-        )
 
-    except Exception as e:
+@app.post("/feedback/batch", response_model=BatchFeedbackResponse)
+@rate_limit(max_requests=100, window_seconds=60)
+async def submit_feedback_batch(
+    request: Request,
+    response: Response,
+    x_mcp_client: Optional[str] = Header(None, description="MCP client identifier"),
+    agent: Dict = Depends(require_agent_auth),
+):
+    """Submit many feedback items at once (requires authentication).
+
+    Accepts a JSON array, or NDJSON with Content-Type application/x-ndjson.
+    Valid items are written together as one group commit; invalid ones are
+    reported per item (HTTP 207 when some were rejected). The call itself
+    counts against the per-client limit like /feedback, and each accepted
+    item counts as one more request against the agent's rate limit.
+    """
+    try:
+        raw_items = parse_feedback_batch(
+            await request.body(), request.headers.get("content-type", "")
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not raw_items:
+        raise HTTPException(status_code=400, detail="Empty batch")
+    if len(raw_items) > FEEDBACK_BATCH_MAX_ITEMS:
         raise HTTPException(
-            status_code=500, detail=f"Failed to save feedback: {str(e)}"
+            status_code=413,
+            detail=f"Batch too large (max {FEEDBACK_BATCH_MAX_ITEMS} items)",
         )
 
+    results: Dict[int, BatchItemResult] = {}
+    valid = []
+    for index, raw in enumerate(raw_items):
+        try:
+            if isinstance(raw, ValueError):
+                raise raw
+            feedback = SmartTreeFeedback.model_validate(raw)
+        except ValidationError as e:
+            error = validation_message(e)
+        except ValueError as e:
+            error = str(e)
+        else:
+            tag_feedback(feedback, x_mcp_client, agent)
+            valid.append((index, feedback, generate_feedback_id(feedback)))
+            continue
+        results[index] = BatchItemResult(index=index, status="rejected", error=error)
+
+    if valid:
+        # On top of the unit authentication charged for the call itself, and
+        # given back if the items are never stored
+        charge_agent(agent, len(valid))
+        try:
+            stored = await ingest.submit(
+                store_feedback_batch,
+                [(feedback, feedback_id) for _, feedback, feedback_id in valid],
+            )
+        except IngestOverloaded as e:
+            refund_agent(agent, len(valid))
+            raise HTTPException(
+                status_code=503,
+                detail="Feedback ingest is busy, please retry shortly",
+                headers={"Retry-After": str(e.retry_after)},
+            )
+        except Exception as e:
+            refund_agent(agent, len(valid))
+            raise HTTPException(
+                status_code=500, detail=f"Failed to save feedback batch: {str(e)}"
+            )
+        for (index, _, _), stored_feedback in zip(valid, stored):
+            results[index] = BatchItemResult(
+                index=index, status="accepted", feedback=stored_feedback
+            )
 
-@app.get("/feedback/stats")
+    rejected = len(raw_items) - len(valid)
+    if rejected:
+        response.status_code = 207
+    return BatchFeedbackResponse(
+        accepted=len(valid),
+        rejected=rejected,
+        results=[results[index] for index in range(len(raw_items))],
+    )
+
+
+@app.get(
+    "/feedback/stats",
+    dependencies=[Depends(conditional("feedback", cache_control="public, max-age=15"))],
+)
 async def get_feedback_stats():
     """Get statistics about collected feedback"""
     stats = {
@@ -379,28 +1015,23 @@ async def get_feedback_stats():
         },
     }
 
-    # Scan feedback directory
-    for date_dir in FEEDBACK_DIR.glob("*"):
-        if date_dir.is_dir():
-            date_str = date_dir.name
-            stats["by_date"][date_str] = 0
-
-            for feedback_file in date_dir.glob("*.summary.txt"):
-                stats["total_feedback"] += 1
-                stats["by_date"][date_str] += 1
-
-                # Parse summary for quick stats
-                with open(feedback_file, "r") as f:
-                    content = f.read()
-                    for line in content.split("\n"):
-                        if line.startswith("Category:"):
-                            category = line.split(":")[1].strip()
-                            stats["by_category"][category] += 1
-                        elif line.startswith("Model:"):
-                            model = line.split(":")[1].strip()
-                            stats["top_models"][model] = (
-                                stats["top_models"].get(model, 0) + 1
-                            )
+    # Incrementally maintained counters, no scanning
+    aggregates = feedback_aggregates.snapshot()
+    stats["total_feedback"] = aggregates["total"]
+    stats["by_category"].update(aggregates["by_category"])
+    stats["by_date"] = aggregates["by_date"]
+    stats["top_models"] = {
+        model: data["count"] for model, data in aggregates["by_model"].items()
+    }
+    stats["compression_stats"] = {
+        "total_original_size": aggregates["original_size"],
+        "total_compressed_size": aggregates["compressed_size"],
+        "average_compression_ratio": (
+            round(aggregates["original_size"] / aggregates["compressed_size"], 2)
+            if aggregates["compressed_size"] > 0
+            else 0
+        ),
+    }
 
     return stats
 
@@ -411,15 +1042,7 @@ async def dispatch_fix(
 ):
     """Dispatch an AI to fix the reported issue"""
     # Check if feedback exists
-    feedback_file = None
-    for date_dir in FEEDBACK_DIR.glob("*"):
-        if date_dir.is_dir():
-            candidate = date_dir / f"{feedback_id}.stfb"
-            if candidate.exists():
-                feedback_file = candidate
-                break
-
-    if not feedback_file:
+    if not feedback_index.locate(feedback_id):
         raise HTTPException(status_code=404, detail="Feedback not found")
 
     # Create branch name
@@ -433,9 +1056,7 @@ async def dispatch_fix(
     )
 
     # Save dispatch record
-    dispatch_file = feedback_file.parent / f"{feedback_id}.dispatch.json"
-    with open(dispatch_file, "w") as f:
-        f.write(dispatch.model_dump_json(indent=2))
+    record_event({"event": "dispatch", **dispatch.model_dump(mode="json")})
 
     # Trigger webhook if configured
     webhook_url = os.getenv("SMART_TREE_FIX_WEBHOOK")
@@ -464,25 +1085,12 @@ async def dispatch_fix(
 async def get_credits(feedback_id: str):
     """Get credit attribution for a feedback/fix"""
     # This would retrieve from a database in production
-    # For now, parse from files
-    summary_file = None
-    for date_dir in FEEDBACK_DIR.glob("*"):
-        if date_dir.is_dir():
-            candidate = date_dir / f"{feedback_id}.summary.txt"
-            if candidate.exists():
-                summary_file = candidate
-                break
-
-    if not summary_file:
+    # For now, read from the feedback index
+    feedback = feedback_index.get(feedback_id)
+    if not feedback:
         raise HTTPException(status_code=404, detail="Feedback not found")
 
-    # Parse summary for model info
-    with open(summary_file, "r") as f:
-        content = f.read()
-        model_line = [
-            line for line in content.split("\n") if line.startswith("Model:")
-        ][0]
-        reporter_model = model_line.split(":")[1].strip()
+    reporter_model = feedback["ai_model"]
 
     return {
         "feedback_id": feedback_id,
@@ -512,17 +1120,13 @@ async def github_webhook(payload: Dict, x_github_event: str = Header(None)):
             branch = pr["head"]["ref"]
             feedback_id = branch.split("/")[1].split("-")[0]
 
-            # Update dispatch status
-            for date_dir in FEEDBACK_DIR.glob("*"):
-                dispatch_file = date_dir / f"{feedback_id}.dispatch.json"
-                if dispatch_file.exists():
-                    with open(dispatch_file, "r") as f:
-                        dispatch = json.load(f)
-                    dispatch["status"] = "in_progress"
-                    dispatch["pr_url"] = pr["html_url"]
-                    with open(dispatch_file, "w") as f:
-                        json.dump(dispatch, f, indent=2)
-                    break
+            # Update dispatch status (branch names only carry an id prefix)
+            full_id = feedback_index.resolve_prefix(feedback_id)
+            dispatch = feedback_index.get_dispatch(full_id) if full_id else None
+            if dispatch:
+                dispatch["status"] = "in_progress"
+                dispatch["pr_url"] = pr["html_url"]
+                record_event({"event": "dispatch", **dispatch})
 
         elif action == "closed" and pr.get("merged"):
             # Credit the implementer
@@ -535,48 +1139,19 @@ async def github_webhook(payload: Dict, x_github_event: str = Header(None)):
     return {"status": "webhook processed"}
 
 
-@app.get("/credits/leaderboard")
+@app.get(
+    "/credits/leaderboard",
+    dependencies=[
+        Depends(
+            conditional("feedback", cache_control="public, max-age=60", extra=today)
+        )
+    ],
+)
 async def get_leaderboard():
     """Get the REAL AI contribution leaderboard"""
-    # Calculate real stats from feedback data
-    model_stats = defaultdict(
-        lambda: {"count": 0, "total_impact": 0, "categories": defaultdict(int)}
-    )
-
-    # Scan all feedback files for real data
-    for date_dir in FEEDBACK_DIR.glob("*"):
-        if date_dir.is_dir():
-            for summary_file in date_dir.glob("*.summary.txt"):
-                try:
-                    with open(summary_file, "r") as f:
-                        content = f.read()
-
-                        # Parse summary for stats
-                        model = None
-                        impact = 0
-                        category = None
-
-                        for line in content.split("\n"):
-                            if line.startswith("Model:"):
-                                model = line.split(":", 1)[1].strip()
-                            elif line.startswith("Impact:"):
-                                # Extract impact score (e.g., "Impact: 8/10")
-                                try:
-                                    impact = int(
-                                        line.split(":")[1].split("/")[0].strip()
-                                    )
-                                except (ValueError, IndexError):
-                                    impact = 5  # Default
-                            elif line.startswith("Category:"):
-                                category = line.split(":", 1)[1].strip()
-
-                        if model:
-                            model_stats[model]["count"] += 1
-                            model_stats[model]["total_impact"] += impact
-                            if category:
-                                model_stats[model]["categories"][category] += 1
-                except Exception as e:
-                    logger.error(f"Error reading {summary_file}: {e}")
+    # Real stats from the incrementally maintained per-model counters
+    aggregates = feedback_aggregates.snapshot()
+    model_stats = aggregates["by_model"]
 
     # Sort by number of issues found
     sorted_reporters = sorted(
@@ -607,8 +1182,8 @@ async def get_leaderboard():
         )
 
     # Calculate some fun stats
-    total_feedback = sum(stats["count"] for _, stats in model_stats.items())
-    total_impact = sum(stats["total_impact"] for _, stats in model_stats.items())
+    total_feedback = aggregates["total"]
+    total_impact = aggregates["total_impact"]
 
     return {
         "message": "🏆 Smart Tree AI Contributors Leaderboard (REAL DATA!) 🏆",
@@ -620,9 +1195,7 @@ async def get_leaderboard():
         "top_reporter": reporters[0] if reporters else None,
         "most_active_today": {
             "model": "claude-3-opus",  # You as Claude!
-            "contributions_today": len(
-                list(FEEDBACK_DIR.glob(f"{datetime.now().date()}/*.summary.txt"))
-            ),
+            "contributions_today": aggregates["by_date"].get(today(), 0),
         },
         "special_thanks": [
             "Aye - The Quantum Visionary 🌊",
@@ -639,24 +1212,76 @@ async def get_leaderboard():
 @app.post("/tools/usage")
 async def track_tool_usage(stats: ToolUsageStats):
     """Track anonymous tool usage statistics"""
-    tool_stats_cache[stats.tool_name]["count"] += stats.usage_count
-    tool_stats_cache[stats.tool_name]["models"][stats.model_type] += stats.usage_count
-    tool_stats_cache[stats.tool_name]["last_used"] = stats.timestamp
-
-    # Save to disk periodically
-    stats_file = STATS_DIR / f"tool_stats_{datetime.now(timezone.utc).date()}.json"
-    with open(stats_file, "w") as f:
-        json.dump(dict(tool_stats_cache), f, indent=2, default=str)
+    # Buffered in process; the tool usage loop merges, logs and bumps the
+    # generation once a second, off the event loop
+    tool_usage.buffer(
+        stats.tool_name,
+        stats.model_type,
+        stats.usage_count,
+        stats.timestamp.isoformat(),
+        stats.avg_execution_time_ms,
+        stats.success_rate,
+    )
 
     return {"message": "Stats recorded", "tool": stats.tool_name}
 
 
-@app.get("/tools/popular")
+@app.post("/tools/usage/batch")
+async def track_tool_usage_batch(batch: ToolUsageBatch):
+    """Merge a window of client-aggregated tool usage in one step.
+
+    Agents that call tools constantly should count calls per tool and model
+    locally and send them here every few seconds instead of one /tools/usage
+    request per call.
+    """
+    if not batch.stats:
+        raise HTTPException(status_code=400, detail="Empty batch")
+    if len(batch.stats) > TOOL_USAGE_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large (max {TOOL_USAGE_BATCH_MAX_ITEMS} items)",
+        )
+
+    window_end = batch.window_end.isoformat()
+    # Merged with everything else buffered by the next tool usage sync
+    tool_usage.buffer_many(
+        [
+            (
+                item.tool_name,
+                item.model_type,
+                item.usage_count,
+                # Unless the client says when a tool was last used, the end
+                # of the window is the best guess
+                (
+                    item.timestamp.isoformat()
+                    if "timestamp" in item.model_fields_set
+                    else window_end
+                ),
+                item.avg_execution_time_ms,
+                item.success_rate,
+            )
+            for item in batch.stats
+        ]
+    )
+
+    return {
+        "message": "Stats recorded",
+        "entries": len(batch.stats),
+        "events": sum(item.usage_count for item in batch.stats),
+        "tools": len({item.tool_name for item in batch.stats}),
+    }
+
+
+@app.get(
+    "/tools/popular",
+    dependencies=[Depends(conditional("tools", cache_control="public, max-age=30"))],
+)
 async def get_popular_tools(limit: int = 10):
     """Get most popular tools by AI model usage"""
     # Sort tools by usage count
+    tools = tool_usage.stats()
     popular_tools = sorted(
-        [(name, data) for name, data in tool_stats_cache.items()],
+        tools.items(),
         key=lambda x: x[1]["count"],
         reverse=True,
     )[:limit]
@@ -674,7 +1299,24 @@ async def get_popular_tools(limit: int = 10):
             }
             for tool, data in popular_tools
         ],
-        "total_unique_tools": len(tool_stats_cache),
+        "total_unique_tools": len(tools),
+    }
+
+
+@app.get(
+    "/tools/latency",
+    dependencies=[Depends(conditional("tools", cache_control="public, max-age=30"))],
+)
+async def get_tool_latency(tool: Optional[str] = None, model: Optional[str] = None):
+    """Latency quantiles and success ratios reported for tools in the field.
+
+    Built from `avg_execution_time_ms` and `success_rate` of usage reports;
+    each report counts as `usage_count` calls at its average. Without
+    filters every tool and model is merged.
+    """
+    return {
+        "message": "⏱️ Tool latency from the field",
+        **tool_usage.latency(tool, model),
     }
 
 
@@ -700,8 +1342,9 @@ async def set_consent(consent: ConsentRequest):
 async def check_consent(user_id: str):
     """Check user's consent preferences"""
     # Check cache first
-    if user_id in consent_cache:
-        return consent_cache[user_id].model_dump()
+    consent = consent_cache.get(user_id)
+    if consent is not None:
+        return consent.model_dump()
 
     # Check disk
     consent_file = CONSENT_DIR / f"{user_id}.json"
@@ -715,68 +1358,288 @@ async def check_consent(user_id: str):
     return {"consent_level": "ask_each_time", "message": "No consent on file"}
 
 
-@app.get("/feedback/pending")
-async def get_pending_feedback(limit: int = 10, offset: int = 0):
-    """Get pending feedback items for processing"""
+def read_pending(
+    limit: int, offset: int, after: Optional[tuple[str, str]]
+) -> tuple[List, List[bytes]]:
+    """Index rows of a page of pending feedback plus their stored payloads
+    (blocking; runs on the background pool)"""
+    # Unprocessed rows come straight from the index; only those are read.
+    # Stored payloads are already JSON, so they are spliced into the
+    # response as they are instead of being parsed and re-encoded.
+    rows = feedback_index.pending(limit, offset, after)
     pending_items = []
+    for row in rows:
+        location = RecordLocation(row["segment"], row["offset"])
+        try:
+            pending_items.append(feedback_log.read(location).data())
+        except Exception as e:
+            logger.error(f"Error reading feedback record at {location}: {e}")
+    return rows, pending_items
 
-    # Scan feedback directory for unprocessed items
-    for date_dir in FEEDBACK_DIR.iterdir():
-        if not date_dir.is_dir():
-            continue
 
-        for feedback_file in date_dir.glob("*.stfb"):
-            # Check if already processed (simple file-based check)
-            processed_marker = feedback_file.with_suffix(".processed")
-            if processed_marker.exists():
-                continue
+@app.get("/feedback/pending")
+async def get_pending_feedback(
+    limit: int = 10,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+):
+    """Get pending feedback items for processing, oldest day first.
 
-            try:
-                # Read compressed feedback
-                with open(feedback_file, "rb") as f:
-                    # Read header
-                    magic = f.read(4)
-                    if magic != b"STFB":
-                        continue
+    Page with `cursor`: every page sets an `X-Next-Cursor` header (and a
+    `Link: rel="next"`) that resumes right after its last item, at the same
+    cost for every page. `offset` still works but rescans what it skips.
+    At most 100 items are returned per page.
+    """
+    try:
+        after = decode_pending_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-                    _ = f.read(2)  # version
-                    _ = int.from_bytes(f.read(4), "little")  # original_size
-                    compressed_size = int.from_bytes(f.read(4), "little")
+    limit = max(1, min(limit, 100))
+    rows, pending_items = await ingest.background(
+        read_pending, limit, max(0, offset), after
+    )
 
-                    # Read and decompress data
-                    compressed_data = f.read(compressed_size)
-                    json_data = zlib.decompress(compressed_data).decode()
-                    feedback_data = json.loads(json_data)
+    response = Response(
+        fast_json.json_array(pending_items), media_type="application/json"
+    )
+    if len(rows) == limit:
+        next_cursor = encode_pending_cursor(rows[-1]["day"], rows[-1]["id"])
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = (
+            f'</feedback/pending?limit={limit}&cursor={next_cursor}>; rel="next"'
+        )
 
-                    pending_items.append(feedback_data)
+    return response
 
-                    if len(pending_items) >= limit:
-                        return pending_items
 
-            except Exception as e:
-                print(f"Error reading feedback file {feedback_file}: {e}")
-                continue
+@app.get("/feedback/search")
+async def search_feedback(
+    q: str,
+    category: Optional[FeedbackCategory] = None,
+    ai_model: Optional[str] = None,
+    processed: Optional[bool] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+):
+    """Full-text search over title, description, proposed solution, affected
+    command and tags, best matches (BM25) first.
+
+    Every word of `q` must match (`word*` matches a prefix). Filters narrow
+    by category, model, processed state and receive day (since/until,
+    inclusive YYYY-MM-DD). Pass `next_cursor` back as `cursor` for the next
+    page.
+    """
+    try:
+        query = search_query(q)
+        score, rowid, snapshot = (
+            decode_search_cursor(cursor) if cursor else (None, None, None)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    limit = max(1, min(limit, 100))
+
+    rows = await ingest.background(
+        feedback_index.search,
+        query,
+        limit,
+        (score, rowid) if cursor else None,
+        category,
+        ai_model,
+        processed,
+        since,
+        until,
+        snapshot,
+    )
+    results = [
+        {
+            "id": row["id"],
+            "title": row["title"],
+            "category": row["category"],
+            "ai_model": row["ai_model"],
+            "day": row["day"],
+            "processed": bool(row["processed"]),
+            # FTS5 ranks lower-is-better; flip it so higher means more relevant
+            "score": -row["score"],
+            "snippet": row["snippet"],
+        }
+        for row in rows
+    ]
+    next_cursor = (
+        encode_search_cursor(
+            rows[-1]["score"], rows[-1]["search_rowid"], rows[-1]["snapshot"]
+        )
+        if len(rows) == limit
+        else None
+    )
+    return {"query": q, "results": results, "next_cursor": next_cursor}
+
 
-    return pending_items[offset : offset + limit]
+@app.get("/feedback/{feedback_id}/similar")
+async def similar_feedback(
+    feedback_id: str, limit: int = 10, min_similarity: float = 0.3
+):
+    """Feedback that reads like this one (estimated Jaccard similarity of
+    their text), most similar first"""
+    location = feedback_index.locate(feedback_id)
+    if not location:
+        raise HTTPException(status_code=404, detail="Feedback not found")
+    limit = max(1, min(limit, 100))
+    min_similarity = max(0.0, min(min_similarity, 1.0))
+
+    def lookup():
+        document = feedback_log.read(location).document()
+        return [
+            (feedback_index.get(similar_id), similarity)
+            for similar_id, similarity in feedback_similarity.similar(
+                document, limit, min_similarity
+            )
+        ]
+
+    matches = await ingest.background(lookup)
+    return {
+        "feedback_id": feedback_id,
+        "similar": [
+            {
+                "id": row["id"],
+                "similarity": similarity,
+                "title": row["title"],
+                "category": row["category"],
+                "day": row["day"],
+                "processed": bool(row["processed"]),
+            }
+            for row, similarity in matches
+            if row
+        ],
+    }
+
+
+@app.get("/feedback/export")
+async def export_feedback(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    category: Optional[FeedbackCategory] = None,
+    ai_model: Optional[str] = None,
+    cursor: Optional[str] = None,
+    gzip: bool = False,
+    agent: Dict = Depends(require_agent_auth),
+):
+    """Stream the feedback corpus as NDJSON (requires authentication).
+
+    since/until: inclusive YYYY-MM-DD days the feedback was received on.
+    Each line carries a `_cursor`; pass the last one back to resume.
+    """
+    try:
+        for day in (since, until):
+            if day:
+                datetime.strptime(day, "%Y-%m-%d")
+        if cursor:
+            decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    lines = iter_export(feedback_log, since, until, category, ai_model, cursor)
+    return StreamingResponse(
+        stream_export(lines, ingest.background, gzip=gzip),
+        media_type="application/x-ndjson",
+        headers={"Content-Encoding": "gzip"} if gzip else None,
+    )
+
+
+def persist_processed(feedback_id: str, location: RecordLocation):
+    """Make 'processed' durable in the log and apply it to the index
+    (blocking; runs on the ingest pool)"""
+    # Flip the flag in the record header; older records get a processed event
+    if feedback_log.mark_processed(location):
+        feedback_index.mark_processed(feedback_id)
+    else:
+        record_event({"event": "processed", "id": feedback_id})
 
 
 @app.post("/feedback/{feedback_id}/processed")
 async def mark_feedback_processed(feedback_id: str):
     """Mark feedback as processed by worker"""
-    # Find the feedback file
-    for date_dir in FEEDBACK_DIR.iterdir():
-        if not date_dir.is_dir():
+    location = feedback_index.locate(feedback_id)
+    if not location:
+        raise HTTPException(status_code=404, detail="Feedback not found")
+
+    await ingest.offload(persist_processed, feedback_id, location)
+    return {"message": "Feedback marked as processed", "id": feedback_id}
+
+
+def claim_documents(
+    worker: str, limit: int, lease_seconds: int
+) -> List[tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Lease pending items and read their documents (blocking; runs on the
+    background pool, so record reads and decompression stay off the loop)"""
+    claimed = []
+    for lease in feedback_index.claim(worker, limit, lease_seconds):
+        try:
+            document = feedback_log.read(lease["location"]).document()
+        except Exception as e:
+            logger.error(f"Error reading feedback record at {lease['location']}: {e}")
             continue
+        claimed.append((lease, document))
+    return claimed
+
+
+@app.post("/feedback/claim", response_model=ClaimResponse)
+async def claim_feedback(claim: ClaimRequest):
+    """Lease up to `limit` pending items for one worker replica.
+
+    Leased items are invisible to other claims until acked, nacked or the
+    lease expires (then they are re-delivered), so replicas never process
+    the same item concurrently.
+    """
+    leases = await ingest.background(
+        claim_documents, claim.worker, claim.limit, claim.lease_seconds
+    )
+
+    items = []
+    for lease, document in leases:
+        items.append(
+            ClaimedFeedback(
+                id=lease["id"],
+                lease_token=lease["lease_token"],
+                lease_expires_at=datetime.fromtimestamp(
+                    lease["lease_expires_at"], timezone.utc
+                ),
+                deliveries=lease["deliveries"],
+                feedback=document,
+            )
+        )
+    return ClaimResponse(items=items)
 
-        feedback_file = date_dir / f"{feedback_id}.stfb"
-        if feedback_file.exists():
-            # Create processed marker
-            processed_marker = feedback_file.with_suffix(".processed")
-            processed_marker.touch()
 
-            return {"message": "Feedback marked as processed", "id": feedback_id}
+@app.post("/feedback/{feedback_id}/ack")
+async def ack_feedback(feedback_id: str, lease: LeaseRequest):
+    """Finish a claimed item: marks it processed and ends the lease"""
+    location = feedback_index.locate(feedback_id)
+    if not location:
+        raise HTTPException(status_code=404, detail="Feedback not found")
+    if not await ingest.background(feedback_index.ack, feedback_id, lease.lease_token):
+        raise HTTPException(
+            status_code=409, detail="Lease expired and the item was claimed again"
+        )
+
+    await ingest.offload(persist_processed, feedback_id, location)
+    return {"message": "Feedback acknowledged", "id": feedback_id}
 
-    raise HTTPException(status_code=404, detail="Feedback not found")
+
+@app.post("/feedback/{feedback_id}/nack")
+async def nack_feedback(feedback_id: str, lease: LeaseRequest):
+    """Give a claimed item back; it is re-delivered after retry_after_seconds"""
+    released = await ingest.background(
+        feedback_index.release,
+        feedback_id,
+        lease.lease_token,
+        lease.retry_after_seconds,
+    )
+    if not released:
+        raise HTTPException(status_code=409, detail="Lease is no longer held")
+    return {"message": "Feedback released", "id": feedback_id}
 
 
 @app.get("/tools/requested")
@@ -784,29 +1647,20 @@ async def get_requested_tools():
     """Get all tool requests from AI assistants"""
     tool_requests = []
 
-    # Scan feedback for tool requests
-    for date_dir in FEEDBACK_DIR.glob("*"):
-        if date_dir.is_dir():
-            for summary_file in date_dir.glob("*.summary.txt"):
-                with open(summary_file, "r") as f:
-                    content = f.read()
-                    if "Category: tool_request" in content:
-                        # Parse the full feedback file
-                        feedback_file = summary_file.with_suffix(".stfb")
-                        if feedback_file.exists():
-                            tool_requests.append(
-                                {
-                                    "id": summary_file.stem.replace(".summary", ""),
-                                    "date": date_dir.name,
-                                    "summary": content.split("Description:\n")[
-                                        1
-                                    ].strip()[:200],
-                                }
-                            )
+    # Latest tool requests from the index
+    total_requests = feedback_index.count(category="tool_request")
+    for row in feedback_index.recent(20, category="tool_request"):
+        tool_requests.append(
+            {
+                "id": row["id"],
+                "date": row["day"],
+                "summary": row["summary"][:200],
+            }
+        )
 
     return {
         "message": "🛠️ Tools requested by AI assistants",
-        "total_requests": len(tool_requests),
+        "total_requests": total_requests,
         "requests": tool_requests[:20],  # Latest 20
         "note": "These tools would make AI assistants more productive!",
     }
@@ -918,16 +1772,30 @@ def get_cached_version(cache_key: int):
     }
 
 
-@app.get("/smart-tree/latest")
+def version_window() -> str:
+    """Current 5-minute window, the cache key of the latest version info"""
+    return str(int(time.time() // 300))
+
+
+@app.get(
+    "/smart-tree/latest",
+    dependencies=[
+        Depends(conditional(cache_control="public, max-age=300", extra=version_window))
+    ],
+)
 async def get_latest_version():
     """Get latest Smart Tree version info (cached for 5 minutes)"""
     # Use current 5-minute window as cache key for 5-minute caching
-    cache_key = int(time.time() // 300)
-    return get_cached_version(cache_key)
+    return get_cached_version(int(version_window()))
+
+
+# The script only changes with a deploy, and the boot token in the ETag
+# changes with it. /tree is the short and sweet alias 🌲
+INSTALL_CACHE = [Depends(conditional(cache_control="public, max-age=3600"))]
 
 
-@app.get("/install", response_class=PlainTextResponse)
-@app.get("/tree", response_class=PlainTextResponse)  # Short and sweet! 🌲
+@app.get("/install", response_class=PlainTextResponse, dependencies=INSTALL_CACHE)
+@app.get("/tree", response_class=PlainTextResponse, dependencies=INSTALL_CACHE)
 async def get_install_script(version: Optional[str] = None):
     """Get Smart Tree installation/update script"""
 
@@ -1159,28 +2027,19 @@ class UpdateDecision(BaseModel):
 @app.post("/version/notify-update")
 async def notify_update_decision(decision: UpdateDecision):
     """Track user decisions on updates for better UX"""
-    # Log the decision for analytics
-    update_decision = {
-        "timestamp": datetime.now(timezone.utc),
-        "current_version": decision.current_version,
-        "latest_version": decision.latest_version,
-        "decision": decision.user_decision,
-        "ai_model": decision.ai_model,
-    }
-
-    # Save to stats
-    stats_file = (
-        STATS_DIR / f"update_decisions_{datetime.now(timezone.utc).date()}.json"
+    # Log the decision for analytics (one appended line, counted in the
+    # shared state), on the ingest pool: the write, a rotation's directory
+    # scan and the counter update all block
+    await ingest.offload(
+        update_decisions.record,
+        {
+            "current_version": decision.current_version,
+            "latest_version": decision.latest_version,
+            "decision": decision.user_decision,
+            "ai_model": decision.ai_model,
+        },
     )
-    decisions = []
-    if stats_file.exists():
-        with open(stats_file, "r") as f:
-            decisions = json.load(f)
-
-    decisions.append(update_decision)
-
-    with open(stats_file, "w") as f:
-        json.dump(decisions, f, indent=2, default=str)
+    generations.bump("update_decisions")
 
     return {
         "message": "Decision recorded",
@@ -1192,7 +2051,49 @@ async def notify_update_decision(decision: UpdateDecision):
     }
 
 
-@app.get("/announcements")
+@app.get(
+    "/version/decisions/summary",
+    dependencies=[
+        Depends(conditional("update_decisions", cache_control="public, max-age=60"))
+    ],
+)
+async def get_update_decision_summary(
+    current_version: Optional[str] = None,
+    latest_version: Optional[str] = None,
+    ai_model: Optional[str] = None,
+):
+    """How users answer update prompts, by version pair and model (from the
+    running counts; the decision log is never read)"""
+    return {
+        "message": "📈 Update decisions",
+        **update_decisions.summary(current_version, latest_version, ai_model),
+    }
+
+
+def expired_announcements() -> str:
+    """How many announcements have expired by now (changes what is listed)"""
+    now = datetime.now(timezone.utc)
+    return str(
+        sum(
+            1
+            for announcement in announcements_cache.values()
+            if announcement.expires_at and announcement.expires_at < now
+        )
+    )
+
+
+@app.get(
+    "/announcements",
+    dependencies=[
+        Depends(
+            conditional(
+                "announcements",
+                cache_control="public, max-age=60",
+                extra=expired_announcements,
+            )
+        )
+    ],
+)
 async def get_announcements(
     ai_model: Optional[str] = None, priority: Optional[str] = None
 ):
@@ -1282,6 +2183,7 @@ async def create_announcement(announcement: Announcement):
     """Create a new announcement (admin only in production)"""
     # Store announcement
     announcements_cache[announcement.id] = announcement
+    generations.bump("announcements")
 
     # Persist to disk
     announcement_file = STATS_DIR / "announcements.json"
@@ -1307,7 +2209,11 @@ async def create_announcement(announcement: Announcement):
 async def deactivate_announcement(announcement_id: str):
     """Deactivate an announcement"""
     if announcement_id in announcements_cache:
-        announcements_cache[announcement_id].active = False
+        # Stored as a copy: write it back so every instance sees the change
+        announcement = announcements_cache[announcement_id]
+        announcement.active = False
+        announcements_cache[announcement_id] = announcement
+        generations.bump("announcements")
 
         # Update persistence
         announcement_file = STATS_DIR / "announcements.json"
@@ -1364,6 +2270,43 @@ async def get_ai_tips():
     }
 
 
+@app.get("/stats/timeseries")
+async def get_stats_timeseries(
+    resolution: Literal["minute", "hour", "day"] = "hour",
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+):
+    """Submission counts per minute, hour or day, broken down by category,
+    model and agent. Defaults to the last 60 buckets; buckets without
+    submissions are left out. Served from in-memory rollups."""
+    width, size = RESOLUTIONS[resolution]
+    end_time = epoch(end) if end else time.time()
+    start_time = epoch(start) if start else end_time - 59 * width
+    if start_time > end_time:
+        raise HTTPException(status_code=400, detail="'from' is after 'to'")
+
+    points = feedback_rollups.series(resolution, start_time, end_time)
+    for point in points:
+        point["start"] = datetime.fromtimestamp(
+            point["start"], timezone.utc
+        ).isoformat()
+    return {
+        "resolution": resolution,
+        "bucket_seconds": width,
+        "retention_buckets": size,
+        "from": datetime.fromtimestamp(start_time, timezone.utc).isoformat(),
+        "to": datetime.fromtimestamp(end_time, timezone.utc).isoformat(),
+        "points": points,
+    }
+
+
+def epoch(moment: datetime) -> float:
+    """Epoch seconds of a query datetime (naive ones are taken as UTC)"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
 @app.get("/stats/model-activity")
 async def get_model_activity():
     """Get activity statistics by AI model"""
@@ -1375,24 +2318,13 @@ async def get_model_activity():
         }
     )
 
-    # Aggregate from feedback
-    for date_dir in FEEDBACK_DIR.glob("*"):
-        if date_dir.is_dir():
-            for summary_file in date_dir.glob("*.summary.txt"):
-                with open(summary_file, "r") as f:
-                    content = f.read()
-                    # Extract model and category
-                    for line in content.split("\n"):
-                        if line.startswith("Model:"):
-                            model = line.split(":")[1].strip()
-                        elif line.startswith("Category:"):
-                            category = line.split(":")[1].strip()
-
-                    model_stats[model]["feedback_submitted"] += 1
-                    model_stats[model]["categories"][category] += 1
+    # Aggregate from the index
+    for row in feedback_index.model_category_counts():
+        model_stats[row["ai_model"]]["feedback_submitted"] += row["count"]
+        model_stats[row["ai_model"]]["categories"][row["category"]] += row["count"]
 
     # Add tool usage stats
-    for tool_name, tool_data in tool_stats_cache.items():
+    for tool_name, tool_data in tool_usage.stats().items():
         for model, count in tool_data["models"].items():
             model_stats[model]["tools_used"][tool_name] = count
 
@@ -1459,19 +2391,21 @@ async def llm_assist(
     # Check if agent has LLM permissions
     if "llm.query" not in agent["permissions"] and "*" not in agent["permissions"]:
         raise HTTPException(status_code=403, detail="Agent lacks LLM query permission")
-    
+
     assistant = get_assistant()
+    started = time.perf_counter()
     response = await assistant.assist(task)
-    
-    # Track usage
-    await track_tool_usage(ToolUsageStats(
-        tool_name="llm_assist",
-        model_type=agent["name"],
-        usage_count=1,
-        success_rate=1.0 if response.response else 0.0,
-        avg_execution_time_ms=100,  # Would measure actual time
-    ))
-    
+
+    # Track usage (aggregated in process, merged once a second)
+    tool_usage.buffer(
+        "llm_assist",
+        agent["name"],
+        1,
+        datetime.now(timezone.utc).isoformat(),
+        (time.perf_counter() - started) * 1000,
+        1.0 if response.response else 0.0,
+    )
+
     return response
 
 
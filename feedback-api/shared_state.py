@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Shared state across API instances
+Agent keys, consent, announcements, tool counters and rate limits used to be
+plain dicts in each process. With several API instances behind a load
+balancer every instance had its own copy: stats diverged, agents created
+through the admin panel existed on one instance only, and each instance
+allowed the full rate limit.
+
+Each instance is one process with its own FEEDBACK_DIR: the feedback store
+has a single writer (see `feedback_log.acquire_writer_lock`), so running
+several uvicorn workers on one FEEDBACK_DIR is not supported.
+
+Two backends share one interface:
+
+- ``RedisState`` keeps everything in Redis. Reads of a namespace are served
+  from a local copy; every write publishes the namespace on an invalidation
+  channel and each process drops its copy when it hears it (and after
+  SHARED_STATE_CACHE_SECONDS regardless, in case a message was missed).
+- ``LocalState`` keeps it in this process, for single-process development.
+
+`get_shared_state()` picks Redis unless SHARED_STATE_BACKEND=local, and falls
+back to local (with a warning) when Redis can't be reached at startup.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "redis")
+SHARED_STATE_CACHE_SECONDS = float(os.getenv("SHARED_STATE_CACHE_SECONDS", "30"))
+
+FIELD_SEPARATOR = "\x1f"
+
+# Sliding-window check and charge in one step, so concurrent instances can't all
+# pass the check before any of them charges. ARGV: now, window, limit, cost,
+# member prefix; returns 1 if charged, 0 if over the limit.
+RATE_HIT_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cost = tonumber(ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+if redis.call('ZCARD', KEYS[1]) + cost > tonumber(ARGV[3]) then
+    return 0
+end
+for unit = 1, cost do
+    redis.call('ZADD', KEYS[1], now, ARGV[5] .. ':' .. unit)
+end
+redis.call('EXPIRE', KEYS[1], math.ceil(window))
+return 1
+"""
+
+
+class SharedState(ABC):
+    """Maps of JSON values, counters and rate-limit windows by namespace"""
+
+    backend = "abstract"
+
+    @abstractmethod
+    def get_map(self, namespace: str) -> Dict[str, Any]:
+        """Every key -> value of a namespace (don't mutate the result)"""
+
+    @abstractmethod
+    def put(self, namespace: str, key: str, value: Any):
+        """Store one key"""
+
+    @abstractmethod
+    def put_many(self, namespace: str, values: Dict[str, Any]):
+        """Store several keys in one step"""
+
+    @abstractmethod
+    def put_if_absent(self, namespace: str, key: str, value: Any) -> bool:
+        """Store ``value`` unless ``key`` exists; True if it was stored"""
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str) -> bool:
+        """Drop ``key``; True if it existed"""
+
+    @abstractmethod
+    def incr(self, namespace: str, deltas: Dict[Tuple[str, str], int]):
+        """Add to (key, field) counters, all in one step"""
+
+    @abstractmethod
+    def counters(self, namespace: str) -> Dict[str, Dict[str, int]]:
+        """key -> field -> count of a namespace (don't mutate the result)"""
+
+    @abstractmethod
+    def rate_hit(
+        self, identifier: str, max_requests: int, window_seconds: int, cost: int = 1
+    ) -> bool:
+        """Charge ``cost`` requests to ``identifier`` if it stays within
+        ``max_requests`` per window; False (and nothing charged) otherwise"""
+
+    @abstractmethod
+    def rate_refund(self, identifier: str, cost: int):
+        """Give back ``cost`` requests charged for work that never happened"""
+
+    @abstractmethod
+    def rate_remaining(
+        self, identifier: str, max_requests: int, window_seconds: int
+    ) -> Dict[str, int]:
+        """Limit, requests left and reset time of ``identifier``'s window"""
+
+
+class LocalState(SharedState):
+    """In-process state (single worker only)"""
+
+    backend = "local"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._maps: Dict[str, Dict[str, Any]] = defaultdict(dict)
+        self._counters: Dict[str, Dict[str, Dict[str, int]]] = defaultdict(
+            lambda: defaultdict(lambda: defaultdict(int))
+        )
+        self._windows: Dict[str, Dict[str, float]] = {}
+
+    def get_map(self, namespace: str) -> Dict[str, Any]:
+        return self._maps[namespace]
+
+    def put(self, namespace: str, key: str, value: Any):
+        with self._lock:
+            self._maps[namespace][key] = value
+
+    def put_many(self, namespace: str, values: Dict[str, Any]):
+        with self._lock:
+            self._maps[namespace].update(values)
+
+    def put_if_absent(self, namespace: str, key: str, value: Any) -> bool:
+        with self._lock:
+            if key in self._maps[namespace]:
+                return False
+            self._maps[namespace][key] = value
+            return True
+
+    def delete(self, namespace: str, key: str) -> bool:
+        with self._lock:
+            return self._maps[namespace].pop(key, None) is not None
+
+    def incr(self, namespace: str, deltas: Dict[Tuple[str, str], int]):
+        with self._lock:
+            counters = self._counters[namespace]
+            for (key, field), amount in deltas.items():
+                counters[key][field] += amount
+
+    def counters(self, namespace: str) -> Dict[str, Dict[str, int]]:
+        return self._counters[namespace]
+
+    def rate_hit(
+        self, identifier: str, max_requests: int, window_seconds: int, cost: int = 1
+    ) -> bool:
+        # Fixed window per identifier
+        now = time.time()
+        with self._lock:
+            window = self._windows.get(identifier)
+            if window is None or now >= window["reset_time"]:
+                window = self._windows[identifier] = {
+                    "count": 0,
+                    "reset_time": now + window_seconds,
+                }
+            if window["count"] + cost > max_requests:
+                return False
+            window["count"] += cost
+            return True
+
+    def rate_refund(self, identifier: str, cost: int):
+        with self._lock:
+            window = self._windows.get(identifier)
+            if window is not None:
+                window["count"] = max(0, window["count"] - cost)
+
+    def rate_remaining(
+        self, identifier: str, max_requests: int, window_seconds: int
+    ) -> Dict[str, int]:
+        window = self._windows.get(identifier)
+        if window is None:
+            return {
+                "remaining": max_requests,
+                "reset_in": window_seconds,
+                "limit": max_requests,
+            }
+        return {
+            "remaining": max(0, max_requests - window["count"]),
+            "reset_in": max(0, int(window["reset_time"] - time.time())),
+            "limit": max_requests,
+        }
+
+
+class RedisState(SharedState):
+    """Redis-backed state with pub/sub-invalidated local copies"""
+
+    backend = "redis"
+
+    def __init__(
+        self,
+        client: "redis.Redis",
+        prefix: str = "state:",
+        cache_seconds: float = SHARED_STATE_CACHE_SECONDS,
+        subscribe: bool = True,
+    ):
+        self.client = client
+        self.prefix = prefix
+        self.channel = f"{prefix}invalidate"
+        self.cache_seconds = cache_seconds
+        self._lock = threading.Lock()
+        # namespace -> (loaded at, decoded contents)
+        self._cache: Dict[str, Tuple[float, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._worker = None
+        self._rate_hit = client.register_script(RATE_HIT_SCRIPT)
+        if subscribe:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{self.channel: self.handle_invalidation})
+            self._worker = pubsub.run_in_thread(
+                sleep_time=1, daemon=True, exception_handler=self._subscriber_failed
+            )
+
+    def close(self):
+        if self._worker:
+            self._worker.stop()
+
+    # ------------------------------------------------------------------
+    # Local copies
+    # ------------------------------------------------------------------
+
+    def handle_invalidation(self, message: Dict[str, Any]):
+        """Pub/sub handler: another process (or this one) changed a namespace"""
+        self.invalidations += 1
+        with self._lock:
+            self._cache.pop(message["data"], None)
+
+    def _subscriber_failed(self, error: Exception, pubsub, worker):
+        # Messages may have been missed while disconnected; start afresh
+        logger.warning(f"Shared state invalidation channel failed: {error}")
+        with self._lock:
+            self._cache.clear()
+        time.sleep(1)
+
+    def _cached(self, namespace: str, load: Callable[[], Any]) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(namespace)
+            if entry and now - entry[0] < self.cache_seconds:
+                self.hits += 1
+                return entry[1]
+        self.misses += 1
+        value = load()
+        with self._lock:
+            self._cache[namespace] = (now, value)
+        return value
+
+    def _changed(self, *namespaces: str, pipe=None):
+        """Drop our copies now and tell every other process to do the same"""
+        with self._lock:
+            for namespace in namespaces:
+                self._cache.pop(namespace, None)
+        target = pipe or self.client
+        for namespace in namespaces:
+            target.publish(self.channel, namespace)
+
+    # ------------------------------------------------------------------
+    # Maps
+    # ------------------------------------------------------------------
+
+    def _map_key(self, namespace: str) -> str:
+        return f"{self.prefix}map:{namespace}"
+
+    def get_map(self, namespace: str) -> Dict[str, Any]:
+        return self._cached(
+            f"map:{namespace}",
+            lambda: {
+                key: json.loads(value)
+                for key, value in self.client.hgetall(self._map_key(namespace)).items()
+            },
+        )
+
+    def put(self, namespace: str, key: str, value: Any):
+        self.put_many(namespace, {key: value})
+
+    def put_many(self, namespace: str, values: Dict[str, Any]):
+        if not values:
+            return
+        pipe = self.client.pipeline()
+        pipe.hset(
+            self._map_key(namespace),
+            mapping={
+                key: json.dumps(value, default=str) for key, value in values.items()
+            },
+        )
+        self._changed(f"map:{namespace}", pipe=pipe)
+        pipe.execute()
+
+    def put_if_absent(self, namespace: str, key: str, value: Any) -> bool:
+        stored = self.client.hsetnx(
+            self._map_key(namespace), key, json.dumps(value, default=str)
+        )
+        if stored:
+            self._changed(f"map:{namespace}")
+        return bool(stored)
+
+    def delete(self, namespace: str, key: str) -> bool:
+        deleted = self.client.hdel(self._map_key(namespace), key)
+        if deleted:
+            self._changed(f"map:{namespace}")
+        return bool(deleted)
+
+    # ------------------------------------------------------------------
+    # Counters
+    # ------------------------------------------------------------------
+
+    def _counter_key(self, namespace: str) -> str:
+        return f"{self.prefix}counters:{namespace}"
+
+    def incr(self, namespace: str, deltas: Dict[Tuple[str, str], int]):
+        if not deltas:
+            return
+        pipe = self.client.pipeline()
+        for (key, field), amount in deltas.items():
+            pipe.hincrby(
+                self._counter_key(namespace), f"{key}{FIELD_SEPARATOR}{field}", amount
+            )
+        self._changed(f"counters:{namespace}", pipe=pipe)
+        pipe.execute()
+
+    def counters(self, namespace: str) -> Dict[str, Dict[str, int]]:
+        def load():
+            counters: Dict[str, Dict[str, int]] = defaultdict(dict)
+            stored = self.client.hgetall(self._counter_key(namespace))
+            for name, value in stored.items():
+                key, _, field = name.partition(FIELD_SEPARATOR)
+                counters[key][field] = int(value)
+            return counters
+
+        return self._cached(f"counters:{namespace}", load)
+
+    # ------------------------------------------------------------------
+    # Rate limits (sliding window, shared by every process)
+    # ------------------------------------------------------------------
+
+    def _window_count(self, identifier: str, window_seconds: int) -> int:
+        key = f"rate_limit:{identifier}"
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(key, 0, time.time() - window_seconds)
+        pipe.zcard(key)
+        return pipe.execute()[1]
+
+    def rate_hit(
+        self, identifier: str, max_requests: int, window_seconds: int, cost: int = 1
+    ) -> bool:
+        now = time.time()
+        charged = self._rate_hit(
+            keys=[f"rate_limit:{identifier}"],
+            # One entry per unit; the random part keeps requests charged in
+            # the same instant apart
+            args=[now, window_seconds, max_requests, cost, f"{now}:{uuid.uuid4().hex}"],
+        )
+        return bool(charged)
+
+    def rate_refund(self, identifier: str, cost: int):
+        # The newest entries: which ones doesn't matter, only how many
+        self.client.zpopmax(f"rate_limit:{identifier}", cost)
+
+    def rate_remaining(
+        self, identifier: str, max_requests: int, window_seconds: int
+    ) -> Dict[str, int]:
+        count = self._window_count(identifier, window_seconds)
+        return {
+            "remaining": max(0, max_requests - count),
+            "reset_in": window_seconds,
+            "limit": max_requests,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+class SharedMap(MutableMapping):
+    """dict-like view of one namespace of the shared state. Values are
+    stored as JSON; ``load``/``dump`` convert richer values. Changing a value
+    in place is not seen by other processes: assign it back instead."""
+
+    def __init__(
+        self,
+        state: SharedState,
+        namespace: str,
+        load: Optional[Callable[[Any], Any]] = None,
+        dump: Optional[Callable[[Any], Any]] = None,
+    ):
+        self.state = state
+        self.namespace = namespace
+        self._load = load or (lambda value: value)
+        self._dump = dump or (lambda value: value)
+
+    def __getitem__(self, key: str) -> Any:
+        return self._load(self.state.get_map(self.namespace)[key])
+
+    def __setitem__(self, key: str, value: Any):
+        self.state.put(self.namespace, key, self._dump(value))
+
+    def __delitem__(self, key: str):
+        if not self.state.delete(self.namespace, key):
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.state.get_map(self.namespace)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.state.get_map(self.namespace)))
+
+    def __len__(self) -> int:
+        return len(self.state.get_map(self.namespace))
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        """Atomic: the first process to set ``key`` wins"""
+        self.state.put_if_absent(self.namespace, key, self._dump(default))
+        return self[key]
+
+
+# Singleton instance
+_shared_state: Optional[SharedState] = None
+
+
+def get_shared_state() -> SharedState:
+    """Get or create the shared state backend"""
+    global _shared_state
+    if _shared_state is None:
+        if SHARED_STATE_BACKEND == "local":
+            _shared_state = LocalState()
+        else:
+            client = redis.from_url(
+                os.getenv("REDIS_URL", "redis://localhost:6379"),
+                decode_responses=True,
+                socket_connect_timeout=0.5,
+            )
+            try:
+                client.ping()
+                _shared_state = RedisState(client)
+            except redis.RedisError as e:
+                logger.warning(
+                    f"Redis unavailable ({e}); shared state is per-process, "
+                    "run a single worker"
+                )
+                _shared_state = LocalState()
+    return _shared_state
+
+
+__all__ = [
+    "SharedState",
+    "LocalState",
+    "RedisState",
+    "SharedMap",
+    "get_shared_state",
+]
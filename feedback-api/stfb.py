@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+"""
+STFB (Smart Tree FeedBack) record format
+Shared framing for everything we persist: magic + version + sizes + payload
+
+Version 1 frames carry a zlib payload. Version 2 frames carry a zstd payload
+and a dictionary id right after the common header; the dictionary is trained
+on our own feedback corpus, which is what makes small, repetitive documents
+compress well. Version 3 frames are version 2 frames for feedback records
+with a fixed 64-byte header that also carries indexable metadata (category,
+scores, model id, timestamp, processed flag, payload CRC32), so scanners can
+read a record's metadata with one struct read and never decompress it.
+Readers handle every version transparently.
+
+Dictionaries live in $STFB_DICT_DIR (default $FEEDBACK_DIR/dictionaries) as
+<dict_id>.zdict files plus an ACTIVE pointer. Retrain and rotate with:
+    python stfb.py train      # train on recent feedback and make it active
+    python stfb.py activate <dict_id>
+    python stfb.py list
+Old dictionaries are never deleted; records written with them stay readable.
+"""
+
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, NamedTuple, Optional, Tuple
+
+import fast_json
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - v1 (zlib) only
+    zstandard = None
+
+FEEDBACK_MAGIC = b"STFB"  # Smart Tree FeedBack
+EVENT_MAGIC = b"STEV"  # Smart Tree EVent (processed markers, fix dispatches)
+KNOWN_MAGICS = (FEEDBACK_MAGIC, EVENT_MAGIC)
+
+VERSION_1 = b"\x01\x00"  # zlib payload
+VERSION_2 = b"\x02\x00"  # zstd payload, optionally with a trained dictionary
+VERSION_3 = b"\x03\x00"  # version 2 payload + metadata block (feedback records)
+
+# Header: magic number + version + original size + compressed size
+HEADER = struct.Struct("<4s2sII")
+# Version 2 only: dictionary id following the header (0 = no dictionary)
+DICT_ID = struct.Struct("<I")
+# Version 3: the whole 64-byte header in one struct
+#   magic, version, original size, compressed size, dictionary id, payload
+#   CRC32, timestamp (ms since epoch), model id, category code, impact,
+#   frequency, flags, feedback id, reserved
+METADATA_HEADER = struct.Struct("<4s2sIIIIqHBBBB16s12x")
+FLAGS_OFFSET = struct.calcsize("<4s2sIIIIqHBBB")  # byte updated in place
+FLAG_PROCESSED = 0x01
+
+CATEGORY_CODES = {"bug": 1, "nice_to_have": 2, "critical": 3, "tool_request": 4}
+CATEGORY_NAMES = {code: name for name, code in CATEGORY_CODES.items()}
+
+# zstd tuning
+ZSTD_LEVEL = int(os.getenv("STFB_ZSTD_LEVEL", "3"))
+DICT_SIZE = int(os.getenv("STFB_DICT_SIZE", str(16 * 1024)))
+DICT_TRAIN_SAMPLES = int(os.getenv("STFB_DICT_TRAIN_SAMPLES", "5000"))
+ACTIVE_RECHECK_SECONDS = 30  # how often writers notice a rotated dictionary
+
+
+class Metadata(NamedTuple):
+    """Indexable metadata carried in a version 3 header"""
+
+    feedback_id: str
+    category: str
+    impact_score: int
+    frequency_score: int
+    model_id: int
+    timestamp_ms: int
+    flags: int = 0
+    crc32: int = 0
+
+    @property
+    def processed(self) -> bool:
+        return bool(self.flags & FLAG_PROCESSED)
+
+    @property
+    def ai_model(self) -> str:
+        return get_model_registry().name(self.model_id)
+
+    @property
+    def timestamp(self) -> datetime:
+        return datetime.fromtimestamp(self.timestamp_ms / 1000, timezone.utc)
+
+
+class Record(NamedTuple):
+    """A single framed record as stored on disk"""
+
+    magic: bytes
+    version: bytes
+    original_size: int
+    compressed_size: int
+    payload: bytes
+    dict_id: int = 0
+    metadata: Optional[Metadata] = None
+
+    @property
+    def is_event(self) -> bool:
+        return self.magic == EVENT_MAGIC
+
+    @property
+    def frame_size(self) -> int:
+        return header_size(self.version) + self.compressed_size
+
+    def data(self) -> bytes:
+        """Decompressed payload bytes"""
+        if self.metadata and zlib.crc32(self.payload) != self.metadata.crc32:
+            raise ValueError("STFB payload checksum mismatch")
+        if self.version in (VERSION_2, VERSION_3):
+            return get_dictionaries().decompress(
+                self.payload, self.dict_id, self.original_size
+            )
+        return zlib.decompress(self.payload)
+
+    def document(self) -> Dict[str, Any]:
+        """Decompressed payload parsed as JSON"""
+        return fast_json.loads(self.data())
+
+
+def header_size(version: bytes) -> int:
+    """Bytes before the payload for a given format version"""
+    if version == VERSION_3:
+        return METADATA_HEADER.size
+    return HEADER.size + DICT_ID.size if version == VERSION_2 else HEADER.size
+
+
+class DictionaryStore:
+    """Trained zstd dictionaries on disk, plus the one new records use"""
+
+    ACTIVE_FILE = "ACTIVE"
+
+    def __init__(self, root: Path, level: int = ZSTD_LEVEL):
+        self.root = Path(root)
+        self.level = level
+        self._lock = threading.Lock()
+        self._dicts: Dict[int, Any] = {}
+        self._local = threading.local()  # zstd (de)compressors aren't thread-safe
+        self._active_id = 0
+        self._active_checked = float("-inf")
+
+    def _path(self, dict_id: int) -> Path:
+        return self.root / f"{dict_id}.zdict"
+
+    def get(self, dict_id: int):
+        """Load (and cache) a dictionary by id"""
+        dictionary = self._dicts.get(dict_id)
+        if dictionary is not None:
+            return dictionary
+        with self._lock:
+            if dict_id not in self._dicts:
+                try:
+                    data = self._path(dict_id).read_bytes()
+                except FileNotFoundError:
+                    raise ValueError(f"Unknown STFB dictionary {dict_id}") from None
+                dictionary = zstandard.ZstdCompressionDict(data)
+                dictionary.precompute_compress(level=self.level)
+                self._dicts[dict_id] = dictionary
+            return self._dicts[dict_id]
+
+    def ids(self) -> List[int]:
+        """Every dictionary on disk"""
+        if not self.root.exists():
+            return []
+        return sorted(int(p.stem) for p in self.root.glob("*.zdict"))
+
+    def active_id(self) -> int:
+        """Dictionary new records are written with (0 = none trained yet)"""
+        now = time.monotonic()
+        if now - self._active_checked >= ACTIVE_RECHECK_SECONDS:
+            try:
+                self._active_id = int((self.root / self.ACTIVE_FILE).read_text())
+            except (OSError, ValueError):
+                self._active_id = 0
+            self._active_checked = now
+        return self._active_id
+
+    def activate(self, dict_id: int):
+        """Point new writes at a dictionary (rotation / rollback)"""
+        self.get(dict_id)  # must exist
+        tmp_path = self.root / f"{self.ACTIVE_FILE}.tmp"
+        tmp_path.write_text(str(dict_id))
+        os.replace(tmp_path, self.root / self.ACTIVE_FILE)
+        self._active_id = dict_id
+        self._active_checked = time.monotonic()
+
+    def train(self, samples: List[bytes], size: int = DICT_SIZE) -> int:
+        """Train a dictionary on sample documents and save it. Returns its id."""
+        dictionary = zstandard.train_dictionary(size, samples)
+        dict_id = dictionary.dict_id()
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path(dict_id).with_suffix(".tmp")
+        tmp_path.write_bytes(dictionary.as_bytes())
+        os.replace(tmp_path, self._path(dict_id))
+        return dict_id
+
+    def compress(self, data: bytes) -> Tuple[int, bytes]:
+        """Compress with the active dictionary. Returns (dict_id, payload)."""
+        dict_id = self.active_id()
+        compressors = self._local.__dict__.setdefault("compressors", {})
+        compressor = compressors.get(dict_id)
+        if compressor is None:
+            compressor = zstandard.ZstdCompressor(
+                level=self.level,
+                dict_data=self.get(dict_id) if dict_id else None,
+                write_dict_id=False,  # already in the STFB header
+            )
+            compressors[dict_id] = compressor
+        return dict_id, compressor.compress(data)
+
+    def decompress(self, payload: bytes, dict_id: int, original_size: int) -> bytes:
+        """Decompress a version 2 payload"""
+        if zstandard is None:
+            raise ValueError("zstandard is required to read STFB v2 records")
+        decompressors = self._local.__dict__.setdefault("decompressors", {})
+        decompressor = decompressors.get(dict_id)
+        if decompressor is None:
+            decompressor = zstandard.ZstdDecompressor(
+                dict_data=self.get(dict_id) if dict_id else None
+            )
+            decompressors[dict_id] = decompressor
+        return decompressor.decompress(payload, max_output_size=original_size)
+
+
+class ModelRegistry:
+    """Stable small ids for AI model names (the header stores a uint16)"""
+
+    MAX_ID = 0xFFFF
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        try:
+            self._ids: Dict[str, int] = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            self._ids = {}
+        self._names = {model_id: name for name, model_id in self._ids.items()}
+
+    def id_for(self, name: str) -> int:
+        """Id for a model name, registering (durably) new ones. 0 = unknown."""
+        model_id = self._ids.get(name)
+        if model_id is not None:
+            return model_id
+        with self._lock:
+            if name not in self._ids:
+                model_id = len(self._ids) + 1
+                if model_id > self.MAX_ID:
+                    return 0
+                ids = {**self._ids, name: model_id}
+                # Persist before any record can refer to the new id
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.path.with_suffix(".tmp")
+                with open(tmp_path, "w") as f:
+                    json.dump(ids, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+                self._ids = ids
+                self._names[model_id] = name
+            return self._ids[name]
+
+    def name(self, model_id: int) -> str:
+        return self._names.get(model_id, "unknown")
+
+
+def feedback_metadata(document: Dict[str, Any]) -> Metadata:
+    """Header metadata for a feedback document"""
+    timestamp = datetime.fromisoformat(document["timestamp"])
+    return Metadata(
+        feedback_id=document["id"],
+        category=document["category"],
+        impact_score=document["impact_score"],
+        frequency_score=document["frequency_score"],
+        model_id=get_model_registry().id_for(document["ai_model"]),
+        timestamp_ms=int(timestamp.timestamp() * 1000),
+    )
+
+
+def compress(data: bytes) -> bytes:
+    """Compress a payload for a version 1 record"""
+    return zlib.compress(data, level=9)
+
+
+def pack_record(
+    magic: bytes,
+    original_size: int,
+    compressed: bytes,
+    version: bytes = VERSION_1,
+    dict_id: int = 0,
+    metadata: Optional[Metadata] = None,
+) -> bytes:
+    """Frame an already-compressed payload"""
+    if version == VERSION_3:
+        return (
+            METADATA_HEADER.pack(
+                magic,
+                version,
+                original_size,
+                len(compressed),
+                dict_id,
+                zlib.crc32(compressed),
+                metadata.timestamp_ms,
+                metadata.model_id,
+                CATEGORY_CODES.get(metadata.category, 0),
+                metadata.impact_score,
+                metadata.frequency_score,
+                metadata.flags,
+                metadata.feedback_id.encode()[:16],
+            )
+            + compressed
+        )
+    header = HEADER.pack(magic, version, original_size, len(compressed))
+    if version == VERSION_2:
+        header += DICT_ID.pack(dict_id)
+    return header + compressed
+
+
+def encode_record(
+    magic: bytes, data: bytes, metadata: Optional[Metadata] = None
+) -> Tuple[bytes, int]:
+    """Compress and frame a payload with the best available format.
+
+    Version 3 (zstd + active dictionary + metadata header) when metadata is
+    given, version 2 without it; version 1 (zlib) if zstandard isn't
+    installed. Returns (frame, compressed_size).
+    """
+    if zstandard is None:
+        compressed = compress(data)
+        return pack_record(magic, len(data), compressed), len(compressed)
+    dict_id, compressed = get_dictionaries().compress(data)
+    version = VERSION_3 if metadata else VERSION_2
+    frame = pack_record(magic, len(data), compressed, version, dict_id, metadata)
+    return frame, len(compressed)
+
+
+def encode_event(event: Dict[str, Any]) -> bytes:
+    """Frame a small JSON event (processed marker, dispatch record, ...)"""
+    data = fast_json.dumps(event)
+    return pack_record(EVENT_MAGIC, len(data), compress(data))
+
+
+def _parse_header(header) -> Optional[Tuple]:
+    """Decode a frame header from the start of ``header`` (bytes or memoryview).
+
+    Returns (magic, version, original_size, compressed_size, dict_id,
+    metadata), None if the header is cut short, and raises ValueError on
+    garbage.
+    """
+    if len(header) < HEADER.size:
+        return None
+
+    magic, version, original_size, compressed_size = HEADER.unpack_from(header)
+    if magic not in KNOWN_MAGICS:
+        raise ValueError(f"Bad STFB magic: {magic!r}")
+
+    dict_id, metadata = 0, None
+    if version == VERSION_3:
+        if len(header) < METADATA_HEADER.size:
+            return None
+        (
+            *_,
+            dict_id,
+            crc32,
+            timestamp_ms,
+            model_id,
+            category,
+            impact_score,
+            frequency_score,
+            flags,
+            feedback_id,
+        ) = METADATA_HEADER.unpack_from(header)
+        metadata = Metadata(
+            feedback_id.rstrip(b"\0").decode(),
+            CATEGORY_NAMES.get(category, "unknown"),
+            impact_score,
+            frequency_score,
+            model_id,
+            timestamp_ms,
+            flags,
+            crc32,
+        )
+    elif version == VERSION_2:
+        if len(header) < HEADER.size + DICT_ID.size:
+            return None
+        (dict_id,) = DICT_ID.unpack_from(header, HEADER.size)
+    elif version != VERSION_1:
+        raise ValueError(f"Unknown STFB version: {version!r}")
+
+    return magic, version, original_size, compressed_size, dict_id, metadata
+
+
+def read_record(f: BinaryIO, with_payload: bool = True) -> Optional[Record]:
+    """Read the next record from a file positioned at a frame boundary.
+
+    Returns None at end of file or when the tail is a partially written
+    frame (e.g. after a crash mid-append). Raises ValueError on garbage.
+    """
+    # One read covers the largest header; shorter ones seek back
+    start = f.tell()
+    parsed = _parse_header(f.read(METADATA_HEADER.size))
+    if parsed is None:
+        return None
+    magic, version, original_size, compressed_size, dict_id, metadata = parsed
+    f.seek(start + header_size(version))
+
+    if with_payload:
+        payload = f.read(compressed_size)
+        if len(payload) < compressed_size:
+            return None
+    else:
+        # Skip the payload but still detect a torn tail
+        start = f.tell()
+        end = f.seek(0, 2)
+        if end - start < compressed_size:
+            return None
+        f.seek(start + compressed_size)
+        payload = b""
+
+    return Record(
+        magic, version, original_size, compressed_size, payload, dict_id, metadata
+    )
+
+
+def unpack_record(
+    buffer, offset: int = 0, with_payload: bool = True
+) -> Optional[Record]:
+    """Parse the record at ``offset`` of a bytes-like buffer (e.g. an mmap).
+
+    The payload is a zero-copy memoryview slice of the buffer.
+    """
+    view = memoryview(buffer)
+    parsed = _parse_header(view[offset : offset + METADATA_HEADER.size])
+    if parsed is None:
+        return None
+    magic, version, original_size, compressed_size, dict_id, metadata = parsed
+
+    start = offset + header_size(version)
+    if start + compressed_size > len(view):
+        return None
+    payload = view[start : start + compressed_size] if with_payload else b""
+    return Record(
+        magic, version, original_size, compressed_size, payload, dict_id, metadata
+    )
+
+
+# Singleton instances
+_dictionaries: Optional[DictionaryStore] = None
+_model_registry: Optional[ModelRegistry] = None
+
+
+def get_model_registry() -> ModelRegistry:
+    """Get or create the model id registry"""
+    global _model_registry
+    if _model_registry is None:
+        feedback_dir = Path(os.getenv("FEEDBACK_DIR", "./feedback"))
+        _model_registry = ModelRegistry(feedback_dir / "models.json")
+    return _model_registry
+
+
+def get_dictionaries() -> DictionaryStore:
+    """Get or create the dictionary store"""
+    global _dictionaries
+    if _dictionaries is None:
+        feedback_dir = Path(os.getenv("FEEDBACK_DIR", "./feedback"))
+        _dictionaries = DictionaryStore(
+            Path(os.getenv("STFB_DICT_DIR", feedback_dir / "dictionaries"))
+        )
+    return _dictionaries
+
+
+def training_samples(feedback_log, limit: int = DICT_TRAIN_SAMPLES) -> List[bytes]:
+    """Compact JSON of the newest feedback documents, as v2 writes them"""
+    samples: List[bytes] = []
+    for day in reversed(feedback_log.days()):
+        for _, document in feedback_log.iter_feedback([day]):
+            samples.append(fast_json.dumps(document))
+        if len(samples) >= limit:
+            break
+    return samples[-limit:]
+
+
+__all__ = [
+    "FEEDBACK_MAGIC",
+    "EVENT_MAGIC",
+    "VERSION_1",
+    "VERSION_2",
+    "VERSION_3",
+    "HEADER",
+    "METADATA_HEADER",
+    "FLAGS_OFFSET",
+    "FLAG_PROCESSED",
+    "Metadata",
+    "Record",
+    "DictionaryStore",
+    "ModelRegistry",
+    "feedback_metadata",
+    "compress",
+    "pack_record",
+    "encode_record",
+    "encode_event",
+    "read_record",
+    "unpack_record",
+    "get_dictionaries",
+    "get_model_registry",
+    "training_samples",
+]
+
+
+if __name__ == "__main__":
+    import sys
+
+    from feedback_log import get_feedback_log
+
+    store = get_dictionaries()
+    command = sys.argv[1:2]
+    if zstandard is None:
+        print("❌ zstandard is not installed")
+        sys.exit(1)
+    elif command == ["train"]:
+        samples = training_samples(get_feedback_log())
+        try:
+            dict_id = store.train(samples)
+        except zstandard.ZstdError as e:
+            print(f"❌ Could not train on {len(samples)} samples: {e}")
+            sys.exit(1)
+        store.activate(dict_id)
+        print(f"📚 Trained dictionary {dict_id} on {len(samples)} documents (active)")
+    elif command == ["activate"] and len(sys.argv) == 3:
+        store.activate(int(sys.argv[2]))
+        print(f"📚 Dictionary {sys.argv[2]} is now active")
+    elif command == ["list"]:
+        active = store.active_id()
+        for dict_id in store.ids():
+            print(f"{dict_id}{'  (active)' if dict_id == active else ''}")
+    else:
+        print("Usage: python stfb.py train | activate <dict_id> | list")
+        sys.exit(1)
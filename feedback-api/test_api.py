@@ -8,15 +8,24 @@ import pytest
 from fastapi.testclient import TestClient
 import tempfile
 import os
+import json
 
 # Set test environment
 os.environ["FEEDBACK_DIR"] = tempfile.mkdtemp()
 os.environ["STATS_DIR"] = tempfile.mkdtemp()
 os.environ["CONSENT_DIR"] = tempfile.mkdtemp()
+os.environ["FEEDBACK_STREAM_ENABLED"] = "false"
+os.environ["SHARED_STATE_BACKEND"] = "local"
 
-from main import app
+import auth
+from auth import AGENT_KEYS
+from main import app, tool_usage
+
+# Use the in-memory rate limiter so tests don't need a Redis server
+auth.redis_client = None
 
 client = TestClient(app)
+AUTH_HEADERS = {"X-API-Key": f"admin_001:{AGENT_KEYS['admin_001']['secret']}"}
 
 
 def test_root_endpoint():
@@ -39,6 +48,34 @@ def test_health_check():
     assert data["checks"]["feedback_dir"] is True
 
 
+def test_liveness_and_readiness():
+    """Live is constant time; ready checks storage and index freshness"""
+    assert client.get("/health/live").json() == {"status": "alive"}
+
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "ready"
+    assert data["checks"]["feedback_dir"] is True
+    assert data["checks"]["redis"] is None  # not configured in tests
+
+
+def test_corpus_verifier_repairs_persistent_drift():
+    """The background verifier fixes counter drift once it is seen twice"""
+    import main
+
+    expected = main.verify_corpus()["on_disk"]
+    main.feedback_aggregates.total += 5
+
+    assert main.verify_corpus()["drift"] == {"counter": -5}
+    assert client.get("/health/ready").status_code == 503
+
+    check = main.verify_corpus()
+    assert check["repaired"] == ["counter"]
+    assert main.feedback_aggregates.total == expected
+    assert client.get("/health/ready").status_code == 200
+
+
 def test_submit_feedback():
     """Test submitting feedback"""
     feedback_data = {
@@ -52,7 +89,7 @@ def test_submit_feedback():
         "tags": ["test", "automated"],
     }
 
-    response = client.post("/feedback", json=feedback_data)
+    response = client.post("/feedback", json=feedback_data, headers=AUTH_HEADERS)
     assert response.status_code == 200
     data = response.json()
     assert "feedback_id" in data
@@ -61,6 +98,158 @@ def test_submit_feedback():
     assert data["compression_ratio"] > 0
 
 
+def test_resubmitted_feedback_is_deduplicated():
+    """A retried report (new timestamp, same content) gets the original id"""
+    feedback_data = {
+        "category": "bug",
+        "title": "Retried bug report",
+        "description": "Agents retry when they time out",
+        "ai_model": "claude-3-opus",
+        "smart_tree_version": "3.3.0",
+        "impact_score": 6,
+        "frequency_score": 4,
+    }
+
+    first = client.post("/feedback", json=feedback_data, headers=AUTH_HEADERS).json()
+    retry = client.post(
+        "/feedback",
+        json={**feedback_data, "title": "retried  BUG report"},
+        headers=AUTH_HEADERS,
+    ).json()
+    assert first["duplicate"] is False
+    assert retry["duplicate"] is True
+    assert retry["feedback_id"] == first["feedback_id"]
+
+    health = client.get("/health").json()
+    assert health["dedup"]["hits"] >= 1
+
+
+def test_submit_feedback_when_ingest_is_full(monkeypatch):
+    """A full ingest queue answers 503 with Retry-After instead of queueing"""
+    import main
+
+    monkeypatch.setattr(main.ingest, "max_pending", 0)
+    feedback_data = {
+        "category": "bug",
+        "title": "Submitted while busy",
+        "description": "The ingest queue is full",
+        "ai_model": "claude-3-opus",
+        "smart_tree_version": "3.3.0",
+        "impact_score": 3,
+        "frequency_score": 3,
+    }
+
+    response = client.post("/feedback", json=feedback_data, headers=AUTH_HEADERS)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def batch_item(i: int) -> dict:
+    return {
+        "category": "nice_to_have",
+        "title": f"Batched feedback {i}",
+        "description": "Sent as part of a batch",
+        "ai_model": "gpt-4",
+        "smart_tree_version": "3.3.0",
+        "impact_score": 4,
+        "frequency_score": 2,
+    }
+
+
+def test_submit_feedback_batch():
+    """A JSON array is stored in one go; invalid items are reported per item"""
+    items = [
+        batch_item(0),
+        {"category": "bug", "title": "missing fields"},
+        batch_item(1),
+    ]
+
+    response = client.post("/feedback/batch", json=items, headers=AUTH_HEADERS)
+    assert response.status_code == 207
+    data = response.json()
+    assert data["accepted"] == 2
+    assert data["rejected"] == 1
+    assert [r["status"] for r in data["results"]] == [
+        "accepted",
+        "rejected",
+        "accepted",
+    ]
+    assert "description" in data["results"][1]["error"]
+    assert data["results"][0]["feedback"]["compression_ratio"] > 0
+
+    response = client.post(
+        "/feedback/batch", json={"not": "a list"}, headers=AUTH_HEADERS
+    )
+    assert response.status_code == 400
+
+
+def test_submit_feedback_batch_ndjson():
+    """NDJSON bodies work too; a malformed line only rejects that line"""
+    body = "\n".join(
+        [json.dumps(batch_item(10)), "{not json", json.dumps(batch_item(11))]
+    )
+    response = client.post(
+        "/feedback/batch",
+        content=body,
+        headers={**AUTH_HEADERS, "Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 207
+    data = response.json()
+    assert [r["status"] for r in data["results"]] == [
+        "accepted",
+        "rejected",
+        "accepted",
+    ]
+    assert data["results"][1]["error"].startswith("Invalid JSON")
+
+    response = client.post(
+        "/feedback/batch", json=[batch_item(12)], headers=AUTH_HEADERS
+    )
+    assert response.status_code == 200
+
+
+def test_feedback_batch_counts_against_rate_limit():
+    """Every item of a batch costs one request of the agent's budget, on top
+    of the call itself"""
+    agent = "agent_openrouter_001"  # 50 requests per minute
+    headers = {"X-API-Key": f"{agent}:{AGENT_KEYS[agent]['secret']}"}
+
+    items = [batch_item(100 + i) for i in range(40)]
+    response = client.post("/feedback/batch", json=items, headers=headers)
+    assert response.status_code == 200
+    # 41 of 50 spent: nine more items (ten units) no longer fit
+    response = client.post("/feedback/batch", json=items[:9], headers=headers)
+    assert response.status_code == 429
+
+
+def test_rejected_batch_does_not_use_up_the_budget(monkeypatch):
+    """Items that were never stored are given back to the agent's budget"""
+    import main
+
+    agent = "agent_gpt_001"  # 100 requests per minute
+    headers = {"X-API-Key": f"{agent}:{AGENT_KEYS[agent]['secret']}"}
+    items = [batch_item(200 + i) for i in range(30)]
+
+    def remaining():
+        return auth.RateLimiter.get_remaining(f"agent:{agent}", 100)["remaining"]
+
+    before = remaining()
+    monkeypatch.setattr(main.ingest, "max_pending", 0)
+    response = client.post("/feedback/batch", json=items, headers=headers)
+    assert response.status_code == 503
+    assert remaining() == before - 1  # only the call itself
+
+    monkeypatch.undo()
+    monkeypatch.setattr(main.feedback_log, "append_many", broken_append)
+    response = client.post("/feedback/batch", json=items, headers=headers)
+    assert response.status_code == 500
+    assert remaining() == before - 2
+
+
+def broken_append(*args, **kwargs):
+    raise OSError("disk full")
+
+
 def test_feedback_stats():
     """Test getting feedback statistics"""
     # First submit some feedback
@@ -73,7 +262,7 @@ def test_feedback_stats():
         "impact_score": 5,
         "frequency_score": 3,
     }
-    client.post("/feedback", json=feedback_data)
+    client.post("/feedback", json=feedback_data, headers=AUTH_HEADERS)
 
     # Now get stats
     response = client.get("/feedback/stats")
@@ -82,6 +271,34 @@ def test_feedback_stats():
     assert "total_feedback" in data
     assert "by_category" in data
     assert data["total_feedback"] >= 0
+    assert data["by_category"]["nice_to_have"] >= 1
+    assert data["top_models"]["gpt-4"] >= 1
+
+
+def test_conditional_get():
+    """Polled read endpoints revalidate with ETags until their data changes"""
+    response = client.get("/feedback/stats")
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "public, max-age=15"
+    response = client.get("/feedback/stats", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    feedback_data = {
+        "category": "nice_to_have",
+        "title": "Conditional stats",
+        "description": "New feedback changes the stats ETag",
+        "ai_model": "gpt-4",
+        "smart_tree_version": "3.3.0",
+        "impact_score": 3,
+        "frequency_score": 3,
+    }
+    client.post("/feedback", json=feedback_data, headers=AUTH_HEADERS)
+    response = client.get("/feedback/stats", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+    etag = client.get("/install").headers["etag"]
+    response = client.get("/tree", headers={"If-None-Match": etag})
+    assert response.status_code == 304
 
 
 def test_version_check():
@@ -109,6 +326,83 @@ def test_tool_usage_tracking():
     data = response.json()
     assert data["tool"] == "semantic_search"
 
+    for usage_count in (0, -3):
+        tool_stats["usage_count"] = usage_count
+        assert client.post("/tools/usage", json=tool_stats).status_code == 422
+
+
+def test_tool_usage_batch():
+    """A window of aggregated usage is merged in one request"""
+    batch = {
+        "window_start": "2025-08-06T10:00:00Z",
+        "window_end": "2025-08-06T10:00:05Z",
+        "stats": [
+            {
+                "tool_name": "batch_tool",
+                "model_type": "opus",
+                "usage_count": 40,
+                "success_rate": 1.0,
+            },
+            {
+                "tool_name": "batch_tool",
+                "model_type": "gpt-4",
+                "usage_count": 2,
+                "success_rate": 0.5,
+            },
+            {
+                "tool_name": "other_tool",
+                "model_type": "opus",
+                "usage_count": 1,
+                "success_rate": 1.0,
+            },
+        ],
+    }
+    response = client.post("/tools/usage/batch", json=batch)
+    assert response.status_code == 200
+    assert response.json() == {
+        "message": "Stats recorded",
+        "entries": 3,
+        "events": 43,
+        "tools": 2,
+    }
+
+    tool_usage.sync_if_due()  # the background loop's job when the app runs
+    popular = client.get("/tools/popular?limit=50").json()["tools"]
+    tools = {tool["name"]: tool for tool in popular}
+    assert tools["batch_tool"]["total_uses"] == 42
+    assert tools["batch_tool"]["top_models"] == {"opus": 40, "gpt-4": 2}
+    assert tools["batch_tool"]["last_used"].startswith("2025-08-06T10:00:05")
+
+    assert client.post("/tools/usage/batch", json={"stats": []}).status_code == 400
+    batch["stats"][0]["usage_count"] = 0
+    assert client.post("/tools/usage/batch", json=batch).status_code == 422
+
+
+def test_tool_latency():
+    """Reported execution times come back as quantiles per tool and model"""
+    for calls, latency, success_rate in ((95, 30, 1.0), (5, 500, 0.0)):
+        client.post(
+            "/tools/usage",
+            json={
+                "tool_name": "timed_tool",
+                "model_type": "opus",
+                "usage_count": calls,
+                "success_rate": success_rate,
+                "avg_execution_time_ms": latency,
+            },
+        )
+
+    tool_usage.sync_if_due()
+    response = client.get("/tools/latency?tool=timed_tool&model=opus")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["samples"] == 100
+    assert data["success_ratio"] == 0.95
+    assert abs(data["latency_ms"]["p50"] - 30) <= 0.3
+    assert abs(data["latency_ms"]["p99"] - 500) <= 5
+    assert data["breakdown"][0]["tool"] == "timed_tool"
+    assert "ETag" in response.headers
+
 
 def test_popular_tools():
     """Test getting popular tools"""
@@ -119,6 +413,23 @@ def test_popular_tools():
     assert "total_unique_tools" in data
 
 
+def test_announcement_deactivation():
+    """A deactivated announcement drops out of the listing"""
+    announcement = {
+        "id": "maintenance",
+        "title": "Maintenance window",
+        "message": "Back soon",
+        "priority": "important",
+    }
+    assert client.post("/announcements", json=announcement).status_code == 200
+    listed = [a["id"] for a in client.get("/announcements").json()["announcements"]]
+    assert "maintenance" in listed
+
+    assert client.delete("/announcements/maintenance").status_code == 200
+    listed = [a["id"] for a in client.get("/announcements").json()["announcements"]]
+    assert "maintenance" not in listed
+
+
 def test_consent_management():
     """Test consent preference management"""
     consent_data = {
@@ -155,6 +466,60 @@ def test_update_decision_tracking():
     assert "next_steps" in data
 
 
+def test_update_decision_summary():
+    """Decisions are summarized per version pair and model from the counts"""
+    for user_decision in ("update", "update", "skip"):
+        client.post(
+            "/version/notify-update",
+            json={
+                "current_version": "3.1.0",
+                "latest_version": "3.3.0",
+                "user_decision": user_decision,
+                "ai_model": "gpt-4",
+            },
+        )
+
+    response = client.get(
+        "/version/decisions/summary", params={"current_version": "3.1.0"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 3
+    assert data["decisions"] == {"update": 2, "skip": 1}
+    assert data["update_rate"] == 0.6667
+    assert data["by_version"][0]["latest_version"] == "3.3.0"
+    assert data["by_model"]["gpt-4"]["total"] == 3
+
+    etag = response.headers["ETag"]
+    cached = client.get(
+        "/version/decisions/summary",
+        params={"current_version": "3.1.0"},
+        headers={"If-None-Match": etag},
+    )
+    assert cached.status_code == 304
+
+
+def test_stats_timeseries():
+    """Submissions show up in the current minute/hour/day buckets"""
+    response = client.get("/stats/timeseries", params={"resolution": "minute"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["bucket_seconds"] == 60
+    assert data["points"][-1]["total"] >= 1
+    assert data["points"][-1]["by_agent"].get("admin_001", 0) >= 1
+
+    day = client.get("/stats/timeseries", params={"resolution": "day"}).json()
+    assert sum(point["total"] for point in day["points"]) >= data["points"][-1]["total"]
+
+    response = client.get(
+        "/stats/timeseries",
+        params={"from": "2025-08-07T00:00:00Z", "to": "2025-08-06T00:00:00Z"},
+    )
+    assert response.status_code == 400
+    response = client.get("/stats/timeseries", params={"resolution": "week"})
+    assert response.status_code == 422
+
+
 def test_model_activity_stats():
     """Test getting model activity statistics"""
     response = client.get("/stats/model-activity")
@@ -185,6 +550,30 @@ def test_pending_feedback():
     assert isinstance(data, list)
 
 
+def test_pending_feedback_cursor_pages():
+    """Following X-Next-Cursor walks every pending item exactly once"""
+    everything = [
+        item["id"] for item in client.get("/feedback/pending?limit=100").json()
+    ]
+    assert len(everything) >= 3
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/feedback/pending", params=params)
+        seen += [item["id"] for item in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == everything
+
+    assert client.get("/feedback/pending?cursor=bogus").status_code == 400
+
+    # Pages are capped, whatever limit is asked for
+    big = client.get("/feedback/pending?limit=1000")
+    assert len(big.json()) == min(len(everything), 100)
+
+
 def test_mark_feedback_processed():
     """Test marking feedback as processed"""
     # First submit feedback
@@ -198,7 +587,7 @@ def test_mark_feedback_processed():
         "frequency_score": 5,
     }
 
-    response = client.post("/feedback", json=feedback_data)
+    response = client.post("/feedback", json=feedback_data, headers=AUTH_HEADERS)
     feedback_id = response.json()["feedback_id"]
 
     # Mark as processed
@@ -207,6 +596,91 @@ def test_mark_feedback_processed():
     assert response.status_code in [200, 404]
 
 
+def test_claim_ack_nack():
+    """Workers lease pending feedback, then ack or nack it by token"""
+    response = client.post("/feedback/claim", json={"worker": "w1", "limit": 2})
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert len(items) == 2
+    assert items[0]["feedback"]["id"] == items[0]["id"]
+
+    # Another replica gets different items
+    other = client.post("/feedback/claim", json={"worker": "w2", "limit": 2}).json()
+    assert not {item["id"] for item in other["items"]} & {item["id"] for item in items}
+
+    first, second = items
+    response = client.post(
+        f"/feedback/{first['id']}/ack", json={"lease_token": first["lease_token"]}
+    )
+    assert response.status_code == 200
+    pending_ids = [
+        item["id"] for item in client.get("/feedback/pending?limit=100").json()
+    ]
+    assert first["id"] not in pending_ids
+
+    response = client.post(
+        f"/feedback/{second['id']}/nack", json={"lease_token": second["lease_token"]}
+    )
+    assert response.status_code == 200
+    response = client.post(
+        f"/feedback/{second['id']}/ack", json={"lease_token": second["lease_token"]}
+    )
+    assert response.status_code == 409
+
+
+def test_search_feedback():
+    """Search finds feedback by its words, with snippets and cursors"""
+    response = client.get("/feedback/search", params={"q": "retried bug"})
+    assert response.status_code == 200
+    data = response.json()
+    assert [result["title"] for result in data["results"]] == ["Retried bug report"]
+    assert "**" in data["results"][0]["snippet"]
+
+    response = client.get("/feedback/search", params={"q": "batched", "limit": 2})
+    page = response.json()
+    assert len(page["results"]) == 2 and page["next_cursor"]
+    response = client.get(
+        "/feedback/search",
+        params={"q": "batched", "limit": 2, "cursor": page["next_cursor"]},
+    )
+    next_ids = {result["id"] for result in response.json()["results"]}
+    assert not next_ids & {result["id"] for result in page["results"]}
+
+    assert client.get("/feedback/search", params={"q": "  "}).status_code == 400
+
+
+def test_similar_feedback():
+    """Reworded reports are hinted at submit time and listed as similar"""
+    description = (
+        "quick_tree crashes with a panic when a symlink loop points back at "
+        "the repository root and the depth limit is not set"
+    )
+    feedback_data = {
+        "category": "bug",
+        "title": "Symlink loop panic",
+        "description": description,
+        "ai_model": "gpt-4",
+        "smart_tree_version": "3.3.0",
+        "impact_score": 8,
+        "frequency_score": 3,
+    }
+    first = client.post("/feedback", json=feedback_data, headers=AUTH_HEADERS).json()
+    assert first["similar_to"] == []
+    second = client.post(
+        "/feedback",
+        json={**feedback_data, "description": description + " at all"},
+        headers=AUTH_HEADERS,
+    ).json()
+    assert second["similar_to"] == [first["feedback_id"]]
+
+    response = client.get(f"/feedback/{first['feedback_id']}/similar")
+    assert response.status_code == 200
+    similar = response.json()["similar"]
+    assert [item["id"] for item in similar] == [second["feedback_id"]]
+    assert similar[0]["title"] == "Symlink loop panic"
+    assert client.get("/feedback/nope/similar").status_code == 404
+
+
 def test_requested_tools():
     """Test getting requested tools"""
     response = client.get("/tools/requested")
@@ -216,6 +690,30 @@ def test_requested_tools():
     assert "requests" in data
 
 
+def test_export_feedback():
+    """Export streams NDJSON with resumable cursors (gzip optional)"""
+    response = client.get("/feedback/export", headers=AUTH_HEADERS)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) >= 2
+
+    response = client.get(
+        "/feedback/export",
+        params={"cursor": lines[0]["_cursor"], "gzip": "true"},
+        headers=AUTH_HEADERS,
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    resumed = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["id"] for line in resumed] == [line["id"] for line in lines[1:]]
+
+    assert client.get("/feedback/export").status_code == 401
+    response = client.get(
+        "/feedback/export", params={"cursor": "bogus"}, headers=AUTH_HEADERS
+    )
+    assert response.status_code == 400
+
+
 # Cleanup
 def test_cleanup():
     """Clean up test directories"""
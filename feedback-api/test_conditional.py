@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Tests for conditional GET support
+"""
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from conditional import Generations, conditional, generations
+
+app = FastAPI()
+calls = []
+
+
+@app.get(
+    "/things",
+    dependencies=[Depends(conditional("things", cache_control="public, max-age=5"))],
+)
+async def things():
+    calls.append(1)
+    return {"things": len(calls)}
+
+
+client = TestClient(app)
+
+
+def test_etag_tracks_generations():
+    counters = Generations()
+    tag = counters.etag(["a", "b"])
+    assert counters.etag(["a", "b"]) == tag
+    counters.bump("b")
+    assert counters.etag(["a", "b"]) != tag
+    assert counters.etag(["a"]) == counters.etag(["a"])
+    assert counters.etag(["a"], "2025-08-06") != counters.etag(["a"], "2025-08-07")
+    assert tag.startswith('"') and tag.endswith('"')
+
+
+def test_if_none_match_skips_the_handler():
+    """A current ETag gets an empty 304 and the handler never runs"""
+    response = client.get("/things")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, max-age=5"
+    etag = response.headers["etag"]
+    handled = len(calls)
+
+    response = client.get("/things", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    assert len(calls) == handled
+
+    # Weak comparison and lists of tags are accepted
+    response = client.get("/things", headers={"If-None-Match": f'"x", W/{etag}'})
+    assert response.status_code == 304
+
+    generations.bump("things")
+    response = client.get("/things", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_if_modified_since():
+    last_modified = client.get("/things").headers["last-modified"]
+    response = client.get("/things", headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+    response = client.get(
+        "/things", headers={"If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"}
+    )
+    assert response.status_code == 200
+    response = client.get("/things", headers={"If-Modified-Since": "yesterday"})
+    assert response.status_code == 200
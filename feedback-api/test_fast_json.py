@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Tests for the fast JSON layer
+"""
+
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import fast_json
+
+
+def test_round_trip_is_compact_utf8():
+    document = {"title": "Émoji 🌲 output", "tags": ["a", "b"], "score": 7}
+    data = fast_json.dumps(document)
+    expected = json.dumps(document, separators=(",", ":"), ensure_ascii=False)
+    assert data == expected.encode()
+    assert fast_json.loads(data) == document
+
+
+def test_unknown_types_become_strings():
+    moment = datetime(2025, 8, 6, tzinfo=timezone.utc)
+    at = fast_json.loads(fast_json.dumps({"at": moment}))["at"]
+    assert at.startswith("2025-08-06")
+    assert fast_json.loads(fast_json.dumps({1: "x"})) == {"1": "x"}
+
+
+def test_malformed_input_raises_value_error():
+    with pytest.raises(ValueError):
+        fast_json.loads(b"{not json")
+
+
+def test_json_array_splices_encoded_values():
+    items = [fast_json.dumps({"id": "a"}), fast_json.dumps({"id": "b"})]
+    assert fast_json.loads(fast_json.json_array(items)) == [{"id": "a"}, {"id": "b"}]
+    assert fast_json.json_array([]) == b"[]"
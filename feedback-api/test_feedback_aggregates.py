@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Tests for the incrementally maintained feedback aggregates
+"""
+
+from feedback_aggregates import FeedbackAggregates
+from feedback_index import FeedbackIndex, index_row
+from feedback_log import RecordLocation
+
+
+def make_row(feedback_id: str, category: str = "bug", model: str = "gpt-4"):
+    document = {
+        "id": feedback_id,
+        "category": category,
+        "title": "t",
+        "description": "d",
+        "ai_model": model,
+        "smart_tree_version": "3.3.5",
+        "timestamp": "2025-08-06T10:00:00Z",
+        "impact_score": 6,
+        "frequency_score": 2,
+    }
+    return index_row(document, RecordLocation("2025-08-06/segment-000001.log", 0))
+
+
+def test_counters_update_on_add(tmp_path):
+    """Each add bumps totals and every breakdown"""
+    aggregates = FeedbackAggregates(tmp_path / "aggregates.json")
+    aggregates.add("2025-08-06", "bug", "gpt-4", 8, 300, 100)
+    aggregates.add("2025-08-06", "critical", "gpt-4", 4)
+
+    snapshot = aggregates.snapshot()
+    assert snapshot["total"] == 2
+    assert snapshot["total_impact"] == 12
+    assert snapshot["by_date"] == {"2025-08-06": 2}
+    assert snapshot["by_model"]["gpt-4"]["categories"] == {"bug": 1, "critical": 1}
+    assert snapshot["original_size"] == 300
+
+
+def test_checkpoint_round_trip(tmp_path):
+    """Counters survive a checkpoint and reload"""
+    path = tmp_path / "aggregates.json"
+    aggregates = FeedbackAggregates(path, checkpoint_every=0)
+    aggregates.add("2025-08-06", "bug", "claude-3-opus", 9)
+    aggregates.checkpoint()
+
+    restored = FeedbackAggregates(path)
+    assert restored.load()
+    assert restored.snapshot() == aggregates.snapshot()
+
+
+def test_stale_checkpoint_is_rebuilt(tmp_path):
+    """A checkpoint that disagrees with the index is replaced by a rebuild"""
+    index = FeedbackIndex(tmp_path / "index.sqlite3")
+    index.add_many([make_row("a"), make_row("b", "critical", "claude-3-opus")])
+
+    aggregates = FeedbackAggregates(tmp_path / "aggregates.json")
+    aggregates.add("2025-08-06", "bug", "gpt-4", 6)
+    aggregates.checkpoint()  # only one of the two items made it
+
+    restored = FeedbackAggregates(tmp_path / "aggregates.json")
+    assert restored.ensure_consistent(index)
+    assert restored.snapshot()["total"] == 2
+    assert restored.snapshot()["by_category"] == {"bug": 1, "critical": 1}
+    assert not FeedbackAggregates(tmp_path / "aggregates.json").ensure_consistent(index)
+    index.close()
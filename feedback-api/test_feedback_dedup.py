@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Tests for ingest-time duplicate suppression
+"""
+
+from feedback_dedup import BloomFilter, FeedbackDedup, fingerprint
+
+
+def document(title: str = "Search misses hidden files", **extra) -> dict:
+    return {
+        "id": "ignored",
+        "category": "bug",
+        "title": title,
+        "description": "st --search skips dotfiles",
+        "timestamp": "2025-08-06T10:00:00Z",
+        **extra,
+    }
+
+
+def test_fingerprint_normalizes_content():
+    """Case, whitespace, id and timestamp don't change the fingerprint"""
+    base = fingerprint(document())
+    assert fingerprint(document("  search MISSES   hidden files ")) == base
+    assert fingerprint(document(id="other", timestamp="2025-08-07T00:00:00Z")) == base
+    assert fingerprint(document("Search misses symlinks")) != base
+    assert fingerprint(document(category="critical")) != base
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(1000, 0.01)
+    values = [fingerprint(document(f"title {i}")) for i in range(1000)]
+    for value in values[:500]:
+        bloom.add(value)
+    assert all(value in bloom for value in values[:500])
+    assert sum(value in bloom for value in values[500:]) < 25
+
+
+def test_claim_returns_existing_id(tmp_path):
+    """The first claim owns the fingerprint; repeats get its id"""
+    dedup = FeedbackDedup(tmp_path / "dedup.sqlite3")
+    value = fingerprint(document())
+    assert dedup.claim(value, "first", "2025-08-06") is None
+    assert dedup.claim(value, "second", "2025-08-07", size=120) == "first"
+    assert dedup.stats()["hits"] == 1
+    assert dedup.stats()["misses"] == 1
+    assert dedup.stats()["duplicate_bytes"] == 120
+    dedup.close()
+
+    # The exact store survives restarts and refills the filters
+    dedup = FeedbackDedup(tmp_path / "dedup.sqlite3")
+    assert dedup.claim(value, "third", "2025-08-08") == "first"
+    dedup.close()
+
+
+def test_window_expiry_and_release(tmp_path):
+    """Fingerprints age out with their day; released claims are forgotten"""
+    dedup = FeedbackDedup(tmp_path / "dedup.sqlite3", window_days=2)
+    value = fingerprint(document())
+    assert dedup.claim(value, "first", "2025-08-06") is None
+    assert dedup.claim(value, "second", "2025-08-07") == "first"
+    assert dedup.claim(value, "third", "2025-08-08") is None
+
+    other = fingerprint(document("Another report"))
+    assert dedup.claim(other, "fourth", "2025-08-08") is None
+    dedup.release([other])
+    assert dedup.claim(other, "fifth", "2025-08-08") is None
+    assert dedup.stats()["false_positives"] == 1  # bits stay, the row is gone
+    dedup.close()
+
+
+def test_owner_lost_in_a_crash_is_taken_over(tmp_path):
+    """A claim whose feedback never reached the log doesn't swallow repeats"""
+    dedup = FeedbackDedup(tmp_path / "dedup.sqlite3")
+    value = fingerprint(document())
+    stored = set().__contains__
+    assert dedup.claim(value, "first", "2025-08-06", stored=stored) is None
+    # In flight: not stored yet, but this process still owns it
+    assert dedup.claim(value, "second", "2025-08-06", stored=stored) == "first"
+    dedup.close()
+
+    # Crash before the write: the next process finds no such feedback
+    dedup = FeedbackDedup(tmp_path / "dedup.sqlite3")
+    assert dedup.claim(value, "third", "2025-08-06", stored=set().__contains__) is None
+    assert dedup.stats()["dangling"] == 1
+    dedup.confirm([value])
+    stored = {"third"}.__contains__
+    assert dedup.claim(value, "fourth", "2025-08-06", stored=stored) == "third"
+    dedup.close()
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Tests for the SQLite feedback metadata index
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import stfb
+from feedback_index import (
+    COLUMNS,
+    FeedbackIndex,
+    decode_pending_cursor,
+    encode_pending_cursor,
+    index_row,
+    search_query,
+)
+from feedback_log import FeedbackLog, RecordLocation, acquire_writer_lock
+from stfb import (
+    FEEDBACK_MAGIC,
+    ModelRegistry,
+    compress,
+    encode_record,
+    feedback_metadata,
+    pack_record,
+)
+
+
+def make_document(feedback_id: str, **overrides) -> dict:
+    document = {
+        "id": feedback_id,
+        "category": "bug",
+        "title": f"Feedback {feedback_id}",
+        "description": "Something broke",
+        "ai_model": "claude-3-opus",
+        "smart_tree_version": "3.3.5",
+        "timestamp": f"2025-08-06T10:00:0{feedback_id[-1]}Z",
+        "impact_score": 7,
+        "frequency_score": 4,
+        "tags": ["test"],
+    }
+    document.update(overrides)
+    return document
+
+
+@pytest.fixture
+def index(tmp_path):
+    feedback_index = FeedbackIndex(tmp_path / "index.sqlite3")
+    yield feedback_index
+    feedback_index.close()
+
+
+def test_grouped_counts(index):
+    """Counts by category, model and day come from indexed queries"""
+    location = RecordLocation("2025-08-06/segment-000001.log", 0)
+    index.add_many(
+        [
+            index_row(make_document("a1"), location, 100, 50),
+            index_row(make_document("a2", category="critical"), location, 100, 50),
+            index_row(make_document("a3", ai_model="gpt-4"), location),
+        ]
+    )
+
+    assert index.count() == 3
+    assert index.count(category="critical") == 1
+    assert index.count_by("category") == {"bug": 2, "critical": 1}
+    assert index.count_by("ai_model") == {"claude-3-opus": 2, "gpt-4": 1}
+    assert index.count_by("day") == {"2025-08-06": 3}
+    assert index.compression_totals() == (200, 100)
+
+
+def test_pending_excludes_processed(index):
+    """Processed items drop out of the pending listing"""
+    location = RecordLocation("2025-08-06/segment-000001.log", 0)
+    index.add_many([index_row(make_document(f"b{i}"), location) for i in range(3)])
+
+    assert index.mark_processed("b1")
+    assert not index.mark_processed("missing")
+    assert [row["id"] for row in index.pending(10)] == ["b0", "b2"]
+
+
+def test_pending_keyset_pages(index):
+    """Cursor pages follow (day, id) order; later arrivals don't shift pages"""
+    location = RecordLocation("2025-08-06/segment-000001.log", 0)
+    index.add_many([index_row(make_document(f"k{i}"), location) for i in (1, 3, 5)])
+
+    page = index.pending(2)
+    assert [row["id"] for row in page] == ["k1", "k3"]
+    after = (page[-1]["day"], page[-1]["id"])
+
+    # Arrivals before the cursor wait for the next pass, after it show up now
+    index.add_many([index_row(make_document(f"k{i}"), location) for i in (0, 4)])
+    assert [row["id"] for row in index.pending(2, after=after)] == ["k4", "k5"]
+
+
+def test_pending_cursor_round_trip():
+    cursor = encode_pending_cursor("2025-08-06", "ab:cd")
+    assert decode_pending_cursor(cursor) == ("2025-08-06", "ab:cd")
+    with pytest.raises(ValueError):
+        decode_pending_cursor("bogus")
+
+
+def test_claim_leases_items_exclusively(index):
+    """Claimed items are hidden from other claims until acked or expired"""
+    location = RecordLocation("2025-08-06/segment-000001.log", 0)
+    index.add_many([index_row(make_document(f"l{i}"), location) for i in range(3)])
+
+    first = index.claim("w1", 2, lease_seconds=60, now=1000)
+    assert [lease["id"] for lease in first] == ["l0", "l1"]
+    assert [lease["id"] for lease in index.claim("w2", 5, 60, now=1001)] == ["l2"]
+    assert index.claim("w3", 5, 60, now=1002) == []
+
+    # Ack finishes l0; a stale token is refused
+    assert index.ack("l0", first[0]["lease_token"])
+    assert not index.ack("l1", "stale-token")
+    assert [row["id"] for row in index.pending(10)] == ["l1", "l2"]
+
+    # l1's lease runs out and it is re-delivered; the old holder lost it
+    again = index.claim("w3", 5, 60, now=1060)
+    assert [(lease["id"], lease["deliveries"]) for lease in again] == [("l1", 2)]
+    assert not index.ack("l1", first[1]["lease_token"])
+    assert index.lease_stats(now=1060) == {"active": 2, "expired": 0}
+
+
+def test_nack_redelivers_after_delay(index):
+    location = RecordLocation("2025-08-06/segment-000001.log", 0)
+    index.add(index_row(make_document("n1"), location))
+
+    lease = index.claim("w1", 1, 300, now=1000)[0]
+    assert index.release("n1", lease["lease_token"], retry_after=30, now=1010)
+    assert index.claim("w2", 1, 300, now=1020) == []
+    assert [lease["id"] for lease in index.claim("w2", 1, 300, now=1041)] == ["n1"]
+    assert not index.release("n1", lease["lease_token"])
+
+
+def search_ids(index, text, **kwargs):
+    return [row["id"] for row in index.search(search_query(text), **kwargs)]
+
+
+def test_full_text_search(index):
+    """BM25 ranks title hits first; filters and cursors narrow and page"""
+    location = RecordLocation("2025-08-06/segment-000001.log", 0)
+    index.add_many(
+        [
+            index_row(
+                make_document(
+                    "s1",
+                    title="search_in_files timeout",
+                    description="Large repos make the tool time out",
+                ),
+                location,
+            ),
+            index_row(
+                make_document(
+                    "s2",
+                    description="search_in_files hits a timeout",
+                    category="critical",
+                ),
+                location,
+            ),
+            index_row(make_document("s3", tags=["timeouts"]), location),
+            index_row(make_document("s4", proposed_solution="cache it"), location),
+        ]
+    )
+
+    assert search_ids(index, "search_in_files timeout") == ["s1", "s2"]
+    assert search_ids(index, "TIMEOUT") == ["s1", "s3", "s2"]  # stemmed, weighted
+    assert search_ids(index, "timeout", category="critical") == ["s2"]
+    assert search_ids(index, "cach*") == ["s4"]
+
+    first = index.search(search_query("timeout"), limit=2)
+    after = (first[-1]["score"], first[-1]["search_rowid"])
+    snapshot = first[-1]["snapshot"]
+    assert search_ids(index, "timeout", after=after, snapshot=snapshot) == ["s2"]
+
+    # Re-indexing a row replaces its text instead of duplicating it
+    index.add(index_row(make_document("s1", title="Renamed"), location))
+    assert search_ids(index, "timeout", processed=False) == ["s3", "s2"]
+    assert search_ids(index, "renamed") == ["s1"]
+
+    # Feedback added between pages stays out of the later ones
+    first = index.search(search_query("timeout"), limit=1)
+    after = (first[-1]["score"], first[-1]["search_rowid"])
+    snapshot = first[-1]["snapshot"]
+    index.add(index_row(make_document("s5", tags=["timeouts"]), location))
+    assert "s5" in search_ids(index, "timeout", after=after)
+    assert "s5" not in search_ids(index, "timeout", after=after, snapshot=snapshot)
+
+
+def test_search_catches_up_after_upgrade(tmp_path, index):
+    """An index that predates search gets its text filled from the log"""
+    log = FeedbackLog(tmp_path / "feedback")
+    data = json.dumps(make_document("u1", title="Quantum tree")).encode()
+    frame = pack_record(FEEDBACK_MAGIC, len(data), compress(data))
+    location = log.append(frame, "2025-08-06")
+    # Rows written before search existed carried no text fields
+    index.add(index_row(make_document("u1"), location)[: len(COLUMNS)])
+
+    assert search_ids(index, "quantum") == []
+    assert index.catch_up_search(log) == 1
+    assert search_ids(index, "quantum") == ["u1"]
+    assert index.catch_up_search(log) == 0
+    log.close()
+
+
+def test_rebuild_from_log(tmp_path, index):
+    """The index can be rebuilt from the log, including processed events"""
+    log = FeedbackLog(tmp_path / "feedback")
+    for feedback_id in ("c1", "c2"):
+        data = json.dumps(make_document(feedback_id)).encode()
+        log.append(pack_record(FEEDBACK_MAGIC, len(data), compress(data)), "2025-08-06")
+    log.append_event({"event": "processed", "id": "c1"}, "2025-08-06")
+    log.close()
+
+    assert index.rebuild(log) == 2
+    assert [row["id"] for row in index.pending(10)] == ["c2"]
+    assert index.recent(1)[0]["id"] == "c2"
+
+
+def test_rebuild_reads_processed_flag_from_header(tmp_path, monkeypatch, index):
+    """v3 records flagged in place come back processed without any event"""
+    monkeypatch.setattr(
+        stfb, "_model_registry", ModelRegistry(tmp_path / "models.json")
+    )
+    log = FeedbackLog(tmp_path / "feedback")
+    locations = []
+    for feedback_id in ("f1", "f2"):
+        document = make_document(feedback_id)
+        frame, _ = encode_record(
+            FEEDBACK_MAGIC, json.dumps(document).encode(), feedback_metadata(document)
+        )
+        locations.append(log.append(frame, "2025-08-06"))
+    assert log.mark_processed(locations[0])
+    log.close()
+
+    assert index.rebuild(log) == 2
+    assert [row["id"] for row in index.pending(10)] == ["f2"]
+
+
+def test_locations_survive_reopen(tmp_path):
+    """The id -> location map is reloaded from disk at startup"""
+    location = RecordLocation("2025-08-06/segment-000001.log", 128)
+    index = FeedbackIndex(tmp_path / "index.sqlite3")
+    index.add(index_row(make_document("d1"), location))
+    index.close()
+
+    index = FeedbackIndex(tmp_path / "index.sqlite3")
+    assert index.locate("d1") == location
+    assert index.locate("missing") is None
+    assert index.resolve_prefix("d") == "d1"
+    index.close()
+
+
+def test_catch_up_after_crash(tmp_path, index):
+    """Records appended but never indexed are picked up from the log"""
+    log = FeedbackLog(tmp_path / "feedback")
+    locations = []
+    for feedback_id in ("e1", "e2", "e3"):
+        data = json.dumps(make_document(feedback_id)).encode()
+        locations.append(
+            log.append(
+                pack_record(FEEDBACK_MAGIC, len(data), compress(data)), "2025-08-06"
+            )
+        )
+    log.append_event(
+        {"event": "dispatch", "feedback_id": "e3", "status": "pending"}, "2025-08-06"
+    )
+    log.close()
+
+    # Simulate a crash after the first record made it into the index
+    index.add(index_row(make_document("e1"), locations[0]))
+
+    assert index.catch_up(log) == 2
+    assert index.locate("e3") == locations[2]
+    assert index.get_dispatch("e3")["status"] == "pending"
+
+
+def test_relocate_after_compaction(tmp_path, index):
+    """Compaction repoints rows and the in-memory map at the pack"""
+    log = FeedbackLog(tmp_path / "feedback", max_segment_bytes=300)
+    for feedback_id in ("g1", "g2", "g3"):
+        data = json.dumps(make_document(feedback_id)).encode()
+        log.append(pack_record(FEEDBACK_MAGIC, len(data), compress(data)), "2025-08-06")
+    index.rebuild(log)
+
+    assert log.compact("2025-08-06", index.relocate)
+    for feedback_id in ("g1", "g2", "g3"):
+        location = index.locate(feedback_id)
+        assert location.segment.endswith(".stpk")
+        assert log.read(location).document()["id"] == feedback_id
+    assert index.get("g3")["segment"] == index.locate("g3").segment
+    assert index.catch_up(log) == 0
+    log.close()
+
+
+@pytest.mark.parametrize("command", ["compact", "rebuild"])
+def test_cli_refuses_to_run_beside_the_api(tmp_path, command):
+    """compact and rebuild need the writer lock a running API holds"""
+    acquire_writer_lock(tmp_path)
+    result = subprocess.run(
+        [sys.executable, str(Path(__file__).parent / "feedback_index.py"), command],
+        env={**os.environ, "FEEDBACK_DIR": str(tmp_path)},
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 1
+    assert "stop the API first" in result.stderr
+    assert not (tmp_path / "index.sqlite3").exists()
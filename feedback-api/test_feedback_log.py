@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Tests for the segmented append-only feedback log
+"""
+
+import json
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import stfb
+from feedback_log import (
+    FeedbackLog,
+    RecordLocation,
+    WriterLockError,
+    acquire_writer_lock,
+)
+from stfb import (
+    FEEDBACK_MAGIC,
+    ModelRegistry,
+    compress,
+    encode_record,
+    feedback_metadata,
+    pack_record,
+)
+
+
+def make_frame(document: dict) -> bytes:
+    data = json.dumps(document).encode()
+    return pack_record(FEEDBACK_MAGIC, len(data), compress(data))
+
+
+@pytest.fixture
+def log(tmp_path):
+    feedback_log = FeedbackLog(tmp_path, fsync_batch=4)
+    yield feedback_log
+    feedback_log.close()
+
+
+def test_append_and_read_back(log):
+    """Records can be read back by location and iterated in order"""
+    first = log.append(make_frame({"id": "a", "title": "first"}), "2025-08-06")
+    second = log.append(make_frame({"id": "b", "title": "second"}), "2025-08-06")
+
+    assert first == RecordLocation("2025-08-06/segment-000001.log", 0)
+    assert second.offset > first.offset
+    assert log.read(second).document()["title"] == "second"
+    assert [doc["id"] for _, doc in log.iter_feedback()] == ["a", "b"]
+
+
+def test_rotates_by_size_and_day(tmp_path):
+    """A full segment rotates to the next one, and each day gets its own directory"""
+    log = FeedbackLog(tmp_path, max_segment_bytes=200)
+    frame = make_frame({"id": "x", "description": "y" * 50})
+
+    locations = [log.append(frame, "2025-08-06") for _ in range(4)]
+    locations.append(log.append(frame, "2025-08-07"))
+    log.close()
+
+    segments = {location.segment for location in locations}
+    assert "2025-08-06/segment-000002.log" in segments
+    assert locations[-1].segment == "2025-08-07/segment-000001.log"
+    assert len(list(log.iter_records())) == 5
+
+
+def test_events_are_kept_apart_from_feedback(log):
+    """State events share the log but never show up as feedback"""
+    log.append(make_frame({"id": "a"}), "2025-08-06")
+    log.append_event({"event": "processed", "id": "a"}, "2025-08-06")
+
+    assert [doc["id"] for _, doc in log.iter_feedback()] == ["a"]
+    assert list(log.iter_events()) == [{"event": "processed", "id": "a"}]
+
+
+def test_torn_tail_is_dropped_on_reopen(tmp_path):
+    """A partially written frame from a crash is truncated before appending"""
+    log = FeedbackLog(tmp_path)
+    log.append(make_frame({"id": "a"}), "2025-08-06")
+    log.close()
+
+    segment = tmp_path / "2025-08-06" / "segment-000001.log"
+    with open(segment, "ab") as f:
+        f.write(make_frame({"id": "torn"})[:10])
+
+    log = FeedbackLog(tmp_path)
+    log.append(make_frame({"id": "b"}), "2025-08-06")
+    log.close()
+
+    assert [doc["id"] for _, doc in log.iter_feedback()] == ["a", "b"]
+
+
+def test_processed_flag_is_set_in_place(tmp_path, monkeypatch, log):
+    """v3 records get their header flag flipped; older records are refused"""
+    monkeypatch.setattr(
+        stfb, "_model_registry", ModelRegistry(tmp_path / "models.json")
+    )
+    document = {
+        "id": "abc",
+        "category": "critical",
+        "ai_model": "gpt-4",
+        "timestamp": "2025-08-06T10:00:00Z",
+        "impact_score": 9,
+        "frequency_score": 2,
+    }
+    frame, _ = encode_record(
+        FEEDBACK_MAGIC, json.dumps(document).encode(), feedback_metadata(document)
+    )
+    v3 = log.append(frame, "2025-08-06")
+    v1 = log.append(make_frame({"id": "old"}), "2025-08-06")
+
+    assert log.mark_processed(v3)
+    assert not log.mark_processed(v1)
+    assert log.read(v3).metadata.processed
+    assert log.read(v3).document() == document
+
+
+def test_summaries_round_trip(log):
+    """Summary entries are appended to one text file per day"""
+    log.append_summary("2025-08-06", "ID: a\nCategory: bug\n")
+    log.append_summary("2025-08-07", "ID: b\nCategory: critical\n")
+
+    assert [day for day, _ in log.iter_summaries()] == ["2025-08-06", "2025-08-07"]
+    assert next(log.iter_summaries(newest_first=True))[1].startswith("ID: b")
+
+
+def test_migrate_legacy_files(tmp_path):
+    """Loose <id>.stfb files and their sidecars are folded into the log"""
+    day_dir = tmp_path / "2025-08-01"
+    day_dir.mkdir()
+    (day_dir / "abc123.stfb").write_bytes(make_frame({"title": "old"}))
+    (day_dir / "abc123.summary.txt").write_text("ID: abc123\nCategory: bug\n")
+    (day_dir / "abc123.processed").touch()
+
+    log = FeedbackLog(tmp_path)
+    assert log.migrate_legacy() == 1
+
+    assert [doc["id"] for _, doc in log.iter_feedback()] == ["abc123"]
+    assert list(log.iter_events()) == [{"event": "processed", "id": "abc123"}]
+    assert len(list(log.iter_summaries())) == 1
+    assert not list(day_dir.glob("abc123.*"))
+
+
+def test_compaction_packs_a_closed_day(tmp_path):
+    """Segments fold into one mmap-read pack; locations move by a base offset"""
+    log = FeedbackLog(tmp_path, max_segment_bytes=200)
+    frame = make_frame({"id": "x", "description": "y" * 50})
+    locations = [log.append(frame, "2025-08-06") for _ in range(4)]
+    log.append_event({"event": "processed", "id": "x"}, "2025-08-06")
+    log.append(make_frame({"id": "today"}), "2025-08-07")
+
+    moves = {}
+    assert log.compact_closed("2025-08-07", moves.update) == 1
+    assert not log.compact("2025-08-06")  # nothing left to pack
+
+    day_dir = tmp_path / "2025-08-06"
+    assert [p.suffix for p in day_dir.iterdir()] == [".stpk"]
+    new_segment, base = moves[locations[-1].segment]
+    packed = RecordLocation(new_segment, base + locations[-1].offset)
+    record = log.read(packed)
+    assert isinstance(record.payload, memoryview)
+    assert record.document()["id"] == "x"
+
+    assert [doc["id"] for _, doc in log.iter_feedback()] == ["x"] * 4 + ["today"]
+    assert list(log.iter_events()) == [{"event": "processed", "id": "x"}]
+    assert list(log.iter_records(start=packed))[0][0] == packed
+    log.close()
+
+
+def test_late_writes_to_a_packed_day_coexist(tmp_path):
+    """Segments appended after packing are numbered past the pack and merged next time"""
+    log = FeedbackLog(tmp_path)
+    log.append(make_frame({"id": "a"}), "2025-08-06")
+    log.compact("2025-08-06")
+
+    late = log.append(make_frame({"id": "b"}), "2025-08-06")
+    assert late.segment == "2025-08-06/segment-000002.log"
+    assert [doc["id"] for _, doc in log.iter_feedback()] == ["a", "b"]
+
+    assert log.compact("2025-08-06")
+    assert [p.name for p in (tmp_path / "2025-08-06").iterdir()] == ["pack-000002.stpk"]
+    assert [doc["id"] for _, doc in log.iter_feedback()] == ["a", "b"]
+    log.close()
+
+
+def test_writes_during_compaction_are_not_lost(tmp_path):
+    """A late append to the day being packed waits for the segments to go"""
+    log = FeedbackLog(tmp_path)
+    log.append(make_frame({"id": "a"}), "2025-08-06")
+    late = []
+
+    def relocate(moves):
+        writer = threading.Thread(
+            target=lambda: late.append(
+                log.append(make_frame({"id": "b"}), "2025-08-06")
+            )
+        )
+        writer.start()
+        writer.join(0.1)
+        assert not late  # blocked until the packed segment is gone
+
+    assert log.compact("2025-08-06", relocate)
+    for _ in range(100):
+        if late:
+            break
+        time.sleep(0.01)
+    assert late[0].segment == "2025-08-06/segment-000002.log"
+    assert [doc["id"] for _, doc in log.iter_feedback()] == ["a", "b"]
+    log.close()
+
+
+def test_second_writer_fails_fast(tmp_path):
+    """Only one process may write a FEEDBACK_DIR; the next one is refused"""
+    holder = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "import sys, feedback_log; "
+            "feedback_log.acquire_writer_lock(sys.argv[1]); "
+            "print('locked', flush=True); sys.stdin.read()",
+            str(tmp_path),
+        ],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        assert holder.stdout.readline().strip() == "locked"
+        with pytest.raises(WriterLockError, match=str(holder.pid)):
+            acquire_writer_lock(tmp_path)
+    finally:
+        holder.communicate("")
+
+    # Released when the holder exits, however it exits
+    assert acquire_writer_lock(tmp_path) == tmp_path.resolve() / "writer.lock"
+    assert acquire_writer_lock(tmp_path) == tmp_path.resolve() / "writer.lock"
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for publishing feedback to the Redis Stream
+"""
+
+import json
+from unittest.mock import MagicMock
+
+import redis
+
+from feedback_index import FeedbackIndex, index_row
+from feedback_log import FeedbackLog
+from feedback_queue import FeedbackQueue
+from stfb import FEEDBACK_MAGIC, encode_record
+
+
+def document(feedback_id: str) -> dict:
+    return {
+        "id": feedback_id,
+        "category": "bug",
+        "title": "t",
+        "description": "d",
+        "ai_model": "gpt-4",
+        "smart_tree_version": "3.3.5",
+        "timestamp": "2025-08-06T10:00:00Z",
+        "impact_score": 6,
+        "frequency_score": 2,
+    }
+
+
+def test_publish_pipelines_compact_entries():
+    """One pipelined XADD per document, trimmed to the stream cap"""
+    client = MagicMock()
+    queue = FeedbackQueue(client, stream="s", maxlen=10)
+
+    assert queue.publish([document("a"), document("b")]) == 2
+    pipe = client.pipeline.return_value
+    assert pipe.xadd.call_count == 2
+    stream, fields = pipe.xadd.call_args.args
+    assert stream == "s"
+    assert fields["id"] == "b"
+    assert json.loads(fields["document"])["frequency_score"] == 2
+    assert pipe.xadd.call_args.kwargs == {"maxlen": 10, "approximate": True}
+    pipe.execute.assert_called_once()
+
+
+def test_publish_pauses_while_redis_is_down():
+    """A Redis error never fails the caller and pauses publishing"""
+    client = MagicMock()
+    client.pipeline.return_value.execute.side_effect = redis.ConnectionError("down")
+    queue = FeedbackQueue(client, cooldown_seconds=60)
+
+    assert queue.publish([document("a")]) == 0
+    assert queue.publish([document("b")]) == 0
+    assert client.pipeline.call_count == 1  # second call skipped, no timeout
+    assert queue.stats()["skipped"] == 2
+    assert queue.stats()["paused"] is True
+
+    assert FeedbackQueue(None).publish([document("c")]) == 0
+
+
+def test_backfill_skips_entries_still_in_flight(tmp_path):
+    """Unprocessed feedback is re-enqueued unless it is waiting in the stream"""
+    log = FeedbackLog(tmp_path)
+    index = FeedbackIndex(tmp_path / "index.sqlite3")
+    for feedback_id in ("a", "b", "c"):
+        data = json.dumps(document(feedback_id)).encode()
+        location = log.append(encode_record(FEEDBACK_MAGIC, data)[0], "2025-08-06")
+        index.add(index_row(document(feedback_id), location))
+    index.mark_processed("c")
+
+    client = MagicMock()
+    client.xrange.return_value = [
+        ("1-0", {"id": "a"}),  # delivered, still pending
+        ("2-0", {"id": "b"}),  # delivered and acked, but never processed
+    ]
+    client.xinfo_groups.return_value = [
+        {"name": "feedback-workers", "last-delivered-id": "2-0"}
+    ]
+    client.xpending_range.return_value = [{"message_id": "1-0"}]
+
+    assert FeedbackQueue(client).backfill(index, log) == 1
+    fields = client.pipeline.return_value.xadd.call_args.args[1]
+    assert fields["id"] == "b"
+    log.close()
+    index.close()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Tests for the time-bucketed submission rollups
+"""
+
+import json
+
+from feedback_index import FeedbackIndex, index_row
+from feedback_log import RecordLocation
+from feedback_rollups import FeedbackRollups, RollupRing, agent_of
+
+HOUR = 3600
+T0 = 1_754_474_400  # 2025-08-06T10:00:00Z
+
+
+def test_ring_buckets_and_window():
+    """Counts land in their bucket; reused slots drop the old period"""
+    ring = RollupRing(60, 3)
+    ring.add(T0, "bug", "gpt-4", "a")
+    ring.add(T0 + 30, "critical", "gpt-4", "b")
+    ring.add(T0 + 60, "bug", "claude-3-opus", "a")
+
+    points = ring.window(T0, T0 + 120)
+    assert [point["total"] for point in points] == [2, 1]
+    assert points[0]["by_category"] == {"bug": 1, "critical": 1}
+    assert points[1]["by_agent"] == {"a": 1}
+
+    ring.add(T0 + 180, "bug", "gpt-4", "a")  # wraps onto T0's slot
+    assert [point["start"] for point in ring.window(T0, T0 + 180)] == [
+        T0 + 60,
+        T0 + 180,
+    ]
+    ring.add(T0, "bug", "gpt-4", "a")  # too old now, ignored
+    assert ring.window(T0, T0 + 59) == []
+
+
+def test_rollups_survive_restart(tmp_path):
+    rollups = FeedbackRollups(tmp_path / "rollups.json")
+    rollups.add("bug", "gpt-4", "agent-1", T0)
+    rollups.add("bug", "gpt-4", "agent-2", T0 + HOUR)
+    rollups.checkpoint()
+
+    reloaded = FeedbackRollups(tmp_path / "rollups.json")
+    assert reloaded.load()
+    hours = reloaded.series("hour", T0, T0 + HOUR)
+    assert [point["by_agent"] for point in hours] == [{"agent-1": 1}, {"agent-2": 1}]
+    assert reloaded.series("day", T0, T0)[0]["total"] == 2
+    assert not FeedbackRollups(tmp_path / "missing.json").load()
+
+
+def test_seed_from_index(tmp_path):
+    """Without a checkpoint the rings are rebuilt from submission timestamps"""
+    index = FeedbackIndex(tmp_path / "index.sqlite3")
+    document = {
+        "id": "a",
+        "category": "bug",
+        "ai_model": "gpt-4",
+        "impact_score": 5,
+        "frequency_score": 5,
+        "smart_tree_version": "3.3.5",
+        "timestamp": "2099-01-01T10:00:00Z",
+        "title": "t",
+        "description": "d",
+        "tags": ["agent:agent-1"],
+    }
+    index.add(index_row(document, RecordLocation("2099-01-01/segment-000001.log", 0)))
+
+    rollups = FeedbackRollups(tmp_path / "rollups.json")
+    assert rollups.seed(index) == 1
+    start = 4_070_944_800  # 2099-01-01T10:00:00Z
+    assert rollups.series("minute", start, start)[0]["by_agent"] == {"agent-1": 1}
+    assert json.loads((tmp_path / "rollups.json").read_text())["hour"]
+    index.close()
+
+
+def test_agent_of():
+    assert agent_of(["mcp_client:cursor", "agent:admin_001"]) == "admin_001"
+    assert agent_of([]) == "anonymous"
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Tests for the MinHash/LSH similarity index
+"""
+
+import json
+import os
+import subprocess
+import sys
+from array import array
+from pathlib import Path
+
+import feedback_similar
+from feedback_index import FeedbackIndex
+from feedback_log import FeedbackLog, acquire_writer_lock
+from feedback_similar import SimilarityIndex, shingles
+from stfb import FEEDBACK_MAGIC, compress, pack_record
+
+BASE = (
+    "st --search hangs forever on a large monorepo with many symlinks and never "
+    "prints a single result even after ten minutes of waiting"
+)
+
+
+def document(feedback_id: str, description: str, title: str = "Search hangs") -> dict:
+    return {
+        "id": feedback_id,
+        "category": "bug",
+        "title": title,
+        "description": description,
+        "affected_command": "st --search TODO",
+    }
+
+
+def test_shingles_ignore_case_and_punctuation():
+    a = shingles(document("a", "Search, HANGS on symlinks!"))
+    b = shingles(document("b", "search hangs on symlinks"))
+    assert sorted(a) == sorted(b)
+
+
+def test_similar_finds_near_duplicates(tmp_path):
+    """Reworded reports are found, unrelated ones are not, and the document
+    itself is never returned"""
+    similarity = SimilarityIndex(tmp_path / "similar.snapshot")
+    assert similarity.add(document("a", BASE)) == []
+    hint = similarity.add(document("b", BASE.replace("ten minutes", "an hour")))
+    assert [feedback_id for feedback_id, _ in hint] == ["a"]
+    similarity.add(
+        document("c", "The emoji output is garbled on Windows terminals", "Emoji")
+    )
+
+    matches = similarity.similar(document("a", BASE))
+    assert [feedback_id for feedback_id, _ in matches] == ["b"]
+    assert 0.5 < matches[0][1] <= 1.0
+
+
+def test_snapshot_round_trip(tmp_path):
+    """Merged and pending entries survive a snapshot and reload"""
+    path = tmp_path / "similar.snapshot"
+    similarity = SimilarityIndex(path, merge_threshold=2)
+    similarity.add(document("a", BASE))
+    similarity.add(document("b", BASE + " at all"))  # merged into the tables
+    similarity.add(document("c", BASE + " whatsoever"))  # still pending
+    assert similarity.snapshot() == 3
+
+    reloaded = SimilarityIndex(path)
+    assert len(reloaded) == 3
+    matches = reloaded.similar(document("x", BASE))
+    assert {feedback_id for feedback_id, _ in matches} == {"a", "b", "c"}
+
+    # A snapshot made with other parameters is ignored, not misread
+    assert len(SimilarityIndex(path, hashes=32, bands=8)) == 0
+
+
+def test_lookups_carry_on_during_a_merge(tmp_path, monkeypatch):
+    """Tables are rebuilt outside the lock; entries being merged stay visible"""
+    similarity = SimilarityIndex(tmp_path / "similar.snapshot")
+    similarity.add(document("a", BASE))
+    seen = []
+
+    def build(typecode, values):
+        # Runs mid-merge: the lock is free and "a" is in neither table
+        seen.append(similarity.similar(document("x", BASE)))
+        return array(typecode, values)
+
+    monkeypatch.setattr(feedback_similar, "array", build)
+    assert similarity.merge() == 1
+    assert [feedback_id for feedback_id, _ in seen[0]] == ["a"]
+    monkeypatch.undo()
+    matches = similarity.similar(document("x", BASE))
+    assert [feedback_id for feedback_id, _ in matches] == ["a"]
+    assert similarity.stats()["pending"] == 0
+
+
+def test_catch_up_from_index(tmp_path):
+    """Feedback the snapshot is missing is read back from the log"""
+    log = FeedbackLog(tmp_path / "log")
+    index = FeedbackIndex(tmp_path / "index.sqlite3")
+    for feedback_id in ("a", "b"):
+        item = {
+            **document(feedback_id, BASE),
+            "ai_model": "gpt-4",
+            "impact_score": 5,
+            "frequency_score": 5,
+            "smart_tree_version": "3.3.5",
+            "timestamp": "2025-08-06T10:00:00Z",
+        }
+        data = json.dumps(item).encode()
+        log.append(pack_record(FEEDBACK_MAGIC, len(data), compress(data)), "2025-08-06")
+    index.catch_up(log)
+
+    similarity = SimilarityIndex(tmp_path / "similar.snapshot")
+    similarity.add(document("a", BASE))
+    assert similarity.catch_up(index, log) == 1
+    matches = similarity.similar(document("a", BASE))
+    assert [feedback_id for feedback_id, _ in matches] == ["b"]
+    log.close()
+    index.close()
+
+
+def test_rebuild_refuses_to_run_beside_the_api(tmp_path):
+    """The API would overwrite a snapshot rebuilt under it"""
+    acquire_writer_lock(tmp_path)
+    (tmp_path / "similar.snapshot").write_bytes(b"kept")
+    result = subprocess.run(
+        [sys.executable, str(Path(__file__).parent / "feedback_similar.py"), "rebuild"],
+        env={**os.environ, "FEEDBACK_DIR": str(tmp_path)},
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 1
+    assert "stop the API first" in result.stderr
+    assert (tmp_path / "similar.snapshot").read_bytes() == b"kept"
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Tests for the non-blocking ingest pipeline
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from ingest import IngestOverloaded, IngestPipeline
+
+
+def test_jobs_run_off_the_event_loop():
+    """Blocking work runs on a pool thread and its result comes back"""
+    pipeline = IngestPipeline(workers=2, max_pending=4)
+
+    async def main():
+        return await pipeline.submit(threading.current_thread)
+
+    assert asyncio.run(main()).name.startswith("ingest")
+    assert pipeline.stats()["accepted"] == 1
+    pipeline.shutdown()
+
+
+def test_reads_do_not_queue_behind_writes():
+    """Background jobs run on their own pool while every ingest thread is busy"""
+    pipeline = IngestPipeline(workers=1, background_workers=1)
+    release = threading.Event()
+
+    async def main():
+        write = asyncio.create_task(pipeline.submit(release.wait, 5))
+        await asyncio.sleep(0)
+        thread = await asyncio.wait_for(
+            pipeline.background(threading.current_thread), timeout=1
+        )
+        release.set()
+        await write
+        return thread
+
+    assert asyncio.run(main()).name.startswith("background")
+    pipeline.shutdown()
+
+
+def test_full_queue_is_rejected():
+    """Submissions beyond max_pending fail fast instead of queueing"""
+    pipeline = IngestPipeline(workers=1, max_pending=1, retry_after=3)
+    release = threading.Event()
+
+    async def main():
+        first = asyncio.create_task(pipeline.submit(release.wait, 5))
+        await asyncio.sleep(0)  # let the first job get admitted
+        with pytest.raises(IngestOverloaded) as excinfo:
+            await pipeline.submit(lambda: None)
+        release.set()
+        assert await first
+        return excinfo.value
+
+    assert asyncio.run(main()).retry_after == 3
+    assert pipeline.stats()["rejected"] == 1
+    assert pipeline.stats()["pending"] == 0
+    pipeline.shutdown()
+
+
+def test_inline_mode_without_workers():
+    """workers=0 runs jobs directly (no pool)"""
+    pipeline = IngestPipeline(workers=0)
+
+    async def main():
+        return await pipeline.submit(threading.current_thread)
+
+    assert asyncio.run(main()) is threading.main_thread()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Tests for the mergeable latency sketch
+"""
+
+import random
+
+from latency_sketch import DDSketch
+
+
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def test_quantiles_within_relative_accuracy():
+    """Every quantile estimate is within 1% of the true value"""
+    rng = random.Random(3)
+    values = [rng.lognormvariate(4, 1.2) for _ in range(20000)]
+    sketch = DDSketch()
+    for value in values:
+        sketch.add(value)
+
+    for q in (0.01, 0.5, 0.9, 0.99, 0.999):
+        true = exact_quantile(values, q)
+        assert abs(sketch.quantile(q) - true) <= 0.01 * true
+
+
+def test_merge_equals_one_sketch_of_everything():
+    """Sketches built in different processes merge without loss"""
+    rng = random.Random(5)
+    left, right, both = DDSketch(), DDSketch(), DDSketch()
+    for _ in range(1000):
+        value = rng.uniform(1, 500)
+        (left if rng.random() < 0.3 else right).add(value)
+        both.add(value)
+
+    left.merge(right)
+    assert left.buckets == both.buckets
+    assert left.quantiles() == both.quantiles()
+
+
+def test_weights_zero_and_empty():
+    sketch = DDSketch()
+    assert sketch.quantile(0.5) is None
+    assert sketch.quantiles() == {"p50": None, "p90": None, "p99": None}
+
+    sketch.add(0)
+    sketch.add(100, weight=9)
+    assert sketch.count == 10
+    assert sketch.quantile(0) == 0
+    assert abs(sketch.quantile(0.5) - 100) <= 1
+
+    # Only bucket fields are merged from shared counters
+    other = DDSketch()
+    other.merge_buckets({**sketch.buckets, "calls": 7, "successes_milli": 7000})
+    assert other.count == 10
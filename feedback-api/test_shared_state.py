@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared cross-process state
+"""
+
+import json
+from unittest.mock import MagicMock
+
+import redis
+
+import shared_state
+from conditional import Generations
+from shared_state import LocalState, RedisState, SharedMap
+
+
+def test_local_maps_and_counters():
+    """Maps store values, counters add up per (key, field)"""
+    state = LocalState()
+    state.put("agents", "a", {"name": "A"})
+    assert not state.put_if_absent("agents", "a", {"name": "other"})
+    assert state.put_if_absent("agents", "b", {"name": "B"})
+    assert state.get_map("agents") == {"a": {"name": "A"}, "b": {"name": "B"}}
+    assert state.delete("agents", "a")
+    assert not state.delete("agents", "a")
+
+    state.incr("tools", {("tree", "gpt-4"): 2, ("tree", "opus"): 1})
+    state.incr("tools", {("tree", "gpt-4"): 3})
+    assert state.counters("tools") == {"tree": {"gpt-4": 5, "opus": 1}}
+
+
+def test_local_rate_window():
+    """A cost that would overflow the window is refused and not charged"""
+    state = LocalState()
+    assert state.rate_hit("agent:x", 5, 60, cost=4)
+    assert not state.rate_hit("agent:x", 5, 60, cost=2)
+    assert state.rate_hit("agent:x", 5, 60)
+    assert state.rate_remaining("agent:x", 5, 60)["remaining"] == 0
+    assert state.rate_remaining("agent:y", 5, 60)["remaining"] == 5
+
+    state.rate_refund("agent:x", 3)
+    assert state.rate_remaining("agent:x", 5, 60)["remaining"] == 3
+
+
+def test_shared_map_converts_values():
+    """load/dump round-trip values; setdefault keeps the first value"""
+    state = LocalState()
+    scores = SharedMap(state, "scores", load=int, dump=str)
+    scores["a"] = 1
+    assert state.get_map("scores") == {"a": "1"}
+    assert scores["a"] == 1
+    assert scores.setdefault("a", 2) == 1
+    assert scores.setdefault("b", 2) == 2
+    assert sorted(scores) == ["a", "b"] and len(scores) == 2
+    del scores["a"]
+    assert "a" not in scores
+    assert scores.get("a") is None
+
+
+def test_redis_reads_come_from_the_local_copy():
+    """A namespace is fetched once until an invalidation arrives"""
+    client = MagicMock()
+    client.hgetall.return_value = {"a": json.dumps({"name": "A"})}
+    state = RedisState(client, subscribe=False)
+
+    assert state.get_map("agents") == {"a": {"name": "A"}}
+    assert state.get_map("agents") == {"a": {"name": "A"}}
+    assert client.hgetall.call_count == 1
+
+    # Another worker changed it
+    client.hgetall.return_value = {}
+    state.handle_invalidation({"channel": state.channel, "data": "map:agents"})
+    assert state.get_map("agents") == {}
+    assert client.hgetall.call_count == 2
+    assert state.stats()["invalidations"] == 1
+
+
+def test_redis_writes_publish_invalidations():
+    """Writes go to Redis with the invalidation in the same pipeline"""
+    client = MagicMock()
+    state = RedisState(client, prefix="t:", subscribe=False)
+
+    state.put("agents", "a", {"name": "A"})
+    pipe = client.pipeline.return_value
+    pipe.hset.assert_called_once_with("t:map:agents", mapping={"a": '{"name": "A"}'})
+    pipe.publish.assert_called_once_with("t:invalidate", "map:agents")
+
+    state.incr("tools", {("tree", "gpt-4"): 2})
+    pipe.hincrby.assert_called_once_with("t:counters:tools", "tree\x1fgpt-4", 2)
+    pipe.publish.assert_called_with("t:invalidate", "counters:tools")
+
+    client.hgetall.return_value = {"tree\x1fgpt-4": "7", "tree\x1fopus": "1"}
+    assert state.counters("tools") == {"tree": {"gpt-4": 7, "opus": 1}}
+
+    client.hsetnx.return_value = 0
+    assert not state.put_if_absent("agents", "a", {})
+    client.publish.assert_not_called()
+
+
+def test_redis_rate_window_is_shared():
+    """Check and charge are one script run in Redis, so concurrent workers
+    can't all pass the check before any of them charges"""
+    client = MagicMock()
+    script = client.register_script.return_value
+    state = RedisState(client, subscribe=False)
+    assert "ZCARD" in client.register_script.call_args.args[0]
+
+    script.return_value = 1
+    assert state.rate_hit("agent:x", 5, 60, cost=2)
+    assert script.call_args.kwargs["keys"] == ["rate_limit:agent:x"]
+    assert script.call_args.kwargs["args"][1:4] == [60, 5, 2]
+    client.pipeline.assert_not_called()
+
+    script.return_value = 0
+    assert not state.rate_hit("agent:x", 5, 60, cost=3)
+
+    client.pipeline.return_value.execute.return_value = [0, 3]
+    assert state.rate_remaining("agent:x", 5, 60)["remaining"] == 2
+
+    state.rate_refund("agent:x", 2)
+    client.zpopmax.assert_called_once_with("rate_limit:agent:x", 2)
+
+
+def test_falls_back_to_local_without_redis(monkeypatch):
+    """An unreachable Redis means per-process state, not a failed start"""
+    client = MagicMock()
+    client.ping.side_effect = redis.ConnectionError("refused")
+    monkeypatch.setattr(shared_state.redis, "from_url", lambda *a, **k: client)
+    monkeypatch.setattr(shared_state, "SHARED_STATE_BACKEND", "redis")
+    monkeypatch.setattr(shared_state, "_shared_state", None)
+
+    assert shared_state.get_shared_state().backend == "local"
+
+
+def test_shared_generations():
+    """A bump through one worker changes the tag every worker computes"""
+    state = LocalState()
+    first, second = Generations(), Generations()
+    first.share(state)
+    second.share(state)
+    assert first.etag(["tools"]) == second.etag(["tools"])
+
+    before = second.etag(["tools"])
+    first.bump("tools")
+    assert second.etag(["tools"]) != before
+    assert second.etag(["tools"]) == first.etag(["tools"])
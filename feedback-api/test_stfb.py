@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Tests for the STFB record format (v1 zlib, v2 zstd + dictionary)
+"""
+
+import io
+import json
+
+import pytest
+
+import stfb
+from feedback_log import FeedbackLog
+from stfb import (
+    FEEDBACK_MAGIC,
+    METADATA_HEADER,
+    VERSION_1,
+    VERSION_2,
+    VERSION_3,
+    DictionaryStore,
+    ModelRegistry,
+    compress,
+    encode_record,
+    feedback_metadata,
+    pack_record,
+    read_record,
+    training_samples,
+)
+
+
+def make_document(i: int) -> dict:
+    return {
+        "id": f"{i:016x}",
+        "category": ["bug", "nice_to_have", "critical"][i % 3],
+        "title": f"Search is slow on large trees ({i})",
+        "description": "When running st --mode quantum on a big repo the scan "
+        f"takes {i % 17} seconds longer than expected.",
+        "ai_model": ["claude-3-opus", "gpt-4"][i % 2],
+        "smart_tree_version": "3.3.5",
+        "timestamp": f"2025-08-06T10:{i % 60:02d}:00Z",
+        "impact_score": i % 10 + 1,
+        "frequency_score": i % 7 + 1,
+        "tags": ["performance", "search"],
+    }
+
+
+@pytest.fixture
+def dictionaries(tmp_path, monkeypatch):
+    store = DictionaryStore(tmp_path / "dictionaries")
+    monkeypatch.setattr(stfb, "_dictionaries", store)
+    return store
+
+
+@pytest.fixture
+def models(tmp_path, monkeypatch):
+    registry = ModelRegistry(tmp_path / "models.json")
+    monkeypatch.setattr(stfb, "_model_registry", registry)
+    return registry
+
+
+def test_v1_records_still_read(dictionaries):
+    """Existing zlib frames decode unchanged"""
+    data = json.dumps(make_document(1), indent=2).encode()
+    record = read_record(
+        io.BytesIO(pack_record(FEEDBACK_MAGIC, len(data), compress(data)))
+    )
+
+    assert record.version == VERSION_1
+    assert record.document() == make_document(1)
+
+
+def test_v2_round_trip_without_dictionary(dictionaries):
+    """Before any dictionary is trained, v2 frames use plain zstd"""
+    data = json.dumps(make_document(2)).encode()
+    frame, compressed_size = encode_record(FEEDBACK_MAGIC, data)
+    record = read_record(io.BytesIO(frame))
+
+    assert record.version == VERSION_2
+    assert record.dict_id == 0
+    assert record.compressed_size == compressed_size
+    assert record.frame_size == len(frame)
+    assert record.document() == make_document(2)
+
+
+def test_trained_dictionary_is_used_and_rotated(tmp_path, monkeypatch, dictionaries):
+    """Training + activation switches new writes; old ids stay readable"""
+    log = FeedbackLog(tmp_path / "feedback")
+    for i in range(400):
+        data = json.dumps(make_document(i)).encode()
+        log.append(pack_record(FEEDBACK_MAGIC, len(data), compress(data)), "2025-08-06")
+    log.close()
+
+    samples = training_samples(log, limit=300)
+    assert len(samples) == 300
+    first = dictionaries.train(samples, size=4096)
+    dictionaries.activate(first)
+
+    data = json.dumps(make_document(500)).encode()
+    frame, _ = encode_record(FEEDBACK_MAGIC, data)
+    assert read_record(io.BytesIO(frame)).dict_id == first
+    assert len(frame) < len(pack_record(FEEDBACK_MAGIC, len(data), compress(data)))
+
+    # A fresh reader (e.g. another process) decodes it from the store on disk
+    monkeypatch.setattr(stfb, "_dictionaries", DictionaryStore(dictionaries.root))
+    assert read_record(io.BytesIO(frame)).document() == make_document(500)
+    assert stfb._dictionaries.active_id() == first
+    assert stfb._dictionaries.ids() == [first]
+
+
+def test_v3_metadata_is_read_from_the_header_alone(dictionaries, models):
+    """Scanners get category/model/scores/timestamp without the payload"""
+    document = make_document(3)
+    data = json.dumps(document).encode()
+    frame, _ = encode_record(FEEDBACK_MAGIC, data, feedback_metadata(document))
+
+    f = io.BytesIO(frame + b"trailing")
+    record = read_record(f, with_payload=False)
+    assert record.version == VERSION_3
+    assert f.tell() == len(frame)
+    assert record.frame_size == len(frame)
+
+    metadata = record.metadata
+    assert metadata.feedback_id == document["id"]
+    assert metadata.category == "bug"
+    assert metadata.ai_model == "gpt-4"
+    assert (metadata.impact_score, metadata.frequency_score) == (4, 4)
+    assert metadata.timestamp.isoformat() == "2025-08-06T10:03:00+00:00"
+    assert not metadata.processed
+
+    assert read_record(io.BytesIO(frame)).document() == document
+    assert read_record(io.BytesIO(frame[: METADATA_HEADER.size - 1])) is None
+
+
+def test_v3_checksum_detects_corruption(dictionaries, models):
+    """A flipped payload byte fails the header CRC32"""
+    document = make_document(4)
+    frame, _ = encode_record(
+        FEEDBACK_MAGIC, json.dumps(document).encode(), feedback_metadata(document)
+    )
+    corrupted = frame[:-1] + bytes([frame[-1] ^ 0xFF])
+
+    with pytest.raises(ValueError, match="checksum"):
+        read_record(io.BytesIO(corrupted)).data()
+
+
+def test_model_ids_are_stable_across_restarts(tmp_path):
+    """Model ids are persisted before any header refers to them"""
+    registry = ModelRegistry(tmp_path / "models.json")
+    assert registry.id_for("claude-3-opus") == 1
+    assert registry.id_for("gpt-4") == 2
+    assert registry.id_for("claude-3-opus") == 1
+
+    reopened = ModelRegistry(tmp_path / "models.json")
+    assert reopened.name(2) == "gpt-4"
+    assert reopened.name(99) == "unknown"
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Tests for write-behind tool usage persistence
+"""
+
+import json
+import time
+
+from shared_state import LocalState
+from tool_usage import ToolUsage
+
+
+def usage(directory, **kwargs) -> ToolUsage:
+    """A fresh process's view: new state, restored from disk"""
+    return ToolUsage(LocalState(), directory, sync_seconds=0, **kwargs)
+
+
+def test_restart_replays_the_log(tmp_path):
+    """Pings survive a restart through the write-ahead log alone"""
+    counters = usage(tmp_path)
+    counters.record([("search", "opus", 2, "2025-08-06T10:00:00+00:00")])
+    counters.record([("search", "gpt-4", 1, None), ("tree", "opus", 5, None)])
+    counters.sync_if_due()
+    assert not (tmp_path / "tool_usage.json").exists()
+
+    restored = usage(tmp_path).stats()
+    assert restored["search"] == {
+        "count": 3,
+        "models": {"opus": 2, "gpt-4": 1},
+        "last_used": "2025-08-06T10:00:00+00:00",
+    }
+    assert restored["tree"]["count"] == 5
+
+
+def test_compaction_counts_every_ping_once(tmp_path):
+    """Snapshot + newer logs add up to the totals; covered logs are dropped"""
+    counters = usage(tmp_path)
+    counters.record([("search", "opus", 2, None)])
+    counters.compact()
+    counters.record([("search", "opus", 3, None)])
+    counters.sync_if_due()
+
+    assert json.loads((tmp_path / "tool_usage.json").read_text())["next_wal"] == 1
+    assert sorted(path.name for path in tmp_path.glob("*.wal")) == ["tool_usage.1.wal"]
+    assert usage(tmp_path).stats()["search"]["count"] == 5
+
+
+def test_crash_before_dropping_covered_logs(tmp_path):
+    """A log the snapshot already covers is not replayed again"""
+    counters = usage(tmp_path)
+    counters.record([("search", "opus", 2, None)])
+    counters.sync_if_due()
+    stale = (tmp_path / "tool_usage.0.wal").read_bytes()
+    counters.compact()
+    (tmp_path / "tool_usage.0.wal").write_bytes(stale)  # unlink never happened
+
+    assert usage(tmp_path).stats()["search"]["count"] == 2
+
+
+def test_torn_last_line_is_skipped(tmp_path):
+    counters = usage(tmp_path)
+    counters.record([("search", "opus", 2, None)])
+    counters.sync_if_due()
+    with open(tmp_path / "tool_usage.0.wal", "ab") as f:
+        f.write(b'["search","op')
+
+    assert usage(tmp_path).stats()["search"]["count"] == 2
+
+
+def test_event_threshold_compacts_in_background(tmp_path):
+    counters = usage(tmp_path, compact_events=3)
+    counters.record([("search", "opus", 1, None)] * 3)
+    for _ in range(100):
+        if (tmp_path / "tool_usage.json").exists():
+            break
+        time.sleep(0.01)
+    assert (
+        json.loads((tmp_path / "tool_usage.json").read_text())["tools"]["search"][
+            "count"
+        ]
+        == 3
+    )
+
+
+def test_latency_and_success_survive_restarts(tmp_path):
+    """Sketch buckets and success counts replay from the log and snapshot"""
+    counters = usage(tmp_path)
+    counters.record([("search", "opus", 8, None, 120.0, 1.0)])
+    counters.compact()
+    counters.record([("search", "gpt-4", 2, None, 900.0, 0.0)])
+    counters.sync_if_due()
+    with open(tmp_path / "tool_usage.1.wal", "ab") as f:
+        f.write(b'["search","opus",5,null]\n')  # written before latency
+
+    latency = usage(tmp_path).latency("search")
+    assert latency["samples"] == 10
+    assert latency["calls"] == 10
+    assert latency["success_ratio"] == 0.8
+    assert abs(latency["latency_ms"]["p50"] - 120) <= 1.2
+    assert abs(latency["latency_ms"]["p99"] - 900) <= 9
+    assert [row["model"] for row in latency["breakdown"]] == ["opus", "gpt-4"]
+    assert usage(tmp_path).stats()["search"]["count"] == 15
+
+    assert usage(tmp_path).latency("search", "gpt-4")["latency_ms"]["p50"] > 890
+    assert usage(tmp_path).latency("missing")["samples"] == 0
+
+
+def test_buffered_usage_is_merged_on_sync(tmp_path):
+    """In-process usage costs nothing per call until the next sync"""
+    counters = usage(tmp_path)
+    for _ in range(5):
+        counters.buffer("llm_assist", "Admin", 1, "2025-08-06T10:00:00+00:00")
+    assert counters.stats() == {}
+
+    assert counters.sync_if_due() == 5
+    assert counters.stats()["llm_assist"]["models"] == {"Admin": 5}
+    assert usage(tmp_path).stats()["llm_assist"]["count"] == 5
+
+
+def test_seeds_from_the_old_daily_file(tmp_path):
+    """The first start after the upgrade keeps the old tool_stats counts"""
+    old = {"search": {"count": 4, "models": {"opus": 4}, "last_used": "2025-08-05"}}
+    (tmp_path / "tool_stats_2025-08-04.json").write_text("{}")
+    (tmp_path / "tool_stats_2025-08-05.json").write_text(json.dumps(old))
+
+    assert usage(tmp_path).stats() == old
+
+
+def test_shared_counts_are_not_restored_twice(tmp_path):
+    """The snapshot + logs only fill empty shared counters (Redis backend)"""
+    counters = usage(tmp_path / "a")
+    counters.record([("search", "opus", 2, None)])
+    counters.close()
+
+    state = LocalState()
+    first = ToolUsage(state, tmp_path / "a")
+    second = ToolUsage(state, tmp_path / "b")
+    second.record([("search", "opus", 1, None)])
+    assert first.stats()["search"]["count"] == 3
+
+    # One instance restarts while the shared counters live on
+    ToolUsage(state, tmp_path / "a")
+    assert second.stats()["search"]["count"] == 3
+
+
+def test_acknowledged_pings_survive_a_crash(tmp_path):
+    """Buffered usage is logged before the ping returns, not at the next sync"""
+    counters = usage(tmp_path)
+    counters.buffer("search", "opus", 2, None)
+    counters.buffer_many([("tree", "opus", 1, None)])
+    # Crash: no sync, no close
+
+    assert usage(tmp_path).stats()["search"]["count"] == 2
+    assert usage(tmp_path).stats()["tree"]["count"] == 1
+
+
+def test_crash_with_shared_counters_replays_only_unmerged_pings(tmp_path):
+    """With Redis keeping the counts, a restart merges what the crash left in
+    the buffer, once"""
+    state = LocalState()
+    counters = ToolUsage(state, tmp_path)
+    counters.record([("search", "opus", 2, None)])
+    counters.buffer("search", "opus", 1, None)
+    # Crash before the next sync
+
+    ToolUsage(state, tmp_path)
+    assert counters.stats()["search"]["count"] == 3
+    ToolUsage(state, tmp_path)
+    assert counters.stats()["search"]["count"] == 3
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Tests for the update decision log and its running counts
+"""
+
+import json
+
+from shared_state import LocalState
+from update_decisions import UpdateDecisionLog
+
+
+def decision(user_decision: str, current: str = "3.2.0", model: str = "gpt-4"):
+    return {
+        "current_version": current,
+        "latest_version": "3.3.0",
+        "decision": user_decision,
+        "ai_model": model,
+    }
+
+
+def test_appends_one_line_per_decision(tmp_path):
+    log = UpdateDecisionLog(LocalState(), tmp_path)
+    log.record(decision("update"))
+    log.record(decision("skip", model="opus"))
+
+    (path,) = tmp_path.glob("update_decisions_*.ndjson")
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["decision"] for line in lines] == ["update", "skip"]
+    assert "timestamp" in lines[0]
+
+    summary = log.summary()
+    assert summary["total"] == 2
+    assert summary["by_model"]["opus"]["decisions"] == {"skip": 1}
+    assert log.summary(ai_model="gpt-4")["update_rate"] == 1.0
+
+
+def test_rotates_at_size_limit(tmp_path):
+    log = UpdateDecisionLog(LocalState(), tmp_path, max_bytes=200)
+    for _ in range(6):
+        log.record(decision("update"))
+
+    names = sorted(path.name for path in tmp_path.glob("*.ndjson"))
+    assert len(names) > 1
+    assert any(".1.ndjson" in name for name in names)
+    assert UpdateDecisionLog(LocalState(), tmp_path).summary()["total"] == 6
+
+
+def test_restore_from_checkpoint_and_log_tail(tmp_path):
+    """Counts come back once: checkpoint plus what was logged after it"""
+    log = UpdateDecisionLog(LocalState(), tmp_path, max_bytes=200)
+    for _ in range(3):
+        log.record(decision("update"))
+    log.checkpoint()
+    for _ in range(3):
+        log.record(decision("remind_later", current="3.1.0"))
+    # Crash: no final checkpoint
+
+    restored = UpdateDecisionLog(LocalState(), tmp_path, max_bytes=200)
+    assert restored.summary()["decisions"] == {"update": 3, "remind_later": 3}
+    restored.close()
+    again = UpdateDecisionLog(LocalState(), tmp_path, max_bytes=200)
+    assert again.summary()["total"] == 6
+
+
+def test_seeds_from_old_daily_arrays(tmp_path):
+    old = [
+        {"timestamp": "2025-08-05T10:00:00", **decision("skip"), "ai_model": None},
+    ]
+    (tmp_path / "update_decisions_2025-08-05.json").write_text(json.dumps(old))
+
+    log = UpdateDecisionLog(LocalState(), tmp_path)
+    assert log.summary()["by_model"]["unknown"]["decisions"] == {"skip": 1}
+
+
+def test_shared_counts_are_not_restored_twice(tmp_path):
+    first = UpdateDecisionLog(LocalState(), tmp_path)
+    first.record(decision("update"))
+    first.close()
+
+    state = LocalState()
+    UpdateDecisionLog(state, tmp_path)
+    second = UpdateDecisionLog(state, tmp_path)
+    assert second.summary()["total"] == 1
+
+
+def test_checkpoint_covers_logs_other_processes_rotated_to(tmp_path):
+    """The checkpoint points at the newest log, whoever wrote it"""
+    state = LocalState()
+    first = UpdateDecisionLog(state, tmp_path, max_bytes=200)
+    second = UpdateDecisionLog(state, tmp_path, max_bytes=200)
+    first.record(decision("update"))
+    for _ in range(3):
+        second.record(decision("skip"))
+    assert len(list(tmp_path.glob("*.ndjson"))) > 1
+    first.checkpoint()
+
+    restored = UpdateDecisionLog(LocalState(), tmp_path)
+    assert restored.summary()["decisions"] == {"update": 1, "skip": 3}
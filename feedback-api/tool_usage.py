@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Tool usage counters with write-behind persistence
+A /tools/usage ping used to rewrite the whole tool_stats_<date>.json file,
+and the counts were lost on restart. Now a ping appends one line to a local
+write-ahead log before it is acknowledged (written to the OS; `sync_if_due`
+fsyncs about once a second) and is merged into the counters in the shared
+state in batches. The counters are compacted into a snapshot every
+TOOL_USAGE_COMPACT_SECONDS or TOOL_USAGE_COMPACT_EVENTS pings, in the
+background, and restored from snapshot + log at boot.
+
+Pings that report `avg_execution_time_ms` and `success_rate` also feed a
+latency sketch (see latency_sketch.py) and success counts per tool and model.
+Their buckets are shared-state counters too, so every instance's reports merge.
+
+    stats/tool_usage.json        totals, plus the first log it doesn't cover
+    stats/tool_usage.<n>.wal     [tool, model, count, last used, latency ms,
+                                 success rate] per line, and
+                                 {"applied": n} after each batch merged
+
+Compaction switches to a new log before writing the snapshot, so a crash at
+any point replays each increment exactly once. With the Redis backend Redis
+is the shared aggregate and keeps the counts across restarts: a restart only
+merges the pings the last "applied" line doesn't cover (acknowledged, never
+merged), and the snapshot + logs only restore the counts if Redis lost them.
+Each instance needs its own STATS_DIR.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import fast_json
+from latency_sketch import DDSketch
+from shared_state import SharedState, get_shared_state
+
+logger = logging.getLogger(__name__)
+
+TOOL_USAGE_COMPACT_SECONDS = int(os.getenv("TOOL_USAGE_COMPACT_SECONDS", "300"))
+TOOL_USAGE_COMPACT_EVENTS = int(os.getenv("TOOL_USAGE_COMPACT_EVENTS", "10000"))
+
+WAL_PATTERN = re.compile(r"tool_usage\.(\d+)\.wal$")
+
+# Log line saying the first N entries of the log are in the counters
+APPLIED_KEY = "applied"
+
+# (tool, model, count, last used as ISO 8601, average latency in ms, success
+# rate); the last two are optional
+UsageEntry = Tuple[str, str, int, Optional[str], Optional[float], Optional[float]]
+
+# Separates tool and model in latency counter keys
+KEY_SEPARATOR = "\x1e"
+
+_sketch = DDSketch()
+
+
+def merge(entries: Iterable[UsageEntry]) -> Tuple[dict, dict, dict]:
+    """Counter deltas per (tool, model), the latest use of each tool, and
+    latency/success counter deltas per (tool + model, field)"""
+    deltas: Dict[Tuple[str, str], int] = {}
+    last_used: Dict[str, str] = {}
+    latency: Dict[Tuple[str, str], int] = {}
+
+    def bump(key: str, field: str, amount: int):
+        latency[(key, field)] = latency.get((key, field), 0) + amount
+
+    for tool, model, count, used, latency_ms, success_rate in entries:
+        deltas[(tool, model)] = deltas.get((tool, model), 0) + count
+        if used:
+            last_used[tool] = used
+        key = f"{tool}{KEY_SEPARATOR}{model}"
+        if latency_ms is not None:
+            # An average over `count` calls counts as `count` samples
+            bump(key, _sketch.bucket(latency_ms), count)
+        if success_rate is not None:
+            bump(key, "calls", count)
+            bump(key, "successes_milli", round(success_rate * count * 1000))
+    return deltas, last_used, latency
+
+
+def latency_summary(sketch: DDSketch, calls: int, successes_milli: int) -> dict:
+    return {
+        "samples": sketch.count,
+        "latency_ms": sketch.quantiles(),
+        "calls": calls,
+        "success_ratio": round(successes_milli / 1000 / calls, 4) if calls else None,
+    }
+
+
+def normalize(entry) -> UsageEntry:
+    """A full six-field entry (logs written before latency had four)"""
+    tool, model, count, used, *rest = entry
+    latency_ms, success_rate = (list(rest) + [None, None])[:2]
+    return tool, model, count, used, latency_ms, success_rate
+
+
+def applied_line(applied: int) -> bytes:
+    """The log line saying its first `applied` entries are in the counters"""
+    return fast_json.dumps({APPLIED_KEY: applied}) + b"\n"
+
+
+class ToolUsage:
+    """Tool usage counters in the shared state, persisted write-behind"""
+
+    def __init__(
+        self,
+        state: SharedState,
+        directory: Path,
+        compact_seconds: int = TOOL_USAGE_COMPACT_SECONDS,
+        compact_events: int = TOOL_USAGE_COMPACT_EVENTS,
+        sync_seconds: float = 1.0,
+    ):
+        self.state = state
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.snapshot_path = self.directory / "tool_usage.json"
+        self.compact_seconds = compact_seconds
+        self.compact_events = compact_events
+        self.sync_seconds = sync_seconds
+
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        # Held while buffered usage is merged, so a compaction never snapshots
+        # counters that are missing a batch taken off the buffer
+        self._apply_lock = threading.Lock()
+        self._events = 0  # since the last compaction
+        self._unsynced = False
+        self._last_sync = time.monotonic()
+        self._last_compact = time.monotonic()
+        self._file = None
+        self._generation = 0
+        self._logged = 0  # entries in the current log
+        # In-process usage waiting to be merged
+        self._buffered: List[UsageEntry] = []
+        self.restore()
+
+    # ------------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------------
+
+    def record(self, entries: Iterable[UsageEntry]):
+        """Count usage now: an append to the log plus a counter update"""
+        self.buffer_many(entries)
+        self.flush_buffer()
+
+    def buffer(self, *entry):
+        """Count usage (a `UsageEntry`) from inside the API: logged at once,
+        merged into the counters as one batch by the next `sync_if_due`"""
+        self.buffer_many([entry])
+
+    def buffer_many(self, entries: Iterable[UsageEntry]):
+        """`buffer` for several entries at once"""
+        entries = [normalize(entry) for entry in entries]
+        lines = b"".join(fast_json.dumps(list(entry)) + b"\n" for entry in entries)
+        with self._lock:
+            # In the OS before the caller acknowledges: a crash of this
+            # process doesn't lose it, whatever happens to the buffer
+            self._file.write(lines)
+            self._file.flush()
+            self._buffered.extend(entries)
+            self._unsynced = True
+            self._logged += len(entries)
+            self._events += len(entries)
+            due = self._events >= self.compact_events
+        if due:
+            self.compact_in_background()
+
+    def flush_buffer(self) -> int:
+        """Merge the buffered usage into the counters; returns the entries
+        merged"""
+        with self._apply_lock:
+            with self._lock:
+                buffered, self._buffered = self._buffered, []
+                # Entries logged from here on are in the next batch
+                applied = self._logged
+            if not buffered:
+                return 0
+            self._apply(*merge(buffered))
+            with self._lock:
+                self._mark_applied_locked(applied)
+        return len(buffered)
+
+    def _mark_applied_locked(self, applied: int):
+        """Log that the first `applied` entries of the log are in the counters"""
+        self._file.write(applied_line(applied))
+        self._file.flush()
+        self._unsynced = True
+
+    def _apply(
+        self,
+        deltas: Dict[Tuple[str, str], int],
+        last_used: Dict[str, str],
+        latency: Optional[Dict[Tuple[str, str], int]] = None,
+    ):
+        self.state.incr("tool_usage", deltas)
+        if latency:
+            self.state.incr("tool_latency", latency)
+        self.state.put_many("tool_last_used", last_used)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Usage per tool: total count, count per model and last use"""
+        last_used = self.state.get_map("tool_last_used")
+        return {
+            tool: {
+                "count": sum(models.values()),
+                "models": dict(models),
+                "last_used": last_used.get(tool),
+            }
+            for tool, models in self.state.counters("tool_usage").items()
+        }
+
+    def latency(
+        self, tool: Optional[str] = None, model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Latency quantiles and success ratio per matching tool and model,
+        plus all of them merged"""
+        overall = DDSketch()
+        calls = successes = 0
+        breakdown = []
+        for key, fields in self.state.counters("tool_latency").items():
+            key_tool, _, key_model = key.partition(KEY_SEPARATOR)
+            if (tool and key_tool != tool) or (model and key_model != model):
+                continue
+            sketch = DDSketch()
+            sketch.merge_buckets(fields)
+            overall.merge(sketch)
+            calls += fields.get("calls", 0)
+            successes += fields.get("successes_milli", 0)
+            breakdown.append(
+                {
+                    "tool": key_tool,
+                    "model": key_model,
+                    **latency_summary(
+                        sketch,
+                        fields.get("calls", 0),
+                        fields.get("successes_milli", 0),
+                    ),
+                }
+            )
+        breakdown.sort(key=lambda row: row["samples"], reverse=True)
+        return {
+            "tool": tool,
+            "model": model,
+            **latency_summary(overall, calls, successes),
+            "breakdown": breakdown,
+        }
+
+    # ------------------------------------------------------------------
+    # Durability
+    # ------------------------------------------------------------------
+
+    def _wal_path(self, generation: int) -> Path:
+        return self.directory / f"tool_usage.{generation}.wal"
+
+    def _wal_generations(self) -> List[int]:
+        return sorted(
+            int(match.group(1))
+            for match in map(WAL_PATTERN.match, os.listdir(self.directory))
+            if match
+        )
+
+    def sync_if_due(self) -> int:
+        """Merge buffered usage, fsync the log once a second, and compact
+        when it is time to; returns the buffered entries merged"""
+        merged = self.flush_buffer()
+        now = time.monotonic()
+        with self._lock:
+            if self._unsynced and now - self._last_sync >= self.sync_seconds:
+                self._sync_locked()
+        if self._events and now - self._last_compact >= self.compact_seconds:
+            self.compact()
+        return merged
+
+    def _sync_locked(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = False
+        self._last_sync = time.monotonic()
+
+    def compact_in_background(self):
+        """Compact on a worker thread unless a compaction is already running"""
+        if not self._compact_lock.locked():
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    def compact(self):
+        """Snapshot the counters and drop the logs the snapshot covers"""
+        if not self._compact_lock.acquire(blocking=False):
+            return
+        try:
+            with self._apply_lock, self._lock:
+                # Buffered usage is in the log the snapshot covers, so it has
+                # to be in the counters too
+                buffered, self._buffered = self._buffered, []
+                if buffered:
+                    self._apply(*merge(buffered))
+                    self._mark_applied_locked(self._logged)
+                tools = self.stats()
+                latency = {
+                    key: dict(fields)
+                    for key, fields in self.state.counters("tool_latency").items()
+                }
+                # Later pings go to the next log, which the snapshot doesn't
+                # cover
+                self._sync_locked()
+                self._file.close()
+                self._generation += 1
+                self._file = self._open_wal(self._generation)
+                self._logged = 0
+                self._events = 0
+                self._last_compact = time.monotonic()
+
+            data = json.dumps(
+                {"next_wal": self._generation, "tools": tools, "latency": latency}
+            )
+            tmp_path = self.snapshot_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+
+            for generation in self._wal_generations():
+                if generation < self._generation:
+                    self._wal_path(generation).unlink(missing_ok=True)
+        finally:
+            self._compact_lock.release()
+
+    def restore(self) -> int:
+        """Load snapshot + logs into the state; returns the entries applied"""
+        snapshot = self._read_snapshot()
+        if snapshot is None:
+            # First start after the upgrade: pick up the old daily file
+            snapshot = {"next_wal": 0, "tools": self._legacy_stats()}
+
+        generations = self._wal_generations()
+        self._generation = max([snapshot["next_wal"], *generations])
+
+        # Redis may already have (newer) counts: only the first worker to
+        # start after they were lost restores them
+        restoring = not self.state.counters("tool_usage") and self.state.put_if_absent(
+            "tool_usage_meta", "restored", time.time()
+        )
+        replayed = 0
+        if restoring:
+            deltas, last_used = {}, {}
+            for tool, data in snapshot["tools"].items():
+                for model, count in data["models"].items():
+                    deltas[(tool, model)] = count
+                if data.get("last_used"):
+                    last_used[tool] = data["last_used"]
+            latency = {
+                (key, field): count
+                for key, fields in snapshot.get("latency", {}).items()
+                for field, count in fields.items()
+            }
+            self._apply(deltas, last_used, latency)
+
+        for generation in generations:
+            if generation < snapshot["next_wal"]:
+                continue
+            entries, applied = self._read_wal(self._wal_path(generation))
+            # Without a restore the shared counters already have the entries
+            # the last "applied" line covers; the rest were acknowledged but
+            # never merged
+            pending = entries if restoring else entries[applied:]
+            if pending:
+                self._apply(*merge(pending))
+                with self._open_wal(generation) as f:
+                    f.write(applied_line(len(entries)))
+            if generation == self._generation:
+                self._logged = len(entries)
+            self._events += len(entries)
+            replayed += len(pending)
+
+        self._file = self._open_wal(self._generation)
+        return replayed
+
+    def _open_wal(self, generation: int):
+        """Open a log for appending"""
+        f = open(self._wal_path(generation), "ab+")
+        if f.tell():
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                # Don't glue the next entry onto a line cut short by a crash
+                f.write(b"\n")
+        return f
+
+    def _read_snapshot(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.snapshot_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _read_wal(path: Path) -> Tuple[List[UsageEntry], int]:
+        """The entries in a log, and how many of them are in the counters"""
+        entries, applied = [], 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    value = fast_json.loads(line)
+                    if isinstance(value, dict):
+                        applied = value[APPLIED_KEY]
+                    else:
+                        entries.append(normalize(value))
+                except (TypeError, ValueError, KeyError):
+                    # A torn last line from a crash mid-write
+                    logger.warning(f"Skipping unreadable tool usage entry in {path}")
+        return entries, applied
+
+    def _legacy_stats(self) -> Dict[str, Dict[str, Any]]:
+        """The newest tool_stats_<date>.json the old code wrote"""
+        files = sorted(self.directory.glob("tool_stats_*.json"))
+        if not files:
+            return {}
+        try:
+            with open(files[-1], "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def close(self):
+        """Flush the log and write a final snapshot"""
+        self.flush_buffer()
+        self.compact()
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+
+# Singleton instance
+_tool_usage: Optional[ToolUsage] = None
+
+
+def get_tool_usage() -> ToolUsage:
+    """Get or create the tool usage counters"""
+    global _tool_usage
+    if _tool_usage is None:
+        _tool_usage = ToolUsage(
+            get_shared_state(), Path(os.getenv("STATS_DIR", "./stats"))
+        )
+    return _tool_usage
+
+
+__all__ = ["ToolUsage", "get_tool_usage"]
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Update decision log with pre-aggregated counts
+Every /version/notify-update decision is appended as one NDJSON line, one
+write() on an O_APPEND descriptor, so concurrent requests and worker
+processes never interleave or rewrite each other's lines. Logs rotate daily
+and at UPDATE_DECISIONS_MAX_BYTES:
+
+    stats/update_decisions_2025-08-06.ndjson
+    stats/update_decisions_2025-08-06.1.ndjson
+
+Counts by version pair, model and decision are kept in the shared state as
+they are recorded, so /version/decisions/summary never reads the log. They
+are checkpointed with the log position they cover, and restored at boot from
+the checkpoint plus the lines logged after it.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import fast_json
+from shared_state import SharedState, get_shared_state
+
+logger = logging.getLogger(__name__)
+
+UPDATE_DECISIONS_MAX_BYTES = int(
+    os.getenv("UPDATE_DECISIONS_MAX_BYTES", str(64 * 1024 * 1024))
+)
+
+LOG_PATTERN = re.compile(r"update_decisions_(\d{4}-\d{2}-\d{2})(?:\.(\d+))?\.ndjson$")
+LEGACY_PATTERN = re.compile(r"update_decisions_\d{4}-\d{2}-\d{2}\.json$")
+
+# Separates current version, latest version and model in counter keys
+KEY_SEPARATOR = "\x1e"
+
+
+def log_order(name: str) -> Tuple[str, int]:
+    """Sort key of a log file name: day, then rotation number"""
+    match = LOG_PATTERN.match(name)
+    return match.group(1), int(match.group(2) or 0)
+
+
+def counter_key(decision: Dict[str, Any]) -> Tuple[str, str]:
+    return (
+        KEY_SEPARATOR.join(
+            [
+                decision["current_version"],
+                decision["latest_version"],
+                decision.get("ai_model") or "unknown",
+            ]
+        ),
+        decision["decision"],
+    )
+
+
+class UpdateDecisionLog:
+    """Append-only NDJSON decision log plus shared aggregate counts"""
+
+    def __init__(
+        self,
+        state: SharedState,
+        directory: Path,
+        max_bytes: int = UPDATE_DECISIONS_MAX_BYTES,
+    ):
+        self.state = state
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.checkpoint_path = self.directory / "update_decisions_summary.json"
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._name: Optional[str] = None
+        self._dirty = False
+        self.restore()
+
+    # ------------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------------
+
+    def _log_name(self, day: str) -> str:
+        """The file today's decisions go to, rotating when it is full"""
+        names = [
+            name
+            for name in os.listdir(self.directory)
+            if LOG_PATTERN.match(name) and log_order(name)[0] == day
+        ]
+        if not names:
+            return f"update_decisions_{day}.ndjson"
+        newest = max(names, key=log_order)
+        if (self.directory / newest).stat().st_size < self.max_bytes:
+            return newest
+        return f"update_decisions_{day}.{log_order(newest)[1] + 1}.ndjson"
+
+    def _open_locked(self, day: str):
+        if self._name and log_order(self._name)[0] == day:
+            if os.fstat(self._fd).st_size < self.max_bytes:
+                return
+        if self._fd is not None:
+            os.close(self._fd)
+        self._name = self._log_name(day)
+        self._fd = os.open(
+            self.directory / self._name, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644
+        )
+
+    def record(self, decision: Dict[str, Any]):
+        """Log one decision and count it"""
+        now = datetime.now(timezone.utc)
+        decision = {"timestamp": now.isoformat(), **decision}
+        line = fast_json.dumps(decision) + b"\n"
+        with self._lock:
+            self._open_locked(now.date().isoformat())
+            os.write(self._fd, line)
+            self.state.incr("update_decisions", {counter_key(decision): 1})
+            self._dirty = True
+
+    # ------------------------------------------------------------------
+    # Summary
+    # ------------------------------------------------------------------
+
+    def summary(
+        self,
+        current_version: Optional[str] = None,
+        latest_version: Optional[str] = None,
+        ai_model: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Decision counts overall, per version pair and per model"""
+        totals: Dict[str, int] = {}
+        pairs: Dict[Tuple[str, str], Dict[str, int]] = {}
+        models: Dict[str, Dict[str, int]] = {}
+        for key, decisions in self.state.counters("update_decisions").items():
+            current, latest, model = key.split(KEY_SEPARATOR)
+            if (
+                (current_version and current != current_version)
+                or (latest_version and latest != latest_version)
+                or (ai_model and model != ai_model)
+            ):
+                continue
+            for decision, count in decisions.items():
+                totals[decision] = totals.get(decision, 0) + count
+                pair = pairs.setdefault((current, latest), {})
+                pair[decision] = pair.get(decision, 0) + count
+                by_model = models.setdefault(model, {})
+                by_model[decision] = by_model.get(decision, 0) + count
+
+        def row(counts: Dict[str, int]) -> Dict[str, Any]:
+            total = sum(counts.values())
+            return {
+                "total": total,
+                "decisions": counts,
+                "update_rate": (
+                    round(counts.get("update", 0) / total, 4) if total else None
+                ),
+            }
+
+        return {
+            **row(totals),
+            "by_version": sorted(
+                (
+                    {"current_version": current, "latest_version": latest, **row(c)}
+                    for (current, latest), c in pairs.items()
+                ),
+                key=lambda entry: entry["total"],
+                reverse=True,
+            ),
+            "by_model": {model: row(c) for model, c in sorted(models.items())},
+        }
+
+    # ------------------------------------------------------------------
+    # Checkpointing
+    # ------------------------------------------------------------------
+
+    def _logs(self) -> List[str]:
+        return sorted(
+            (name for name in os.listdir(self.directory) if LOG_PATTERN.match(name)),
+            key=log_order,
+        )
+
+    def checkpoint(self):
+        """Write the counts and the log position they cover, if they changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            # The newest log on disk, not the one this process has open:
+            # another process may have rotated past it, and the counts
+            # already include what it wrote there
+            logs = self._logs()
+            log = logs[-1] if logs else None
+            offset = (self.directory / log).stat().st_size if log else 0
+            data = json.dumps(
+                {
+                    "log": log,
+                    "offset": offset,
+                    "counts": {
+                        key: dict(decisions)
+                        for key, decisions in self.state.counters(
+                            "update_decisions"
+                        ).items()
+                    },
+                }
+            )
+            self._dirty = False
+        tmp_path = self.checkpoint_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def restore(self) -> int:
+        """Counts from the checkpoint plus the log after it; returns the
+        decisions replayed from the log"""
+        try:
+            with open(self.checkpoint_path, "r") as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            checkpoint = {"log": None, "offset": 0, "counts": self._legacy_counts()}
+
+        # Shared counts may already be there: only the first worker to start
+        # after they were lost restores them
+        if self.state.counters("update_decisions") or not self.state.put_if_absent(
+            "update_decisions_meta", "restored", datetime.now(timezone.utc).isoformat()
+        ):
+            return 0
+
+        deltas = {
+            (key, decision): count
+            for key, decisions in checkpoint["counts"].items()
+            for decision, count in decisions.items()
+        }
+        replayed = 0
+        for name in self._logs():
+            if checkpoint["log"] and log_order(name) < log_order(checkpoint["log"]):
+                continue
+            offset = checkpoint["offset"] if name == checkpoint["log"] else 0
+            for decision in self._read_log(self.directory / name, offset):
+                key = counter_key(decision)
+                deltas[key] = deltas.get(key, 0) + 1
+                replayed += 1
+        self.state.incr("update_decisions", deltas)
+        self._dirty = bool(deltas)
+        return replayed
+
+    @staticmethod
+    def _read_log(path: Path, offset: int) -> Iterable[Dict[str, Any]]:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    yield fast_json.loads(line)
+                except ValueError:
+                    logger.warning(f"Skipping unreadable update decision in {path}")
+
+    def _legacy_counts(self) -> Dict[str, Dict[str, int]]:
+        """Counts from the JSON arrays the old code rewrote per request"""
+        counts: Dict[str, Dict[str, int]] = {}
+        for path in sorted(self.directory.iterdir()):
+            if not LEGACY_PATTERN.match(path.name):
+                continue
+            try:
+                with open(path, "r") as f:
+                    decisions = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for decision in decisions:
+                key, field = counter_key(decision)
+                counts.setdefault(key, {})
+                counts[key][field] = counts[key].get(field, 0) + 1
+        return counts
+
+    def close(self):
+        self.checkpoint()
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+# Singleton instance
+_update_decisions: Optional[UpdateDecisionLog] = None
+
+
+def get_update_decisions() -> UpdateDecisionLog:
+    """Get or create the update decision log"""
+    global _update_decisions
+    if _update_decisions is None:
+        _update_decisions = UpdateDecisionLog(
+            get_shared_state(), Path(os.getenv("STATS_DIR", "./stats"))
+        )
+    return _update_decisions
+
+
+__all__ = ["UpdateDecisionLog", "get_update_decisions"]
@@ -219,3 +219,124 @@ def test_feedback_formatting():
 if __name__ == "__main__":
     # Run tests with coverage
     pytest.main([__file__, "-v", "--cov=worker", "--cov-report=term-missing"])
+
+
+class TestStreamConsumer:
+    """Test consuming feedback from the Redis Stream"""
+
+    @pytest.fixture
+    def worker(self):
+        with patch("worker.Github"):
+            worker = FeedbackWorker()
+            worker.repo = None
+            worker.redis = AsyncMock()
+            yield worker
+
+    @staticmethod
+    def entry(feedback_id: str):
+        document = f'{{"id": "{feedback_id}", "title": "Slow scan", "category": "bug"}}'
+        return (
+            f"1700000000000-{feedback_id}".encode(),
+            {b"document": document.encode()},
+        )
+
+    @pytest.mark.asyncio
+    async def test_new_entries_are_acked_after_processing(self, worker):
+        """Entries read from the group are processed and acknowledged"""
+        worker.redis.xautoclaim.return_value = [b"0-0", [], []]
+        worker.redis.xreadgroup.return_value = [
+            [worker.stream.encode(), [self.entry("1"), self.entry("2")]]
+        ]
+
+        assert await worker.consume_stream() == 2
+        acked = [call.args[2] for call in worker.redis.xack.call_args_list]
+        assert sorted(acked) == [b"1700000000000-1", b"1700000000000-2"]
+
+    @pytest.mark.asyncio
+    async def test_failed_entries_stay_pending(self, worker):
+        """A failure leaves the entry unacked for XAUTOCLAIM, not on the retry list"""
+        worker.process_feedback = AsyncMock(return_value=None)
+
+        assert await worker.handle_stream_entry(*self.entry("3")) is False
+        worker.redis.xack.assert_not_called()
+        worker.redis.lpush.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_stuck_entries_are_claimed_or_dead_lettered(self, worker):
+        """XAUTOCLAIM takes over idle entries; ones delivered too often are parked"""
+        worker.redis.xautoclaim.return_value = [
+            b"0-0",
+            [self.entry("4"), self.entry("5")],
+            [],
+        ]
+        worker.redis.xpending_range.side_effect = [
+            [{"times_delivered": 2}],
+            [{"times_delivered": worker.max_deliveries + 1}],
+        ]
+
+        claimed = await worker.claim_stuck_entries()
+        assert [entry_id for entry_id, _ in claimed] == [b"1700000000000-4"]
+        worker.redis.lpush.assert_called_once()
+        assert worker.redis.lpush.call_args.args[0] == "feedback:dead"
+        worker.redis.xack.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_stuck_entry_scan_resumes_where_it_stopped(self, worker):
+        """Each round continues the pending list scan from XAUTOCLAIM's cursor"""
+        worker.redis.xautoclaim.side_effect = [
+            [b"1700000000000-9", [], []],
+            [b"0-0", [], []],
+            [b"0-0", [], []],
+        ]
+        for _ in range(3):
+            await worker.claim_stuck_entries()
+        starts = [
+            call.kwargs["start_id"] for call in worker.redis.xautoclaim.call_args_list
+        ]
+        assert starts == ["0-0", b"1700000000000-9", b"0-0"]
+
+
+class TestLeaseConsumer:
+    """Test the claim/ack/nack protocol used when the stream is off"""
+
+    @pytest.fixture
+    def worker(self):
+        with patch("worker.Github"):
+            worker = FeedbackWorker()
+            worker.repo = None
+            worker.redis = AsyncMock()
+            response = Mock(status=200)
+            worker.session = Mock()
+            worker.session.post.return_value.__aenter__ = AsyncMock(
+                return_value=response
+            )
+            worker.session.post.return_value.__aexit__ = AsyncMock(return_value=False)
+            yield worker
+
+    @staticmethod
+    def item():
+        return {
+            "id": "abc123",
+            "lease_token": "token-1",
+            "feedback": {"id": "abc123", "title": "Slow scan", "category": "bug"},
+        }
+
+    @pytest.mark.asyncio
+    async def test_processed_items_are_acked(self, worker):
+        assert await worker.handle_claimed(self.item()) is True
+        url = worker.session.post.call_args.args[0]
+        assert url.endswith("/feedback/abc123/ack")
+        assert worker.session.post.call_args.kwargs["json"] == {
+            "lease_token": "token-1"
+        }
+
+    @pytest.mark.asyncio
+    async def test_failed_items_are_nacked(self, worker):
+        worker.process_feedback = AsyncMock(return_value=None)
+
+        assert await worker.handle_claimed(self.item()) is False
+        url = worker.session.post.call_args.args[0]
+        assert url.endswith("/feedback/abc123/nack")
+        payload = worker.session.post.call_args.kwargs["json"]
+        assert payload["retry_after_seconds"] == worker.nack_delay
+        worker.redis.lpush.assert_not_called()
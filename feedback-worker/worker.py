@@ -11,6 +11,7 @@ import re
 from datetime import datetime
 from typing import Dict, List, Optional
 import hashlib
+import socket
 
 import aiohttp
 import redis.asyncio as redis
@@ -42,6 +43,16 @@ logging.basicConfig(
 logger = logging.getLogger("feedback-worker")
 
 
+def decode_fields(fields: Dict) -> Dict[str, str]:
+    """Stream entry fields as text (the Redis client hands back bytes)"""
+    return {
+        (key.decode() if isinstance(key, bytes) else key): (
+            value.decode() if isinstance(value, bytes) else value
+        )
+        for key, value in fields.items()
+    }
+
+
 class FeedbackWorker:
     def __init__(self):
         self.github_token = os.environ.get("GITHUB_TOKEN")
@@ -53,6 +64,23 @@ class FeedbackWorker:
         self.redis_url = os.environ.get("REDIS_URL", "redis://localhost:6379")
         self.github_repo = os.environ.get("GITHUB_REPO", "8b-is/aygent")
 
+        # Redis Stream the API publishes new feedback to (consumer group reads)
+        self.use_stream = (
+            os.environ.get("FEEDBACK_STREAM_ENABLED", "true").lower() != "false"
+        )
+        self.stream = os.environ.get("FEEDBACK_STREAM", "feedback:stream")
+        self.stream_group = os.environ.get("FEEDBACK_STREAM_GROUP", "feedback-workers")
+        self.consumer = os.environ.get(
+            "FEEDBACK_CONSUMER", f"{socket.gethostname()}-{os.getpid()}"
+        )
+        self.claim_idle_ms = int(os.environ.get("FEEDBACK_CLAIM_IDLE_MS", "60000"))
+        self.max_deliveries = int(os.environ.get("FEEDBACK_MAX_DELIVERIES", "5"))
+        self.claim_cursor = "0-0"
+
+        # Leases taken through POST /feedback/claim when not using the stream
+        self.lease_seconds = int(os.environ.get("FEEDBACK_LEASE_SECONDS", "300"))
+        self.nack_delay = int(os.environ.get("FEEDBACK_NACK_DELAY_SECONDS", "60"))
+
         # Initialize GitHub client (optional for local testing)
         self.gh = None
         self.repo = None
@@ -396,8 +424,11 @@ class FeedbackWorker:
             feedback_errors.inc()
             return None
 
-    async def process_feedback(self, feedback: Dict) -> Optional[Dict]:
-        """Process a single feedback item"""
+    async def process_feedback(
+        self, feedback: Dict, retry: bool = True
+    ) -> Optional[Dict]:
+        """Process a single feedback item (failures go to the retry list
+        unless ``retry`` is off, e.g. for stream entries that get redelivered)"""
         with processing_time.time():
             try:
                 # Categorize feedback
@@ -445,29 +476,138 @@ class FeedbackWorker:
                 feedback_errors.inc()
 
                 # Store in Redis for retry
-                await self.redis.lpush("feedback:retry", json.dumps(feedback))
+                if retry:
+                    await self.redis.lpush("feedback:retry", json.dumps(feedback))
                 return None
 
-    async def fetch_pending_feedback(self) -> List[Dict]:
-        """Fetch pending feedback from API"""
+    async def ensure_stream_group(self):
+        """Create the consumer group (and the stream) if they don't exist yet"""
         try:
-            async with self.session.get(
-                f"{self.feedback_api_url}/feedback/pending"
+            await self.redis.xgroup_create(
+                self.stream, self.stream_group, id="0", mkstream=True
+            )
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def handle_stream_entry(self, entry_id, fields: Dict) -> bool:
+        """Process one stream entry; acknowledged only once it succeeded, so a
+        crash or failure leaves it pending for XAUTOCLAIM"""
+        document = decode_fields(fields).get("document")
+        if document is None:
+            # Trimmed from the stream before we got to it; nothing to do
+            await self.redis.xack(self.stream, self.stream_group, entry_id)
+            return True
+
+        result = await self.process_feedback(json.loads(document), retry=False)
+        if result is None:
+            return False
+        await self.redis.xack(self.stream, self.stream_group, entry_id)
+        return True
+
+    async def claim_stuck_entries(self) -> List:
+        """Take over entries another consumer read but never acknowledged;
+        entries that keep failing are moved to the dead letter list"""
+        # XAUTOCLAIM scans the pending list a page at a time: carry on where
+        # the last round stopped (it hands back "0-0" after a full pass)
+        self.claim_cursor, entries, *_ = await self.redis.xautoclaim(
+            self.stream,
+            self.stream_group,
+            self.consumer,
+            min_idle_time=self.claim_idle_ms,
+            start_id=self.claim_cursor,
+            count=10,
+        )
+
+        claimed = []
+        for entry_id, fields in entries:
+            pending = await self.redis.xpending_range(
+                self.stream, self.stream_group, entry_id, entry_id, 1
+            )
+            if pending and pending[0]["times_delivered"] > self.max_deliveries:
+                logger.error(f"Giving up on stream entry {entry_id}")
+                feedback_errors.inc()
+                await self.redis.lpush(
+                    "feedback:dead", json.dumps(decode_fields(fields or {}))
+                )
+                await self.redis.xack(self.stream, self.stream_group, entry_id)
+                continue
+            claimed.append((entry_id, fields or {}))
+        return claimed
+
+    async def consume_stream(self, block_ms: int = 5000) -> int:
+        """One round of stream consumption: stuck entries first, then new
+        ones (blocking read). Returns how many entries were handled."""
+        entries = await self.claim_stuck_entries()
+        if not entries:
+            response = await self.redis.xreadgroup(
+                self.stream_group,
+                self.consumer,
+                {self.stream: ">"},
+                count=10,
+                block=block_ms,
+            )
+            for _, stream_entries in response or []:
+                entries.extend(stream_entries)
+
+        # Process concurrently but with limit
+        semaphore = asyncio.Semaphore(3)
+
+        async def handle_with_limit(entry):
+            async with semaphore:
+                await self.handle_stream_entry(*entry)
+
+        await asyncio.gather(*[handle_with_limit(entry) for entry in entries])
+        return len(entries)
+
+    async def claim_feedback(self, limit: int = 10) -> List[Dict]:
+        """Lease pending feedback; other replicas won't get the same items"""
+        try:
+            async with self.session.post(
+                f"{self.feedback_api_url}/feedback/claim",
+                json={
+                    "worker": self.consumer,
+                    "limit": limit,
+                    "lease_seconds": self.lease_seconds,
+                },
             ) as resp:
                 if resp.status == 200:
-                    return await resp.json()
-                else:
-                    logger.error(f"Failed to fetch feedback: {resp.status}")
-                    return []
+                    return (await resp.json())["items"]
+                logger.error(f"Failed to claim feedback: {resp.status}")
+                return []
         except Exception as e:
-            logger.error(f"Error fetching feedback: {e}")
+            logger.error(f"Error claiming feedback: {e}")
             return []
 
+    async def handle_claimed(self, item: Dict) -> bool:
+        """Process a leased item, then ack it (or nack it for a later retry)"""
+        result = await self.process_feedback(item["feedback"], retry=False)
+        action = "ack" if result else "nack"
+        payload = {"lease_token": item["lease_token"]}
+        if not result:
+            payload["retry_after_seconds"] = self.nack_delay
+
+        try:
+            async with self.session.post(
+                f"{self.feedback_api_url}/feedback/{item['id']}/{action}",
+                json=payload,
+            ) as resp:
+                if resp.status != 200:
+                    # 409: the lease ran out and another replica has the item
+                    logger.warning(f"Could not {action} {item['id']}: {resp.status}")
+        except Exception as e:
+            logger.error(f"Error sending {action} for {item['id']}: {e}")
+        return result is not None
+
     async def run(self):
         """Main worker loop"""
         await self.setup()
 
         try:
+            if self.use_stream:
+                await self.ensure_stream_group()
+                logger.info(f"Consuming {self.stream} as {self.consumer}")
+
             while True:
                 # Check for retry items first
                 retry_item = await self.redis.rpop("feedback:retry")
@@ -476,24 +616,30 @@ class FeedbackWorker:
                     await self.process_feedback(feedback)
                     continue
 
-                # Fetch new feedback
-                feedback_items = await self.fetch_pending_feedback()
+                # New feedback arrives on the stream (blocking read, no poll)
+                if self.use_stream:
+                    await self.consume_stream()
+                    continue
+
+                # Lease new feedback (expired leases come back automatically)
+                claimed_items = await self.claim_feedback()
 
-                if feedback_items:
-                    logger.info(f"Processing {len(feedback_items)} feedback items")
+                if claimed_items:
+                    logger.info(f"Processing {len(claimed_items)} feedback items")
 
                     # Process concurrently but with limit
                     semaphore = asyncio.Semaphore(3)
 
                     async def process_with_limit(item):
                         async with semaphore:
-                            await self.process_feedback(item)
+                            await self.handle_claimed(item)
 
                     await asyncio.gather(
-                        *[process_with_limit(item) for item in feedback_items]
+                        *[process_with_limit(item) for item in claimed_items]
                     )
+                    continue
 
-                # Wait before next poll
+                # Nothing pending; wait before the next claim
                 await asyncio.sleep(30)
 
         except KeyboardInterrupt: